@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "core",
     "rest_framework",
     "rest_framework.authtoken",
@@ -53,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.QueryInspectionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -88,14 +91,140 @@ WSGI_APPLICATION = "app.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        # PostgreSQL, checking reused connections as core.connections
+        # describes.
+        "ENGINE": "core.backends.postgresql",
         "HOST": environ.get("DB_HOST"),
         "NAME": environ.get("DB_NAME"),
         "USER": environ.get("DB_USER"),
         "PASSWORD": environ.get("DB_PASS"),
+        # Seconds a connection is kept open across requests (0 closes it
+        # after each request), and whether a reused connection is checked
+        # before the request uses it.
+        "CONN_MAX_AGE": int(environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": bool(
+            int(environ.get("DB_CONN_HEALTH_CHECKS", 1))
+        ),
     }
 }
 
+# Read replicas of the default database, as comma-separated hosts. The
+# database name defaults to the primary's, so a second database on one
+# server can stand in for a replica locally. GET list and retrieve
+# requests read from a random replica, except for
+# REPLICA_PIN_SECONDS after the same user writes.
+DATABASE_REPLICAS = []
+for index, host in enumerate(environ.get("DB_REPLICA_HOSTS", "").split(",")):
+    if host.strip():
+        alias = f"replica_{index}"
+        DATABASES[alias] = {
+            **DATABASES["default"],
+            "HOST": host.strip(),
+            "NAME": environ.get("DB_REPLICA_NAME", environ.get("DB_NAME")),
+            "TEST": {"MIRROR": "default"},
+        }
+        DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+REPLICA_PIN_SECONDS = int(environ.get("REPLICA_PIN_SECONDS", 10))
+
+# With DB_POOL=local, scripts/run.sh starts PgBouncer in the container and
+# the app connects through it. PgBouncer runs in transaction pooling mode,
+# where each transaction may run on a different server connection, so
+# QuerySet.iterator() must not declare server-side cursors there.
+if environ.get("DB_POOL") == "local":
+    DATABASES["default"].update(
+        {
+            "HOST": "127.0.0.1",
+            "PORT": environ.get("DB_POOL_PORT", "6432"),
+            "DISABLE_SERVER_SIDE_CURSORS": True,
+        }
+    )
+
+
+# Threads per process running the database work of async views under
+# ASGI, each with its own connection. Keep ASGI_WORKERS times this, plus
+# one connection per process for sync views, under the connections the
+# database or DB_POOL_SIZE allows.
+ASYNC_DB_THREADS = int(environ.get("ASYNC_DB_THREADS", 8))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# The default cache must be shared by every worker process: it holds the
+# response cache versions and responses. Files on the host are shared by
+# the workers of one container; with several app hosts, point
+# CACHE_BACKEND at memcached (CACHE_LOCATION "host:port") instead. Read
+# replicas also keep pins there, and require memcached, as the file cache
+# culls arbitrary keys when full.
+CACHES = {
+    "default": {
+        "BACKEND": environ.get(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": environ.get("CACHE_LOCATION", "/vol/web/cache"),
+    }
+}
+if CACHES["default"]["BACKEND"].endswith(".FileBasedCache"):
+    # Files past the limit are culled on write, a third at a time.
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(environ.get("CACHE_MAX_ENTRIES", 10000)),
+    }
+
+# Per-user cache of recipe, tag and ingredient GET responses. It can only
+# be enabled on a cache shared by all processes (see recipe.checks).
+RESPONSE_CACHE_ENABLED = bool(int(environ.get("RESPONSE_CACHE_ENABLED", 1)))
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = int(environ.get("RESPONSE_CACHE_TIMEOUT", 300))
+
+
+# Request metrics, exposed at api/metrics/. Every request is counted, and
+# METRICS_SAMPLE_RATE of them are timed, with their queries.
+METRICS_ENABLED = bool(int(environ.get("METRICS_ENABLED", 1)))
+METRICS_SAMPLE_RATE = float(environ.get("METRICS_SAMPLE_RATE", 0.1))
+# Directory where each process writes its metrics, at most every
+# METRICS_FLUSH_SECONDS, for the endpoint to add up those of all workers.
+# Unset, each worker reports only its own requests.
+METRICS_DIR = environ.get("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(environ.get("METRICS_FLUSH_SECONDS", 5))
+
+# Query inspection, for development: logs queries slower than
+# SLOW_QUERY_MS, SQL run QUERY_REPEAT_THRESHOLD times or more in one
+# request, and views over their query budget. The test runner turns it on
+# with QUERY_BUDGETS_STRICT, so going over budget fails the test.
+QUERY_INSPECTION = bool(int(environ.get("QUERY_INSPECTION", 0)))
+QUERY_BUDGETS_STRICT = False
+SLOW_QUERY_MS = float(environ.get("SLOW_QUERY_MS", 100))
+QUERY_REPEAT_THRESHOLD = int(environ.get("QUERY_REPEAT_THRESHOLD", 3))
+
+TEST_RUNNER = "core.testing.TestRunner"
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/3.2/topics/auth/passwords/
+
+# Passwords stored with the other hashers are rehashed with Argon2 on the
+# next login.
+PASSWORD_HASHERS = [
+    "core.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
+# Argon2 costs: passes, memory in KiB and lanes. Changing them rehashes
+# each password on its next login.
+ARGON2_TIME_COST = int(environ.get("ARGON2_TIME_COST", 2))
+ARGON2_MEMORY_COST = int(environ.get("ARGON2_MEMORY_COST", 19456))
+ARGON2_PARALLELISM = int(environ.get("ARGON2_PARALLELISM", 1))
+
+# Passwords hashed at once per process, hashes waiting for a free worker,
+# and seconds a request waits for a queue slot before failing with 503.
+PASSWORD_HASH_WORKERS = int(environ.get("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE = int(environ.get("PASSWORD_HASH_QUEUE", 16))
+PASSWORD_HASH_WAIT = float(environ.get("PASSWORD_HASH_WAIT", 2))
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -148,8 +277,71 @@ AUTH_USER_MODEL = "core.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_THROTTLE_RATES": {
+        # Token requests that did not log in, per email address and per
+        # client IP address across all emails. Counted in the database.
+        "login": environ.get("LOGIN_THROTTLE_RATE", "10/min"),
+        "login_ip": environ.get("LOGIN_IP_THROTTLE_RATE", "30/min"),
+    },
 }
 
+# Days an API token is valid, and expired tokens deleted per transaction
+# by the prune_tokens command.
+TOKEN_TTL_DAYS = int(environ.get("TOKEN_TTL_DAYS", 30))
+TOKEN_PRUNE_BATCH_SIZE = int(environ.get("TOKEN_PRUNE_BATCH_SIZE", 1000))
+
+# Token authentication cache: tokens kept per process, seconds a cached
+# token is trusted (and so how long another process may still accept a
+# revoked one), and an optional cache alias shared by all processes.
+TOKEN_CACHE_SIZE = int(environ.get("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL = int(environ.get("TOKEN_CACHE_TTL", 30))
+TOKEN_CACHE_ALIAS = environ.get("TOKEN_CACHE_ALIAS") or None
+
+# Default and maximum page sizes of the paginated list endpoints.
+PAGE_SIZE = int(environ.get("PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(environ.get("MAX_PAGE_SIZE", 1000))
+
+# Limits of the batch recipe endpoint: operations accepted per request and
+# operations written per transaction.
+BULK_MAX_OPERATIONS = int(environ.get("BULK_MAX_OPERATIONS", 5000))
+BULK_CHUNK_SIZE = int(environ.get("BULK_CHUNK_SIZE", 500))
+
+# Recipes read per keyset chunk, with their relations, when exporting.
+EXPORT_CHUNK_SIZE = int(environ.get("EXPORT_CHUNK_SIZE", 500))
+
+# Resized copies generated for uploaded recipe images. Jobs are queued in
+# the database and run by IMAGE_WORKERS threads per process (0 leaves them
+# to the process_image_jobs command, which the compose files also run for
+# retries and the jobs of dead workers). A job still running after
+# IMAGE_JOB_TIMEOUT seconds is assumed lost with its worker and retried, so
+# the timeout must exceed the time taken by the largest image.
+IMAGE_DERIVATIVE_WIDTHS = [
+    int(width)
+    for width in environ.get("IMAGE_DERIVATIVE_WIDTHS", "320,640,1280").split(
+        ","
+    )
+]
+IMAGE_DERIVATIVE_FORMATS = environ.get(
+    "IMAGE_DERIVATIVE_FORMATS", "webp,jpeg"
+).split(",")
+IMAGE_WORKERS = int(environ.get("IMAGE_WORKERS", 2))
+IMAGE_JOB_MAX_ATTEMPTS = int(environ.get("IMAGE_JOB_MAX_ATTEMPTS", 3))
+IMAGE_JOB_TIMEOUT = int(environ.get("IMAGE_JOB_TIMEOUT", 600))
+
+# Default and maximum number of tag or ingredient autocomplete matches.
+AUTOCOMPLETE_LIMIT = int(environ.get("AUTOCOMPLETE_LIMIT", 10))
+AUTOCOMPLETE_MAX_LIMIT = int(environ.get("AUTOCOMPLETE_MAX_LIMIT", 50))
+# Shorter texts only match name prefixes: they share trigrams with most
+# names, so similarity would rank nearly every item of the user.
+AUTOCOMPLETE_TRIGRAM_MIN_LENGTH = int(
+    environ.get("AUTOCOMPLETE_TRIGRAM_MIN_LENGTH", 3)
+)
+
+# Delta sync: changes returned per kind and request, and days deletions
+# are remembered (older sync tokens require a full resync).
+SYNC_PAGE_SIZE = int(environ.get("SYNC_PAGE_SIZE", 500))
+TOMBSTONE_RETENTION_DAYS = int(environ.get("TOMBSTONE_RETENTION_DAYS", 30))
+
 SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True,
 }
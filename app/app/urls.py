@@ -25,6 +25,8 @@ from drf_spectacular.views import SpectacularSwaggerView
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/health-check/", core_views.health_check, name="health-check"),
+    path("api/db-stats/", core_views.db_stats, name="db-stats"),
+    path("api/metrics/", core_views.metrics, name="metrics"),
     path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
     path(
         "api/docs/",
@@ -51,3 +51,6 @@ admin.site.register(models.User, admin_class=UserAdmin)
 admin.site.register(models.Recipe)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
+admin.site.register(models.ImageJob)
+admin.site.register(models.Tombstone)
+admin.site.register(models.AuthToken)
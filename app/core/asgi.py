@@ -0,0 +1,260 @@
+"""
+Serving the app over ASGI.
+
+Under ASGI, Django 3.2 runs every sync view on one thread per process and
+iterates streaming responses on the event loop, where database queries
+are not allowed. Views wrapped with async_view instead run on a pool of
+ASYNC_DB_THREADS threads, each keeping its own database connection, so a
+slow request holds a pool thread but never the event loop. Their
+streaming responses are read on the pool one part at a time, so a slow
+client does not hold a thread, and sent by ASGIHandler, which accepts the
+async iterators of AsyncStreamingHttpResponse.
+
+The async views are only served by ASGIHandler: views decorated with
+with_asgi_view, and the actions AsyncActionRouter finds in the
+async_actions of viewsets, stay sync views under WSGI, and so in the test
+client. ASGIHandler also stops the pool at the lifespan shutdown of the
+server.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from core.connections import expect_checks
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler as BaseASGIHandler
+from django.db import close_old_connections
+from django.db import connections
+from django.http import StreamingHttpResponse
+from rest_framework.routers import DefaultRouter
+
+_DONE = object()
+_executor = None
+_threads = 0
+_lock = threading.Lock()
+
+
+def _get_executor():
+    """Return the database thread pool, creating it on first use."""
+    global _executor, _threads
+    with _lock:
+        if _executor is None:
+            _threads = settings.ASYNC_DB_THREADS
+            _executor = ThreadPoolExecutor(
+                max_workers=_threads,
+                thread_name_prefix="async-db",
+            )
+    return _executor
+
+
+def shutdown():
+    """Close the connections of the pool threads and stop them."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is None:
+        return
+    # Each task waits for all the others, so each runs on its own thread.
+    barrier = threading.Barrier(_threads)
+
+    def close():
+        barrier.wait()
+        connections.close_all()
+
+    for future in [executor.submit(close) for _i in range(_threads)]:
+        future.result()
+    executor.shutdown()
+
+
+def _call(func, args, kwargs):
+    """Call func with fresh connections, as Django does for a request."""
+    close_old_connections()
+    expect_checks()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_db_thread(func, *args, **kwargs):
+    """Run a function using the database on the thread pool."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _get_executor(),
+        functools.partial(context.run, _call, func, args, kwargs),
+    )
+
+
+async def iterate_in_db_thread(iterable):
+    """Iterate a sync iterable on the thread pool, one item per call.
+
+    A pool thread is held while an item is read, not while it is sent, so
+    the iterable must not rely on the thread it runs on, as server-side
+    cursors do. The next item is read while the current one is sent. The
+    iterable is closed on the pool too, even if the client goes away.
+    """
+    iterator = iter(iterable)
+
+    def read():
+        return asyncio.ensure_future(
+            run_in_db_thread(next, iterator, _DONE),
+        )
+
+    pending = read()
+    try:
+        while True:
+            item = await pending
+            if item is _DONE:
+                return
+            pending = read()
+            yield item
+    finally:
+        # The iterable cannot be closed while an item is being read. An
+        # error reading an item the client left before is dropped.
+        await asyncio.wait([pending])
+        if not pending.cancelled():
+            pending.exception()
+        if hasattr(iterable, "close"):
+            await run_in_db_thread(iterable.close)
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """Streaming response whose content is an async iterator.
+
+    Only ASGIHandler can send it.
+    """
+
+    is_async = True
+
+    @property
+    def streaming_content(self):
+        async def content():
+            async for part in self._iterator:
+                yield self.make_bytes(part)
+
+        return content()
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        self._iterator = value
+
+    def __iter__(self):
+        raise TypeError("Asynchronous responses can only be sent by ASGI.")
+
+
+def async_view(view):
+    """Return an async view running a sync view on the thread pool.
+
+    Streaming responses are converted to AsyncStreamingHttpResponse.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        response = await run_in_db_thread(view, request, *args, **kwargs)
+        if not response.streaming:
+            return response
+        streaming = AsyncStreamingHttpResponse(
+            iterate_in_db_thread(response),
+            status=response.status_code,
+        )
+        for header, value in response.items():
+            streaming[header] = value
+        return streaming
+
+    return wrapper
+
+
+def with_asgi_view(asgi_view):
+    """Serve the decorated view with asgi_view under ASGIHandler."""
+
+    def decorator(view):
+        view.asgi_view = asgi_view
+        return view
+
+    return decorator
+
+
+class AsyncActionRouter(DefaultRouter):
+    """Router serving the async_actions of viewsets with async views.
+
+    The views are only used by ASGIHandler; WSGI serves the sync ones.
+    """
+
+    def get_urls(self):
+        urls = super().get_urls()
+        for url in urls:
+            actions = getattr(url.callback, "actions", None)
+            viewset = getattr(url.callback, "cls", None)
+            async_actions = getattr(viewset, "async_actions", ())
+            if actions and set(actions.values()) <= set(async_actions):
+                with_asgi_view(async_view(url.callback))(url.callback)
+        return urls
+
+
+class ASGIHandler(BaseASGIHandler):
+    """ASGI handler serving the async views of this module.
+
+    It also sends AsyncStreamingHttpResponse, and stops the database
+    threads when the server shuts down.
+    """
+
+    async def __call__(self, scope, receive, send):
+        """Serve a request, or the lifespan events of the server."""
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        return await super().__call__(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Close the connections of the database threads at shutdown."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await sync_to_async(shutdown, thread_sensitive=False)()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def resolve_request(self, request):
+        """Resolve a request, to the async variant of its view if any."""
+        match = super().resolve_request(request)
+        asgi_view = getattr(match.func, "asgi_view", None)
+        if asgi_view is not None:
+            match.func = asgi_view
+        return match
+
+    async def send_response(self, response, send):
+        """Send a response, reading async streaming content with async for."""
+        if not getattr(response, "is_async", False):
+            return await super().send_response(response, send)
+
+        headers = [
+            (str(header).encode("ascii"), str(value).encode("latin1"))
+            for header, value in response.items()
+        ]
+        for cookie in response.cookies.values():
+            value = cookie.output(header="").encode("ascii").strip()
+            headers.append((b"Set-Cookie", value))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": headers,
+            }
+        )
+        async for part in response.streaming_content:
+            for chunk, _last in self.chunk_bytes(part):
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": True,
+                    }
+                )
+        await send({"type": "http.response.body"})
+        await sync_to_async(response.close, thread_sensitive=True)()
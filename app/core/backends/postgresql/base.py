@@ -0,0 +1,31 @@
+"""
+PostgreSQL backend checking reused connections on first use.
+"""
+
+from core.connections import check_connection
+from core.connections import execute_request_wrappers
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL connection checked once per request before it is used.
+
+    core.connections.expect_checks() clears health_check_done at the
+    start of each request, so a connection is only checked if the
+    request queries it. Queries go through the execute wrappers of the
+    current request.
+    """
+
+    health_check_done = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute_wrappers.append(execute_request_wrappers)
+
+    def ensure_connection(self):
+        """Check a connection kept from an earlier request, then open it."""
+        if not self.health_check_done:
+            self.health_check_done = True
+            if self.connection is not None:
+                check_connection(self)
+        super().ensure_connection()
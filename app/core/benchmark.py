@@ -0,0 +1,406 @@
+"""
+Benchmark data and load generation for the recipe API.
+
+seed_benchmark creates users whose recipes, tags and ingredients follow
+Zipf-like distributions: a few users own most recipes, and a few tags and
+ingredients appear in most recipes of a user. benchmark_api logs in as
+those users and runs each scenario against a running server for a set
+time at a set concurrency, over keep-alive connections, and reports the
+throughput and latency percentiles. When the server runs on the same
+Linux host, it also samples the memory of the server processes, to
+compare servers by memory per concurrent connection.
+"""
+
+import http.client
+import io
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+
+from PIL import Image
+
+PASSWORD = "benchmark-password"
+EMAIL_FORMAT = "bench{}@example.com"
+DEVICE = "benchmark"
+SCENARIOS = (
+    "list",
+    "filter",
+    "filter_related",
+    "detail",
+    "create",
+    "update",
+    "upload",
+    "export",
+    "health",
+)
+PERCENTILES = (50, 95, 99)
+
+RECIPES_PATH = "/api/recipe/recipes/"
+TAGS_PATH = "/api/recipe/tags/"
+INGREDIENTS_PATH = "/api/recipe/ingredients/"
+TOKEN_PATH = "/api/user/token/"
+HEALTH_PATH = "/api/health-check/"
+
+
+def zipf_weights(count, exponent=1.1):
+    """Return the cumulative weights of count ranks under Zipf's law."""
+    weights = []
+    total = 0.0
+    for rank in range(1, count + 1):
+        total += 1 / rank**exponent
+        weights.append(total)
+    return weights
+
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    """Return the throughput and latencies in ms of a scenario."""
+    latencies = sorted(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": (
+            sum(latencies) / len(latencies) * 1000 if latencies else None
+        ),
+    }
+    for pct in PERCENTILES:
+        value = percentile(latencies, pct)
+        summary[f"p{pct}_ms"] = value * 1000 if value is not None else None
+    return summary
+
+
+def make_image():
+    """Return the bytes of a small JPEG image."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color=(200, 120, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def server_processes(pattern):
+    """Return the IDs of the processes matching pattern.
+
+    Processes match when their command line contains pattern, or when
+    their parent matches, as workers may be started with other command
+    lines. This process and its parents, whose command lines may quote
+    pattern, never match.
+    """
+    parents = {}
+    matched = set()
+    for pid in map(int, filter(str.isdigit, os.listdir("/proc"))):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ")
+            parents[pid] = _read_field(f"/proc/{pid}/status", "PPid:")
+        except OSError:
+            continue
+        if pattern.encode() in cmdline:
+            matched.add(pid)
+
+    own = os.getpid()
+    while own:
+        matched.discard(own)
+        own = parents.get(own, 0)
+    while True:
+        children = {
+            pid
+            for pid, parent in parents.items()
+            if parent in matched and pid not in matched
+        }
+        if not children:
+            return matched
+        matched |= children
+
+
+def process_memory(pattern):
+    """Return the memory in bytes of the processes matching pattern.
+
+    Each process is counted by its proportional set size, so pages shared
+    by forked workers are counted once in total, or by its resident set
+    size on kernels without /proc/PID/smaps_rollup.
+    """
+    total = 0
+    for pid in server_processes(pattern):
+        try:
+            total += _read_field(f"/proc/{pid}/smaps_rollup", "Pss:") * 1024
+        except FileNotFoundError:
+            try:
+                total += _read_field(f"/proc/{pid}/status", "VmRSS:") * 1024
+            except OSError:
+                continue
+        except OSError:
+            continue
+    return total
+
+
+def _read_field(path, field):
+    """Return the integer value of a field of a /proc file."""
+    with open(path, encoding="ascii") as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return 0
+
+
+class MemorySampler:
+    """Thread recording the peak memory of server processes."""
+
+    def __init__(self, pattern, interval=0.2):
+        self.pattern = pattern
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, process_memory(self.pattern))
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class Client:
+    """HTTP client keeping one connection open to the server."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self._conn = None
+
+    def _connect(self):
+        """Open a new connection."""
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port)
+        return http.client.HTTPConnection(self.host, self.port)
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return its status and decoded JSON body.
+
+        A request failing on a connection the server closed is retried
+        once on a new connection.
+        """
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = self._connect()
+            try:
+                self._conn.request(method, path, body, headers or {})
+                response = self._conn.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self._conn.close()
+                self._conn = None
+                if attempt:
+                    raise
+        if response.getheader("Connection", "").lower() == "close":
+            self._conn.close()
+            self._conn = None
+        try:
+            data = json.loads(content) if content else None
+        except ValueError:
+            data = None
+        return response.status, data
+
+    def close(self):
+        """Close the connection, if open."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class Session:
+    """Token and known objects of one benchmark user."""
+
+    def __init__(self, client, index):
+        self.email = EMAIL_FORMAT.format(index)
+        status, data = client.request(
+            "POST",
+            TOKEN_PATH,
+            json.dumps(
+                {"email": self.email, "password": PASSWORD, "device": DEVICE}
+            ),
+            {"Content-Type": "application/json"},
+        )
+        if status != 200:
+            raise RuntimeError(f"Cannot log in as {self.email} ({status}).")
+        self.headers = {"Authorization": f"Token {data['token']}"}
+        self.tag_ids = self._load_ids(client, TAGS_PATH)
+        self.ingredient_ids = self._load_ids(client, INGREDIENTS_PATH)
+        self.recipe_ids = self._load_ids(client, RECIPES_PATH)
+        if not self.recipe_ids:
+            raise RuntimeError(f"{self.email} has no recipes.")
+
+    def _load_ids(self, client, path):
+        """Return the IDs on the first page of a list."""
+        status, data = client.request("GET", path, headers=self.headers)
+        if status != 200:
+            raise RuntimeError(f"Cannot list {path} ({status}).")
+        return [item["id"] for item in data["results"]]
+
+    def build(self, scenario, rng, image):
+        """Return the method, path, body and headers of a request."""
+        headers = dict(self.headers)
+        recipe_id = rng.choice(self.recipe_ids)
+        if scenario == "health":
+            return "GET", HEALTH_PATH, None, {}
+        if scenario == "list":
+            return "GET", RECIPES_PATH, None, headers
+        if scenario == "filter":
+            params = {"time_minutes_max": rng.choice((15, 30, 60))}
+            if self.tag_ids:
+                params["tags"] = rng.choice(self.tag_ids[:10])
+            return "GET", f"{RECIPES_PATH}?{urlencode(params)}", None, headers
+        if scenario == "filter_related":
+            params = {}
+            for param, ids in (
+                ("tags", self.tag_ids),
+                ("ingredients", self.ingredient_ids),
+            ):
+                sample = rng.sample(ids, min(3, len(ids)))
+                if sample:
+                    params[param] = ",".join(str(obj_id) for obj_id in sample)
+            return "GET", f"{RECIPES_PATH}?{urlencode(params)}", None, headers
+        if scenario == "detail":
+            return "GET", f"{RECIPES_PATH}{recipe_id}/", None, headers
+        if scenario == "create":
+            headers["Content-Type"] = "application/json"
+            body = {
+                "title": f"Benchmark recipe {rng.randrange(10**6)}",
+                "time_minutes": rng.randint(5, 120),
+                "price": f"{rng.uniform(1, 50):.2f}",
+                "tags": [{"name": "Benchmark"}],
+                "ingredients": [{"name": "Salt"}, {"name": "Water"}],
+            }
+            return "POST", RECIPES_PATH, json.dumps(body), headers
+        if scenario == "update":
+            headers["Content-Type"] = "application/json"
+            body = {"time_minutes": rng.randint(5, 120)}
+            return (
+                "PATCH",
+                f"{RECIPES_PATH}{recipe_id}/",
+                json.dumps(body),
+                headers,
+            )
+        if scenario == "upload":
+            boundary = uuid.uuid4().hex
+            headers["Content-Type"] = (
+                f"multipart/form-data; boundary={boundary}"
+            )
+            body = (
+                (
+                    f"--{boundary}\r\n"
+                    'Content-Disposition: form-data; name="image"; '
+                    'filename="benchmark.jpg"\r\n'
+                    "Content-Type: image/jpeg\r\n\r\n"
+                ).encode()
+                + image
+                + f"\r\n--{boundary}--\r\n".encode()
+            )
+            return (
+                "POST",
+                f"{RECIPES_PATH}{recipe_id}/upload-image/",
+                body,
+                headers,
+            )
+        if scenario == "export":
+            params = {"time_minutes_max": rng.choice((15, 30, 60))}
+            return (
+                "GET",
+                f"{RECIPES_PATH}export/?{urlencode(params)}",
+                None,
+                headers,
+            )
+        raise ValueError(f"Unknown scenario {scenario}.")
+
+
+def login(url, users):
+    """Log in as the first benchmark users and return their sessions."""
+    client = Client(url)
+    try:
+        return [Session(client, index) for index in range(users)]
+    finally:
+        client.close()
+
+
+def run_scenario(
+    url,
+    sessions,
+    scenario,
+    concurrency,
+    duration,
+    seed=0,
+    server_process=None,
+):
+    """Send the requests of a scenario for duration seconds.
+
+    Each of the concurrency threads sends one request at a time, as a
+    random user, and the summary counts responses with a 4xx or 5xx
+    status as errors. With server_process, the summary has the peak
+    memory in bytes of the matching processes.
+    """
+    image = make_image()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def work(worker):
+        client = Client(url)
+        rng = random.Random(f"{seed}-{scenario}-{worker}")
+        own_latencies = []
+        own_errors = 0
+        while time.perf_counter() < deadline:
+            session = rng.choice(sessions)
+            method, path, body, headers = session.build(scenario, rng, image)
+            sent = time.perf_counter()
+            try:
+                status, _data = client.request(method, path, body, headers)
+            except (http.client.HTTPException, OSError):
+                status = None
+            own_latencies.append(time.perf_counter() - sent)
+            if status is None or status >= 400:
+                own_errors += 1
+        client.close()
+        with lock:
+            latencies.extend(own_latencies)
+            errors[0] += own_errors
+
+    threads = [
+        threading.Thread(target=work, args=(worker,))
+        for worker in range(concurrency)
+    ]
+    sampler = MemorySampler(server_process) if server_process else None
+    with sampler or nullcontext():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    summary = summarize(latencies, errors[0], time.perf_counter() - start)
+    if server_process:
+        summary["memory_peak"] = sampler.peak  # pyright: ignore
+    return summary
@@ -0,0 +1,82 @@
+"""
+Database connection reuse and health checks.
+
+Django 3.2 keeps connections open for CONN_MAX_AGE seconds but does not
+check them before reuse, so a connection dropped by the server or a pooler
+fails the first query of the next request. Reused connections are checked
+before their first query in each request when CONN_HEALTH_CHECKS is
+set, as Django 4.1 does, by the backend in core.backends.postgresql.
+Connections a request does not query are not checked. The connections
+opened, reused and discarded are counted in memory by each process and
+added up across workers by core.metrics.
+
+The backend also runs the execute wrappers of the current request, kept
+in a context variable, on every connection. Context variables follow a
+request onto the threads it runs code on, so middleware sees its queries
+whether they run in the request thread, on the thread Django runs sync
+views on under ASGI, or on the database threads of core.asgi.
+"""
+
+import contextvars
+import functools
+
+from core.metrics import DB_CONNECTIONS
+from core.metrics import collect
+from django.db import connections
+
+STATS = ("opened", "reused", "discarded")
+
+execute_wrappers = contextvars.ContextVar("execute_wrappers", default=())
+
+
+def count_opened():
+    """Count a newly opened connection."""
+    DB_CONNECTIONS.inc("opened")
+
+
+def expect_checks():
+    """Have each connection checked before its next use.
+
+    Called at the start of each request; the check itself runs when the
+    request first queries the connection.
+    """
+    for conn in connections.all():
+        conn.health_check_done = False
+
+
+def execute_request_wrappers(execute, sql, params, many, context):
+    """Run a query through the execute wrappers of the current request."""
+    for wrapper in reversed(execute_wrappers.get()):
+        execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def check_connection(conn):
+    """Check a connection kept open from an earlier request.
+
+    A connection failing the check is closed, so it is opened again for
+    the query about to run.
+    """
+    check = conn.settings_dict.get("CONN_HEALTH_CHECKS")
+    if check and not conn.in_atomic_block and not conn.is_usable():
+        conn.close()
+        DB_CONNECTIONS.inc("discarded")
+    else:
+        DB_CONNECTIONS.inc("reused")
+
+
+def get_stats():
+    """Return the connection counters of all workers.
+
+    The share of reused connections is included.
+    """
+    values = collect(DB_CONNECTIONS)
+    stats = {stat: values.get((stat,), 0) for stat in STATS}
+    used = stats["opened"] + stats["reused"]
+    stats["reuse_rate"] = stats["reused"] / used if used else 0.0
+    return stats
+
+
+def reset_stats():
+    """Reset the connection counters of this process."""
+    DB_CONNECTIONS.reset()
@@ -0,0 +1,97 @@
+"""
+Password hashing with tunable Argon2 on a bounded executor.
+
+Hashing is the most expensive part of logging in or registering. Hashes
+run on a small thread pool per process (argon2 releases the GIL), which
+caps the CPU and memory spent on concurrent logins. When the pool and its
+queue are full, the request is refused with 503 instead of piling up
+behind it.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework import status
+
+
+class HashingBusy(exceptions.APIException):
+    """Too many passwords are being hashed at once."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("Too many login attempts, try again shortly.")
+    default_code = "hashing_busy"
+
+
+class BoundedExecutor:
+    """Thread pool accepting a bounded number of pending calls."""
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Create the pool on first use, after any worker fork."""
+        with self._lock:
+            if self._executor is None:
+                workers = settings.PASSWORD_HASH_WORKERS
+                self._slots = threading.BoundedSemaphore(
+                    workers + settings.PASSWORD_HASH_QUEUE
+                )
+                self._executor = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix="password-hash",
+                )
+
+    def run(self, fn, *args):
+        """Run fn on the pool and return its result.
+
+        Raises HashingBusy if no slot frees up within PASSWORD_HASH_WAIT
+        seconds.
+        """
+        if self._executor is None:
+            self._start()
+        if not self._slots.acquire(timeout=settings.PASSWORD_HASH_WAIT):
+            raise HashingBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _future: self._slots.release())
+        return future.result()
+
+
+executor = BoundedExecutor()
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2 hasher with costs from the settings, run on the executor.
+
+    Hashes made with other costs are upgraded on the next login, as
+    Django rehashes passwords whose hasher reports must_update().
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+    def encode(self, password, salt):
+        """Hash a password on the executor."""
+        return executor.run(super().encode, password, salt)
+
+    def verify(self, password, encoded):
+        """Check a password on the executor."""
+        return executor.run(super().verify, password, encoded)
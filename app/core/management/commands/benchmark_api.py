@@ -0,0 +1,182 @@
+"""
+Django command to benchmark a running recipe API.
+"""
+
+import json
+import subprocess
+from datetime import datetime
+from datetime import timezone
+
+from core.benchmark import SCENARIOS
+from core.benchmark import login
+from core.benchmark import process_memory
+from core.benchmark import run_scenario
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+
+def git_revision():
+    """Return the current git commit, if known."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+class Command(BaseCommand):
+    """Django command to load test the API and report latencies."""
+
+    help = (
+        "Log in as the users created by seed_benchmark and send requests "
+        "for each scenario to a running server, reporting the throughput "
+        "and the p50, p95 and p99 latencies."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://localhost",
+            help="Server to benchmark, such as the proxy in front of uWSGI",
+        )
+        parser.add_argument(
+            "--scenarios",
+            nargs="+",
+            choices=SCENARIOS,
+            default=list(SCENARIOS),
+            help="Scenarios to run, one after the other",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=10,
+            help="Benchmark users to send requests as",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Requests in flight at once",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=30,
+            help="Seconds each scenario runs",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=float,
+            default=5,
+            help="Seconds each scenario runs before being measured",
+        )
+        parser.add_argument(
+            "--server-process",
+            help=(
+                "Text in the command line of the server processes, such as "
+                "uwsgi or uvicorn, to measure their memory when they run "
+                "on this host"
+            ),
+        )
+        parser.add_argument("--output", help="JSON file to save results to")
+        parser.add_argument(
+            "--compare",
+            help="JSON results of an earlier run to compare with",
+        )
+        parser.add_argument(
+            "--label",
+            help="Name of the run, the git commit by default",
+        )
+
+    def handle(self, *args, **options):  # pyright: ignore
+        """Entrypoint for command."""
+        server_process = options["server_process"]
+        # Measured before any request, as the servers keep memory they
+        # allocate while under load.
+        idle = process_memory(server_process) if server_process else None
+        if idle == 0:
+            raise CommandError(f"No process matches {server_process}.")
+        try:
+            sessions = login(options["url"], options["users"])
+        except (OSError, RuntimeError) as exc:
+            raise CommandError(f"Cannot start the benchmark: {exc}")
+
+        results = {
+            "label": options["label"] or git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "url": options["url"],
+            "users": options["users"],
+            "concurrency": options["concurrency"],
+            "duration": options["duration"],
+            "memory_idle": idle,
+            "scenarios": {},
+        }
+        for scenario in options["scenarios"]:
+            args = (options["url"], sessions, scenario, options["concurrency"])
+            if options["warmup"] > 0:
+                run_scenario(*args, options["warmup"])
+            summary = run_scenario(
+                *args,
+                options["duration"],
+                server_process=server_process,
+            )
+            if server_process:
+                summary["memory_per_connection"] = (
+                    summary["memory_peak"] - idle
+                ) / options["concurrency"]
+            results["scenarios"][scenario] = summary
+            self.stdout.write(self._format(scenario, summary))
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                self._compare(results, json.load(f))
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(
+                self.style.SUCCESS(f"Saved results to {options['output']}.")
+            )
+
+    def _format(self, scenario, summary):
+        """Return the report line of a scenario."""
+        if not summary["requests"]:
+            return f"{scenario:<8} no requests completed"
+        line = (
+            f"{scenario:<8} {summary['throughput']:8.1f} req/s  "
+            f"p50 {summary['p50_ms']:7.1f} ms  "
+            f"p95 {summary['p95_ms']:7.1f} ms  "
+            f"p99 {summary['p99_ms']:7.1f} ms  "
+            f"{summary['errors']} errors / {summary['requests']}"
+        )
+        if "memory_peak" in summary:
+            line += (
+                f"  peak {summary['memory_peak'] / 2**20:6.1f} MiB  "
+                f"{summary['memory_per_connection'] / 2**10:6.1f} KiB/conn"
+            )
+        return line
+
+    def _compare(self, results, baseline):
+        """Report the change of each scenario from a baseline run."""
+        label = baseline.get("label") or "baseline"
+        self.stdout.write(f"Compared with {label}:")
+        for scenario, summary in results["scenarios"].items():
+            before = baseline.get("scenarios", {}).get(scenario)
+            if not before or not before["requests"] or not summary["requests"]:
+                continue
+            changes = [
+                f"{key} {(summary[key] / before[key] - 1) * 100:+.1f}%"
+                for key in (
+                    "throughput",
+                    "p50_ms",
+                    "p95_ms",
+                    "p99_ms",
+                    "memory_peak",
+                )
+                if before.get(key) and summary.get(key)
+            ]
+            self.stdout.write(f"{scenario:<8} " + "  ".join(changes))
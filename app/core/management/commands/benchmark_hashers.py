@@ -0,0 +1,68 @@
+"""
+Django command to measure password hashing throughput.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Django command to report password checks per second per core."""
+
+    help = (
+        "Check a password repeatedly with each hasher and report the "
+        "checks per second, which bound the logins per second per core."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=20,
+            help="Password checks per hasher and thread.",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=1,
+            help="Checks run at once; use the number of cores to measure "
+            "a whole process.",
+        )
+        parser.add_argument(
+            "--hashers",
+            nargs="+",
+            default=["default", "pbkdf2_sha256"],
+            help="Hasher algorithms to compare.",
+        )
+
+    def _measure(self, hasher, encoded, iterations, threads):
+        """Return the checks per second of a hasher."""
+
+        def check(_i):
+            for _j in range(iterations):
+                hasher.verify("benchmark-password", encoded)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(check, range(threads)))
+        return iterations * threads / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):  # pyright: ignore
+        """Entrypoint for command."""
+        threads = options["threads"]
+        for algorithm in options["hashers"]:
+            hasher = get_hasher(algorithm)
+            encoded = hasher.encode("benchmark-password", hasher.salt())
+            rate = self._measure(
+                hasher,
+                encoded,
+                options["iterations"],
+                threads,
+            )
+            self.stdout.write(
+                f"{hasher.algorithm}: {rate:.1f} checks/s with {threads} "
+                f"thread(s), {rate / threads:.1f} per thread"
+            )
@@ -0,0 +1,105 @@
+"""
+Django command to import recipes from an NDJSON file.
+"""
+
+import json
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from recipe.bulk import RecipeImporter
+from recipe.serializers import RecipeDetailSerializer
+from rest_framework.exceptions import ValidationError
+
+
+class Command(BaseCommand):
+    """Django command to import recipes for a user."""
+
+    help = (
+        "Import recipes from an NDJSON file, one recipe per line, in the "
+        "format produced by the recipe export API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="NDJSON file to read, or - for stdin")
+        parser.add_argument(
+            "--email",
+            required=True,
+            help="Email of the user owning the imported recipes",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.BULK_CHUNK_SIZE,
+            help="Recipes inserted per transaction",
+        )
+        parser.add_argument(
+            "--progress-every",
+            type=int,
+            default=10000,
+            help="Report progress after this many lines",
+        )
+
+    def handle(self, *args, **options):  # pyright: ignore
+        """Entrypoint for command."""
+        try:
+            user = get_user_model().objects.get(email=options["email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist.")
+
+        importer = RecipeImporter(user, batch_size=options["batch_size"])
+        every = options["progress_every"]
+        if options["path"] == "-":
+            stats = self._import(sys.stdin, importer, every)
+        else:
+            with open(options["path"], encoding="utf-8") as lines:
+                stats = self._import(lines, importer, every)
+
+        imported, failed, elapsed = stats
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} recipes, {failed} invalid lines "
+                f"skipped in {elapsed:.1f}s "
+                f"({imported / max(elapsed, 1e-9):.0f} recipes/s)."
+            )
+        )
+
+    def _import(self, lines, importer, progress_every):
+        """Validate and queue each line, returning import statistics."""
+        # A single serializer validates every line so its fields are only
+        # built once.
+        serializer = RecipeDetailSerializer()
+        start = time.monotonic()
+        failed = 0
+        line_no = 0
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                failed += 1
+                self.stderr.write(f"Line {line_no}: invalid JSON ({exc}).")
+                continue
+            if not isinstance(record, dict):
+                failed += 1
+                self.stderr.write(f"Line {line_no}: expected an object.")
+                continue
+            record.pop("id", None)
+            record.pop("image", None)
+            try:
+                importer.add(serializer.run_validation(record))
+            except ValidationError as exc:
+                failed += 1
+                self.stderr.write(f"Line {line_no}: {exc.detail}")
+            if line_no % progress_every == 0:
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f"{line_no} lines read, {importer.imported} recipes "
+                    f"imported ({line_no / elapsed:.0f} lines/s)."
+                )
+        importer.flush()
+        return importer.imported, failed, time.monotonic() - start
@@ -0,0 +1,41 @@
+"""
+Django command to process queued recipe image jobs.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from recipe.images import process_job
+
+
+class Command(BaseCommand):
+    """Django command to generate resized recipe images."""
+
+    help = "Generate resized copies of uploaded recipe images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when no jobs are pending instead of polling",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls when the queue is empty",
+        )
+
+    def handle(self, *args, **options):  # pyright: ignore
+        """Entrypoint for command."""
+        processed = 0
+        while True:
+            job = process_job()
+            if job is not None:
+                processed += 1
+                self.stdout.write(f"Job {job.id}: {job.status}")
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs."))
@@ -0,0 +1,25 @@
+"""
+Django command to delete expired API tokens and login attempt counts.
+"""
+
+from django.core.management.base import BaseCommand
+from user.throttles import prune_login_attempts
+from user.tokens import prune_tokens
+
+
+class Command(BaseCommand):
+    """Django command to prune expired API tokens in batches."""
+
+    help = (
+        "Delete expired API tokens, TOKEN_PRUNE_BATCH_SIZE rows per "
+        "transaction, and expired login attempt counts."
+    )
+
+    def handle(self, *args, **options):  # pyright: ignore
+        """Entrypoint for command."""
+        deleted = prune_tokens()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} tokens."))
+        deleted = prune_login_attempts()
+        self.stdout.write(
+            self.style.SUCCESS(f"Pruned {deleted} login attempt counts.")
+        )
@@ -0,0 +1,20 @@
+"""
+Django command to delete expired deletion records.
+"""
+
+from django.core.management.base import BaseCommand
+from recipe.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    """Django command to prune tombstones past their retention period."""
+
+    help = (
+        "Delete the records of deleted recipes, tags and ingredients older "
+        "than TOMBSTONE_RETENTION_DAYS."
+    )
+
+    def handle(self, *args, **options):  # pyright: ignore
+        """Entrypoint for command."""
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} tombstones."))
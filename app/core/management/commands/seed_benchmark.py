@@ -0,0 +1,183 @@
+"""
+Django command to seed data for the API benchmark.
+"""
+
+import bisect
+import random
+from decimal import Decimal
+
+from core.benchmark import EMAIL_FORMAT
+from core.benchmark import PASSWORD
+from core.benchmark import zipf_weights
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from recipe.bulk import RecipeImporter
+
+TAG_WORDS = (
+    "Vegan",
+    "Vegetarian",
+    "Quick",
+    "Dinner",
+    "Breakfast",
+    "Dessert",
+    "Spicy",
+    "Healthy",
+    "Comfort",
+    "Party",
+)
+INGREDIENT_WORDS = (
+    "Salt",
+    "Garlic",
+    "Onion",
+    "Olive oil",
+    "Butter",
+    "Flour",
+    "Egg",
+    "Tomato",
+    "Rice",
+    "Chicken",
+    "Lemon",
+    "Pepper",
+)
+DISHES = ("Stew", "Salad", "Soup", "Curry", "Pie", "Pasta", "Bake", "Tacos")
+
+
+def vocabulary(words, size):
+    """Return size distinct names built from words."""
+    names = []
+    for i in range(size):
+        round_, word = divmod(i, len(words))
+        names.append(f"{words[word]} {round_}" if round_ else words[word])
+    return names
+
+
+class Command(BaseCommand):
+    """Django command to create benchmark users and their recipes."""
+
+    help = (
+        "Create benchmark users with skewed numbers of recipes, tags and "
+        f"ingredients. Users are {EMAIL_FORMAT.format('N')} with password "
+        f"{PASSWORD}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=50,
+            help="Benchmark users to create",
+        )
+        parser.add_argument(
+            "--recipes",
+            type=int,
+            default=20000,
+            help="Recipes to create in total, most of them for few users",
+        )
+        parser.add_argument(
+            "--tags",
+            type=int,
+            default=40,
+            help="Distinct tags per user",
+        )
+        parser.add_argument(
+            "--ingredients",
+            type=int,
+            default=300,
+            help="Distinct ingredients per user",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Random seed, so runs create the same data",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Delete existing benchmark users first",
+        )
+
+    def handle(self, *args, **options):  # pyright: ignore
+        """Entrypoint for command."""
+        users = options["users"]
+        if users < 1 or options["recipes"] < users:
+            raise CommandError("Create at least one recipe per user.")
+        emails = [EMAIL_FORMAT.format(i) for i in range(users)]
+        existing = get_user_model().objects.filter(email__in=emails)
+        if options["reset"]:
+            existing.delete()
+        elif existing.exists():
+            raise CommandError(
+                "Benchmark users exist already, use --reset to replace them."
+            )
+
+        rng = random.Random(options["seed"])
+        tags = vocabulary(TAG_WORDS, options["tags"])
+        ingredients = vocabulary(INGREDIENT_WORDS, options["ingredients"])
+        tag_weights = zipf_weights(len(tags))
+        ingredient_weights = zipf_weights(len(ingredients))
+        # Hashing the password once keeps seeding fast.
+        password = make_password(PASSWORD)
+
+        user_weights = zipf_weights(users)
+        extra = options["recipes"] - users
+        counts = [
+            1 + round(extra * (weight - previous) / user_weights[-1])
+            for previous, weight in zip([0.0] + user_weights, user_weights)
+        ]
+        for email, count in zip(emails, counts):
+            user = get_user_model().objects.create(
+                email=email,
+                name=email.split("@")[0],
+                password=password,
+            )
+            importer = RecipeImporter(user)
+            for _i in range(count):
+                importer.add(
+                    self._recipe(
+                        rng,
+                        tags,
+                        tag_weights,
+                        ingredients,
+                        ingredient_weights,
+                    )
+                )
+            importer.flush()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {users} users and {sum(counts)} recipes, from "
+                f"{max(counts)} to {min(counts)} per user."
+            )
+        )
+
+    def _pick(self, rng, names, weights, count):
+        """Return up to count distinct names drawn by their weights."""
+        picked = {
+            names[bisect.bisect(weights, rng.random() * weights[-1])]
+            for _i in range(count)
+        }
+        return [{"name": name} for name in sorted(picked)]
+
+    def _recipe(self, rng, tags, tag_weights, ingredients, ingredient_weights):
+        """Return the data of a random recipe."""
+        main = self._pick(rng, ingredients, ingredient_weights, 1)[0]["name"]
+        # Times around 30 minutes and prices around 10 with long tails.
+        minutes = round(rng.lognormvariate(3.4, 0.7))
+        price = rng.lognormvariate(2.3, 0.6)
+        style = rng.choice(TAG_WORDS).lower()
+        return {
+            "title": f"{main} {rng.choice(DISHES)}",
+            "time_minutes": max(1, min(600, minutes)),
+            "price": Decimal(f"{max(0.5, min(999.99, price)):.2f}"),
+            "description": f"A {style} {main.lower()} dish.",
+            "tags": self._pick(rng, tags, tag_weights, rng.randint(0, 5)),
+            "ingredients": self._pick(
+                rng,
+                ingredients,
+                ingredient_weights,
+                rng.randint(3, 12),
+            ),
+        }
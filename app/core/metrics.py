@@ -0,0 +1,422 @@
+"""
+Request metrics in the Prometheus text format.
+
+Metrics are kept in the memory of each process. With METRICS_DIR set,
+each process also writes them to a file of its own in that directory, at
+most every METRICS_FLUSH_SECONDS and when it exits, and the metrics
+endpoint adds up the files of all processes, so whichever worker answers
+reports them all. Updates made within METRICS_FLUSH_SECONDS of the last
+write are written by a timer, so those of an idle worker are not held
+back. The endpoint merges the files of workers that have exited into a
+single file, so counters never go back while the directory does not
+grow; scripts/run.sh empties it when the server starts.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the histogram buckets.
+SECONDS_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _format_labels(names, values, extra=""):
+    """Return the label set of a sample."""
+    pairs = [
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    """Return a sample value as Prometheus expects it."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Metric holding a value per label set."""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """Return a copy of the values of each label set."""
+        raise NotImplementedError
+
+    def merge(self, values, other):
+        """Add the values of another process to a snapshot."""
+        raise NotImplementedError
+
+    def samples(self, values=None):
+        """Yield the lines of the metric, for its own values by default."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget every value."""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    """Counter with a value per label set."""
+
+    kind = "counter"
+
+    def inc(self, *label_values):
+        """Add one to the counter of a label set."""
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def get(self, *label_values):
+        """Return the count of a label set."""
+        return self._values.get(label_values, 0)
+
+    def snapshot(self):
+        """Return a copy of the count of each label set."""
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, values, other):
+        """Add the counts of another process to a snapshot."""
+        for label_values, value in other.items():
+            values[label_values] = values.get(label_values, 0) + value
+
+    def samples(self, values=None):
+        """Yield the lines of the counter."""
+        if values is None:
+            values = self.snapshot()
+        for label_values, value in sorted(values.items()):
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}{labels} {value}"
+
+
+class Histogram(Metric):
+    """Histogram with cumulative buckets per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels, buckets):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, *label_values):
+        """Record a value for a label set."""
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [
+                    [0] * len(self.buckets),
+                    0,
+                    0,
+                ]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def get(self, *label_values):
+        """Return the number and sum of the values of a label set."""
+        entry = self._values.get(label_values)
+        return (entry[2], entry[1]) if entry else (0, 0)
+
+    def snapshot(self):
+        """Return a copy of the buckets, sum and count of each label set."""
+        with self._lock:
+            return {
+                label_values: [list(counts), total, count]
+                for label_values, (counts, total, count) in (
+                    self._values.items()
+                )
+            }
+
+    def merge(self, values, other):
+        """Add the histograms of another process to a snapshot."""
+        for label_values, (counts, total, count) in other.items():
+            entry = values.get(label_values)
+            if entry is None:
+                values[label_values] = [list(counts), total, count]
+                continue
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+
+    def samples(self, values=None):
+        """Yield the lines of the histogram."""
+        if values is None:
+            values = self.snapshot()
+        values = sorted(
+            (label_values, counts, total, count)
+            for label_values, (counts, total, count) in values.items()
+        )
+        for label_values, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labels,
+                    label_values,
+                    f'le="{_format_value(bound)}"',
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "Requests handled, sampled or not.",
+    ("view", "method", "status"),
+)
+DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Wall time of sampled requests.",
+    ("view", "method"),
+    SECONDS_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries per sampled request.",
+    ("view", "method"),
+    QUERY_BUCKETS,
+)
+DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries per sampled request.",
+    ("view", "method"),
+    SECONDS_BUCKETS,
+)
+RENDER_DURATION = Histogram(
+    "http_response_render_duration_seconds",
+    "Time spent rendering the response of sampled requests.",
+    ("view", "method"),
+    SECONDS_BUCKETS,
+)
+SERIALIZE_DURATION = Histogram(
+    "http_response_serialize_duration_seconds",
+    "Time spent serializing the data of sampled responses.",
+    ("view", "method"),
+    SECONDS_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Body size of the responses of sampled requests.",
+    ("view", "method"),
+    SIZE_BUCKETS,
+)
+RESPONSE_CACHE = Counter(
+    "response_cache_lookups_total",
+    "Lookups in the per-user response cache, by result.",
+    ("result",),
+)
+DB_CONNECTIONS = Counter(
+    "db_connections_total",
+    "Database connections opened, reused or discarded.",
+    ("event",),
+)
+METRICS = (
+    REQUESTS,
+    DURATION,
+    DB_QUERIES,
+    DB_DURATION,
+    SERIALIZE_DURATION,
+    RENDER_DURATION,
+    RESPONSE_SIZE,
+    RESPONSE_CACHE,
+    DB_CONNECTIONS,
+)
+
+
+# Files in METRICS_DIR holding the metrics of the workers that have
+# exited, and serializing the endpoints merging them.
+EXITED_FILE = "exited.json"
+LOCK_FILE = "metrics.lock"
+
+_last_flush = 0.0
+_timer = None
+_flush_lock = threading.Lock()
+
+
+def _process_file():
+    """Return the metrics file of this process."""
+    return os.path.join(settings.METRICS_DIR, f"{os.getpid()}.json")
+
+
+def _write(path, snapshots):
+    """Write the snapshots of the metrics to a file, atomically."""
+    data = {
+        name: [
+            [list(label_values), value]
+            for label_values, value in values.items()
+        ]
+        for name, values in snapshots.items()
+    }
+    fd, temp = tempfile.mkstemp(dir=settings.METRICS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as file:
+        json.dump(data, file)
+    os.replace(temp, path)
+
+
+def _read(path):
+    """Return the snapshots of the metrics in a file, or None."""
+    try:
+        with open(path) as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return {
+        metric.name: {
+            tuple(label_values): value
+            for label_values, value in data.get(metric.name, [])
+        }
+        for metric in METRICS
+    }
+
+
+def _merge(snapshots, other):
+    """Add the snapshots of another process to snapshots."""
+    for metric in METRICS:
+        metric.merge(snapshots[metric.name], other[metric.name])
+
+
+def flush(force=False):
+    """Write the metrics of this process to METRICS_DIR, if set.
+
+    Unless forced, the file is written at most every
+    METRICS_FLUSH_SECONDS; a later call schedules the next write instead.
+    It is replaced atomically, so readers never see a partial file.
+    """
+    global _last_flush, _timer
+    if not settings.METRICS_DIR:
+        return
+    with _flush_lock:
+        now = time.monotonic()
+        wait = _last_flush + settings.METRICS_FLUSH_SECONDS - now
+        if not force and wait > 0:
+            if _timer is None:
+                _timer = threading.Timer(wait, flush, kwargs={"force": True})
+                _timer.daemon = True
+                _timer.start()
+            return
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        _last_flush = now
+        _write(
+            _process_file(),
+            {metric.name: metric.snapshot() for metric in METRICS},
+        )
+
+
+atexit.register(flush, force=True)
+
+
+def _alive(pid):
+    """Return whether a process is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge_exited():
+    """Merge the files of the workers that have exited into EXITED_FILE."""
+    exited_file = os.path.join(settings.METRICS_DIR, EXITED_FILE)
+    exited = None
+    for entry in os.scandir(settings.METRICS_DIR):
+        pid, ext = os.path.splitext(entry.name)
+        if ext != ".json" or not pid.isdigit() or _alive(int(pid)):
+            continue
+        if exited is None:
+            exited = _read(exited_file) or {m.name: {} for m in METRICS}
+        data = _read(entry.path)
+        if data is not None:
+            _merge(exited, data)
+            _write(exited_file, exited)
+        os.remove(entry.path)
+
+
+def _collect():
+    """Return the snapshots of every metric, for all processes if shared."""
+    if not settings.METRICS_DIR:
+        return {metric.name: metric.snapshot() for metric in METRICS}
+    flush(force=True)
+    snapshots = {metric.name: {} for metric in METRICS}
+    lock_file = os.path.join(settings.METRICS_DIR, LOCK_FILE)
+    with open(lock_file, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _merge_exited()
+        for entry in os.scandir(settings.METRICS_DIR):
+            if not entry.name.endswith(".json"):
+                continue
+            data = _read(entry.path)
+            if data is not None:
+                _merge(snapshots, data)
+    return snapshots
+
+
+def collect(metric):
+    """Return the values of a metric, for all processes if shared."""
+    return _collect()[metric.name]
+
+
+def render_metrics():
+    """Return every metric in the Prometheus text format."""
+    snapshots = _collect()
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples(snapshots[metric.name]))
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics():
+    """Forget every recorded value."""
+    for metric in METRICS:
+        metric.reset()
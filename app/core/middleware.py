@@ -0,0 +1,199 @@
+"""
+Middleware measuring requests.
+
+MetricsMiddleware counts every request and times a sample of them,
+METRICS_SAMPLE_RATE of the total. For each sampled request it records,
+per view, the wall time, the number and total time of the database
+queries, the time spent serializing and rendering the response and its
+size. Serialization is timed in views using TimedSerializationMixin;
+queries run while serializing count in both times.
+
+QueryInspectionMiddleware reports slow queries, N+1 patterns and views
+over their query budget, as described in core.queries.
+
+Both run under WSGI and ASGI. Their execute wrappers are kept in a
+context variable the database backend reads, so they see the queries of
+a request on whichever thread it runs them, as described in
+core.connections.
+"""
+
+import asyncio
+import random
+import time
+
+from core.connections import execute_wrappers
+from core.metrics import DB_DURATION
+from core.metrics import DB_QUERIES
+from core.metrics import DURATION
+from core.metrics import RENDER_DURATION
+from core.metrics import REQUESTS
+from core.metrics import RESPONSE_SIZE
+from core.metrics import SERIALIZE_DURATION
+from core.metrics import flush as flush_metrics
+from core.queries import QueryInspector
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+
+def _view_name(request):
+    """Return the name of the view that handled a request."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name
+
+
+class QueryTimer:
+    """Database execute wrapper counting and timing queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestTimer:
+    """Measurements of one sampled request."""
+
+    def __init__(self):
+        self.queries = QueryTimer()
+        self.render_start = None
+        self.render_duration = 0.0
+        self.serialize_duration = 0.0
+
+    def rendered(self, response):
+        """Record the end of rendering, as a post-render callback."""
+        self.render_duration = time.perf_counter() - self.render_start
+
+    def serializing(self, to_representation):
+        """Return to_representation, adding its run time to the request."""
+
+        def timed(instance):
+            start = time.perf_counter()
+            try:
+                return to_representation(instance)
+            finally:
+                self.serialize_duration += time.perf_counter() - start
+
+        return timed
+
+
+class TimedSerializationMixin:
+    """View mixin timing the serializers of sampled requests."""
+
+    def get_serializer(self, *args, **kwargs):
+        """Return a serializer whose output is timed if sampled."""
+        serializer = super().get_serializer(  # pyright: ignore
+            *args,
+            **kwargs,
+        )
+        request = self.request  # pyright: ignore
+        timer = getattr(request, "_metrics_timer", None)
+        if timer is not None:
+            serializer.to_representation = timer.serializing(
+                serializer.to_representation
+            )
+        return serializer
+
+
+class ExecuteWrapperMiddleware(MiddlewareMixin):
+    """Base of middleware wrapping the queries of each request."""
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = execute_wrappers.set(
+            execute_wrappers.get() + tuple(self.get_wrappers(request))
+        )
+        try:
+            start = time.perf_counter()
+            response = self.get_response(request)
+        finally:
+            execute_wrappers.reset(token)
+        return self.record(request, response, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        token = execute_wrappers.set(
+            execute_wrappers.get() + tuple(self.get_wrappers(request))
+        )
+        try:
+            start = time.perf_counter()
+            response = await self.get_response(request)
+        finally:
+            execute_wrappers.reset(token)
+        return self.record(request, response, time.perf_counter() - start)
+
+    def get_wrappers(self, request):
+        """Return the execute wrappers of a request."""
+        raise NotImplementedError
+
+    def record(self, request, response, duration):
+        """Process the response once the view has run, and return it."""
+        raise NotImplementedError
+
+
+class MetricsMiddleware(ExecuteWrapperMiddleware):
+    """Record the metrics of each request, timing a sample of them."""
+
+    def get_wrappers(self, request):
+        """Return the query timer of a sampled request."""
+        if (
+            not settings.METRICS_ENABLED
+            or random.random() >= settings.METRICS_SAMPLE_RATE
+        ):
+            return []
+        request._metrics_timer = RequestTimer()
+        return [request._metrics_timer.queries]
+
+    def record(self, request, response, duration):
+        """Count the request, and record its measurements if sampled."""
+        if not settings.METRICS_ENABLED:
+            # Other modules count their own metrics.
+            flush_metrics()
+            return response
+        view, method = _view_name(request), request.method
+        REQUESTS.inc(view, method, str(response.status_code))
+        timer = getattr(request, "_metrics_timer", None)
+        if timer is not None:
+            DURATION.observe(duration, view, method)
+            DB_QUERIES.observe(timer.queries.count, view, method)
+            DB_DURATION.observe(timer.queries.duration, view, method)
+            SERIALIZE_DURATION.observe(timer.serialize_duration, view, method)
+            RENDER_DURATION.observe(timer.render_duration, view, method)
+            if not response.streaming:
+                RESPONSE_SIZE.observe(len(response.content), view, method)
+        flush_metrics()
+        return response
+
+    def process_template_response(self, request, response):
+        """Time the rendering of API and template responses."""
+        timer = getattr(request, "_metrics_timer", None)
+        if timer is not None:
+            timer.render_start = time.perf_counter()
+            response.add_post_render_callback(timer.rendered)
+        return response
+
+
+class QueryInspectionMiddleware(ExecuteWrapperMiddleware):
+    """Inspect the queries of each request when QUERY_INSPECTION is set."""
+
+    def get_wrappers(self, request):
+        """Return the query inspector of the request, if inspected."""
+        if not settings.QUERY_INSPECTION:
+            return []
+        request._query_inspector = QueryInspector()
+        return [request._query_inspector]
+
+    def record(self, request, response, duration):
+        """Report the queries of the request."""
+        inspector = getattr(request, "_query_inspector", None)
+        if inspector is not None:
+            inspector.report(request, _view_name(request))
+        return response
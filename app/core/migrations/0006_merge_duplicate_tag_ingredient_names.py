@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:13
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags and ingredients sharing a user and name into one row."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = Recipe._meta.get_field(field_name).remote_field.through
+        column = f'{model_name.lower()}_id'
+        duplicates = (
+            model.objects.values('user_id', 'name')
+            .annotate(keep_id=Min('id'), count=Count('id'))
+            .filter(count__gt=1)
+        )
+        for dup in duplicates:
+            other_ids = list(
+                model.objects.filter(user_id=dup['user_id'], name=dup['name'])
+                .exclude(id=dup['keep_id'])
+                .values_list('id', flat=True)
+            )
+            recipe_ids = (
+                through.objects.filter(**{f'{column}__in': other_ids})
+                .values_list('recipe_id', flat=True)
+                .distinct()
+            )
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe_id, **{column: dup['keep_id']})
+                    for recipe_id in recipe_ids
+                ],
+                ignore_conflicts=True,
+            )
+            model.objects.filter(id__in=other_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,166 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:57
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The search document of a recipe weighs the title highest, then the
+# names of its tags and ingredients, then the description.
+SEARCH_SQL = """
+CREATE FUNCTION core_recipe_search_document(
+    recipe_id bigint, title text, description text
+) RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT
+        setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(t.name, ' ')
+            FROM core_recipe_tags rt JOIN core_tag t ON t.id = rt.tag_id
+            WHERE rt.recipe_id = $1
+        ), '')), 'B')
+        || setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM core_recipe_ingredients ri
+            JOIN core_ingredient i ON i.id = ri.ingredient_id
+            WHERE ri.recipe_id = $1
+        ), '')), 'B')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'C')
+$$;
+
+CREATE FUNCTION core_recipe_refresh_search(recipe_ids bigint[])
+RETURNS void LANGUAGE sql AS $$
+    UPDATE core_recipe
+    SET search_vector = core_recipe_search_document(id, title, description)
+    WHERE id = ANY(recipe_ids)
+$$;
+
+CREATE FUNCTION core_recipe_search_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := core_recipe_search_document(
+        NEW.id, NEW.title, NEW.description
+    );
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER core_recipe_search
+BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+FOR EACH ROW EXECUTE FUNCTION core_recipe_search_trigger();
+
+-- Links are refreshed once per statement, so bulk inserts and deletes of
+-- links update each recipe once.
+CREATE FUNCTION core_recipe_links_inserted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_recipe_refresh_search(
+        ARRAY(SELECT DISTINCT recipe_id FROM new_links)
+    );
+    RETURN NULL;
+END
+$$;
+
+CREATE FUNCTION core_recipe_links_deleted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_recipe_refresh_search(
+        ARRAY(SELECT DISTINCT recipe_id FROM old_links)
+    );
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_recipe_tags_inserted
+AFTER INSERT ON core_recipe_tags REFERENCING NEW TABLE AS new_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_links_inserted();
+
+CREATE TRIGGER core_recipe_tags_deleted
+AFTER DELETE ON core_recipe_tags REFERENCING OLD TABLE AS old_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_links_deleted();
+
+CREATE TRIGGER core_recipe_ingredients_inserted
+AFTER INSERT ON core_recipe_ingredients REFERENCING NEW TABLE AS new_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_links_inserted();
+
+CREATE TRIGGER core_recipe_ingredients_deleted
+AFTER DELETE ON core_recipe_ingredients REFERENCING OLD TABLE AS old_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_links_deleted();
+
+-- Renaming tags and ingredients refreshes the recipes linked to them.
+CREATE FUNCTION core_tag_renamed() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_recipe_refresh_search(ARRAY(
+        SELECT DISTINCT rt.recipe_id
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN core_recipe_tags rt ON rt.tag_id = n.id
+        WHERE n.name IS DISTINCT FROM o.name
+    ));
+    RETURN NULL;
+END
+$$;
+
+CREATE FUNCTION core_ingredient_renamed() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_recipe_refresh_search(ARRAY(
+        SELECT DISTINCT ri.recipe_id
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN core_recipe_ingredients ri ON ri.ingredient_id = n.id
+        WHERE n.name IS DISTINCT FROM o.name
+    ));
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_tag_renamed
+AFTER UPDATE ON core_tag
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION core_tag_renamed();
+
+CREATE TRIGGER core_ingredient_renamed
+AFTER UPDATE ON core_ingredient
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION core_ingredient_renamed();
+
+UPDATE core_recipe
+SET search_vector = core_recipe_search_document(id, title, description);
+"""
+
+REVERSE_SEARCH_SQL = """
+DROP TRIGGER core_ingredient_renamed ON core_ingredient;
+DROP TRIGGER core_tag_renamed ON core_tag;
+DROP TRIGGER core_recipe_ingredients_deleted ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_ingredients_inserted ON core_recipe_ingredients;
+DROP TRIGGER core_recipe_tags_deleted ON core_recipe_tags;
+DROP TRIGGER core_recipe_tags_inserted ON core_recipe_tags;
+DROP TRIGGER core_recipe_search ON core_recipe;
+DROP FUNCTION core_ingredient_renamed();
+DROP FUNCTION core_tag_renamed();
+DROP FUNCTION core_recipe_links_deleted();
+DROP FUNCTION core_recipe_links_inserted();
+DROP FUNCTION core_recipe_search_trigger();
+DROP FUNCTION core_recipe_refresh_search(bigint[]);
+DROP FUNCTION core_recipe_search_document(bigint, text, text);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_tombstone_and_sync_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_SQL, REVERSE_SEARCH_SQL),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ),
+    ]
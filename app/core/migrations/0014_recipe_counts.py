@@ -0,0 +1,140 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:16
+
+from django.db import migrations, models
+
+# The recipe count of a tag or ingredient follows the rows of its link
+# table. Counts are adjusted once per statement, so bulk inserts and
+# deletes of links update each tag or ingredient once. Counting also
+# touches updated_at, since the count is part of the item's data; the
+# clock time is used, as Django does, rather than the transaction start.
+COUNT_SQL = """
+CREATE FUNCTION core_tag_count_inserted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_tag t
+    SET
+        recipe_count = t.recipe_count + n.links,
+        updated_at = clock_timestamp()
+    FROM (
+        SELECT tag_id, count(*) AS links FROM new_links GROUP BY tag_id
+    ) n
+    WHERE t.id = n.tag_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE FUNCTION core_tag_count_deleted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_tag t
+    SET
+        recipe_count = t.recipe_count - o.links,
+        updated_at = clock_timestamp()
+    FROM (
+        SELECT tag_id, count(*) AS links FROM old_links GROUP BY tag_id
+    ) o
+    WHERE t.id = o.tag_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE FUNCTION core_ingredient_count_inserted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_ingredient i
+    SET
+        recipe_count = i.recipe_count + n.links,
+        updated_at = clock_timestamp()
+    FROM (
+        SELECT ingredient_id, count(*) AS links
+        FROM new_links GROUP BY ingredient_id
+    ) n
+    WHERE i.id = n.ingredient_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE FUNCTION core_ingredient_count_deleted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_ingredient i
+    SET
+        recipe_count = i.recipe_count - o.links,
+        updated_at = clock_timestamp()
+    FROM (
+        SELECT ingredient_id, count(*) AS links
+        FROM old_links GROUP BY ingredient_id
+    ) o
+    WHERE i.id = o.ingredient_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_tag_count_inserted
+AFTER INSERT ON core_recipe_tags REFERENCING NEW TABLE AS new_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_tag_count_inserted();
+
+CREATE TRIGGER core_tag_count_deleted
+AFTER DELETE ON core_recipe_tags REFERENCING OLD TABLE AS old_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_tag_count_deleted();
+
+CREATE TRIGGER core_ingredient_count_inserted
+AFTER INSERT ON core_recipe_ingredients REFERENCING NEW TABLE AS new_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_ingredient_count_inserted();
+
+CREATE TRIGGER core_ingredient_count_deleted
+AFTER DELETE ON core_recipe_ingredients REFERENCING OLD TABLE AS old_links
+FOR EACH STATEMENT EXECUTE FUNCTION core_ingredient_count_deleted();
+
+-- Touching every item sends the new counts to syncing clients.
+UPDATE core_tag t
+SET updated_at = clock_timestamp(), recipe_count = (
+    SELECT count(*) FROM core_recipe_tags rt WHERE rt.tag_id = t.id
+);
+
+UPDATE core_ingredient i
+SET updated_at = clock_timestamp(), recipe_count = (
+    SELECT count(*) FROM core_recipe_ingredients ri
+    WHERE ri.ingredient_id = i.id
+);
+"""
+
+REVERSE_COUNT_SQL = """
+DROP TRIGGER core_ingredient_count_deleted ON core_recipe_ingredients;
+DROP TRIGGER core_ingredient_count_inserted ON core_recipe_ingredients;
+DROP TRIGGER core_tag_count_deleted ON core_recipe_tags;
+DROP TRIGGER core_tag_count_inserted ON core_recipe_tags;
+DROP FUNCTION core_ingredient_count_deleted();
+DROP FUNCTION core_ingredient_count_inserted();
+DROP FUNCTION core_tag_count_deleted();
+DROP FUNCTION core_tag_count_inserted();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_time_price_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(COUNT_SQL, REVERSE_COUNT_SQL),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count', 'name'], name='ingredient_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count', 'name'], name='tag_user_count_idx'),
+        ),
+    ]
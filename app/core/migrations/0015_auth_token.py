@@ -0,0 +1,60 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:32
+
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def move_tokens(apps, schema_editor):
+    """Replace the never-expiring DRF tokens with hashed, expiring ones.
+
+    Existing keys keep working for TOKEN_TTL_DAYS, and the DRF table is
+    emptied so it no longer holds any key. Only the hashes of the keys
+    are kept, so the migration cannot be reversed.
+    """
+    Token = apps.get_model("authtoken", "Token")
+    AuthToken = apps.get_model("core", "AuthToken")
+    expires_at = timezone.now() + timedelta(days=settings.TOKEN_TTL_DAYS)
+    AuthToken.objects.bulk_create(
+        [
+            AuthToken(
+                user_id=token.user_id,
+                key_hash=hashlib.sha256(token.key.encode()).digest(),
+                expires_at=expires_at,
+            )
+            for token in Token.objects.iterator()
+        ],
+        batch_size=1000,
+    )
+    Token.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_counts'),
+        ('authtoken', '0003_tokenproxy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_hash', models.BinaryField(max_length=32, unique=True)),
+                ('device', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='authtoken',
+            index=models.Index(fields=['expires_at'], name='authtoken_expires_idx'),
+        ),
+        migrations.RunPython(move_tokens),
+    ]
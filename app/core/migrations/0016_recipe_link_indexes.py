@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-17 09:05
+
+from django.db import migrations
+
+# The recipe filters read the recipe IDs linked to a list of tags or
+# ingredients. Indexes leading with the tag or ingredient and covering
+# the recipe answer them with index-only scans instead of fetching every
+# matching link row from the table. The link tables are created by
+# Django for the many-to-many fields, so their indexes are added in SQL.
+LINK_INDEXES_SQL = """
+CREATE INDEX core_recipe_tags_tag_recipe_idx
+ON core_recipe_tags (tag_id, recipe_id);
+CREATE INDEX core_recipe_ingredients_ingredient_recipe_idx
+ON core_recipe_ingredients (ingredient_id, recipe_id);
+"""
+
+REVERSE_LINK_INDEXES_SQL = """
+DROP INDEX core_recipe_ingredients_ingredient_recipe_idx;
+DROP INDEX core_recipe_tags_tag_recipe_idx;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_auth_token'),
+    ]
+
+    operations = [
+        migrations.RunSQL(LINK_INDEXES_SQL, REVERSE_LINK_INDEXES_SQL),
+    ]
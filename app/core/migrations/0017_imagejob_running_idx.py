@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_recipe_link_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='imagejob',
+            index=models.Index(condition=models.Q(('status', 'running')), fields=['updated_at'], name='imagejob_running_idx'),
+        ),
+    ]
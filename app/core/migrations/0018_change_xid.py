@@ -0,0 +1,104 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:52
+
+from django.db import migrations, models
+
+# Rows are stamped with the ID of the transaction writing them. IDs are
+# assigned when transactions start writing, not when they commit, so
+# delta sync only reads changes below the oldest transaction still
+# running: those are final, whatever order transactions commit in.
+CHANGE_XID_SQL = """
+CREATE FUNCTION core_change_xid() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.change_xid := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER core_recipe_change_xid
+BEFORE INSERT OR UPDATE ON core_recipe
+FOR EACH ROW EXECUTE FUNCTION core_change_xid();
+
+CREATE TRIGGER core_tag_change_xid
+BEFORE INSERT OR UPDATE ON core_tag
+FOR EACH ROW EXECUTE FUNCTION core_change_xid();
+
+CREATE TRIGGER core_ingredient_change_xid
+BEFORE INSERT OR UPDATE ON core_ingredient
+FOR EACH ROW EXECUTE FUNCTION core_change_xid();
+
+CREATE TRIGGER core_tombstone_change_xid
+BEFORE INSERT OR UPDATE ON core_tombstone
+FOR EACH ROW EXECUTE FUNCTION core_change_xid();
+"""
+
+REVERSE_CHANGE_XID_SQL = """
+DROP TRIGGER core_tombstone_change_xid ON core_tombstone;
+DROP TRIGGER core_ingredient_change_xid ON core_ingredient;
+DROP TRIGGER core_tag_change_xid ON core_tag;
+DROP TRIGGER core_recipe_change_xid ON core_recipe;
+DROP FUNCTION core_change_xid();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_imagejob_running_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='ingredient_user_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_user_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='tag_user_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tombstone',
+            name='tombstone_user_deleted_idx',
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(CHANGE_XID_SQL, REVERSE_CHANGE_XID_SQL),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'change_xid', 'id'], name='ingredient_user_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'change_xid', 'id'], name='recipe_user_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'change_xid', 'id'], name='tag_user_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'change_xid', 'id'], name='tombstone_user_change_idx'),
+        ),
+    ]
@@ -0,0 +1,236 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:40
+
+from django.db import migrations
+
+# Counting only sets recipe_count. The change_xid trigger still stamps
+# the rows, so delta sync sends the new counts without updated_at being
+# touched. The rows are locked in ID order before the update, so writers
+# linking the same tags or ingredients in different orders wait for each
+# other instead of deadlocking. FOR NO KEY UPDATE is the lock the update
+# takes anyway, and it lets the foreign key checks of new links proceed.
+COUNT_SQL = """
+CREATE OR REPLACE FUNCTION core_tag_count_inserted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM 1 FROM core_tag
+    WHERE id IN (SELECT tag_id FROM new_links)
+    ORDER BY id FOR NO KEY UPDATE;
+    UPDATE core_tag t
+    SET recipe_count = t.recipe_count + n.links
+    FROM (
+        SELECT tag_id, count(*) AS links FROM new_links GROUP BY tag_id
+    ) n
+    WHERE t.id = n.tag_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION core_tag_count_deleted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM 1 FROM core_tag
+    WHERE id IN (SELECT tag_id FROM old_links)
+    ORDER BY id FOR NO KEY UPDATE;
+    UPDATE core_tag t
+    SET recipe_count = t.recipe_count - o.links
+    FROM (
+        SELECT tag_id, count(*) AS links FROM old_links GROUP BY tag_id
+    ) o
+    WHERE t.id = o.tag_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION core_ingredient_count_inserted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM 1 FROM core_ingredient
+    WHERE id IN (SELECT ingredient_id FROM new_links)
+    ORDER BY id FOR NO KEY UPDATE;
+    UPDATE core_ingredient i
+    SET recipe_count = i.recipe_count + n.links
+    FROM (
+        SELECT ingredient_id, count(*) AS links
+        FROM new_links GROUP BY ingredient_id
+    ) n
+    WHERE i.id = n.ingredient_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION core_ingredient_count_deleted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM 1 FROM core_ingredient
+    WHERE id IN (SELECT ingredient_id FROM old_links)
+    ORDER BY id FOR NO KEY UPDATE;
+    UPDATE core_ingredient i
+    SET recipe_count = i.recipe_count - o.links
+    FROM (
+        SELECT ingredient_id, count(*) AS links
+        FROM old_links GROUP BY ingredient_id
+    ) o
+    WHERE i.id = o.ingredient_id;
+    RETURN NULL;
+END
+$$;
+"""
+
+REVERSE_COUNT_SQL = """
+CREATE OR REPLACE FUNCTION core_tag_count_inserted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_tag t
+    SET
+        recipe_count = t.recipe_count + n.links,
+        updated_at = clock_timestamp()
+    FROM (
+        SELECT tag_id, count(*) AS links FROM new_links GROUP BY tag_id
+    ) n
+    WHERE t.id = n.tag_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION core_tag_count_deleted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_tag t
+    SET
+        recipe_count = t.recipe_count - o.links,
+        updated_at = clock_timestamp()
+    FROM (
+        SELECT tag_id, count(*) AS links FROM old_links GROUP BY tag_id
+    ) o
+    WHERE t.id = o.tag_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION core_ingredient_count_inserted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_ingredient i
+    SET
+        recipe_count = i.recipe_count + n.links,
+        updated_at = clock_timestamp()
+    FROM (
+        SELECT ingredient_id, count(*) AS links
+        FROM new_links GROUP BY ingredient_id
+    ) n
+    WHERE i.id = n.ingredient_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION core_ingredient_count_deleted() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE core_ingredient i
+    SET
+        recipe_count = i.recipe_count - o.links,
+        updated_at = clock_timestamp()
+    FROM (
+        SELECT ingredient_id, count(*) AS links
+        FROM old_links GROUP BY ingredient_id
+    ) o
+    WHERE i.id = o.ingredient_id;
+    RETURN NULL;
+END
+$$;
+"""
+
+# The rename triggers ran on every update of a tag or ingredient, count
+# updates included, collecting both transition tables to compare names.
+# Row triggers on the name column with a WHEN condition only run when a
+# name changes. Transition tables are not allowed with a column list.
+RENAME_SQL = """
+DROP TRIGGER core_ingredient_renamed ON core_ingredient;
+DROP TRIGGER core_tag_renamed ON core_tag;
+
+CREATE OR REPLACE FUNCTION core_tag_renamed() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_recipe_refresh_search(ARRAY(
+        SELECT recipe_id FROM core_recipe_tags WHERE tag_id = NEW.id
+    ));
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION core_ingredient_renamed() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_recipe_refresh_search(ARRAY(
+        SELECT recipe_id FROM core_recipe_ingredients
+        WHERE ingredient_id = NEW.id
+    ));
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_tag_renamed
+AFTER UPDATE OF name ON core_tag
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION core_tag_renamed();
+
+CREATE TRIGGER core_ingredient_renamed
+AFTER UPDATE OF name ON core_ingredient
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION core_ingredient_renamed();
+"""
+
+REVERSE_RENAME_SQL = """
+DROP TRIGGER core_ingredient_renamed ON core_ingredient;
+DROP TRIGGER core_tag_renamed ON core_tag;
+
+CREATE OR REPLACE FUNCTION core_tag_renamed() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_recipe_refresh_search(ARRAY(
+        SELECT DISTINCT rt.recipe_id
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN core_recipe_tags rt ON rt.tag_id = n.id
+        WHERE n.name IS DISTINCT FROM o.name
+    ));
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION core_ingredient_renamed() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM core_recipe_refresh_search(ARRAY(
+        SELECT DISTINCT ri.recipe_id
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN core_recipe_ingredients ri ON ri.ingredient_id = n.id
+        WHERE n.name IS DISTINCT FROM o.name
+    ));
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_tag_renamed
+AFTER UPDATE ON core_tag
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION core_tag_renamed();
+
+CREATE TRIGGER core_ingredient_renamed
+AFTER UPDATE ON core_ingredient
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION core_ingredient_renamed();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_autocomplete_prefix_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(COUNT_SQL, REVERSE_COUNT_SQL),
+        migrations.RunSQL(RENAME_SQL, REVERSE_RENAME_SQL),
+    ]
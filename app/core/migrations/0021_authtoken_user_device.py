@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:08
+
+from django.db import migrations, models
+
+# Logins racing each other could leave a device with several tokens. The
+# newest is kept, as the next login would have kept it; the others are
+# revoked before the constraint is added, which cannot be undone.
+DEDUPLICATE_SQL = """
+DELETE FROM core_authtoken t
+USING core_authtoken n
+WHERE t.device <> ''
+AND n.user_id = t.user_id
+AND n.device = t.device
+AND n.id > t.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_count_triggers'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUPLICATE_SQL, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='authtoken',
+            constraint=models.UniqueConstraint(condition=models.Q(('device', ''), _negated=True), fields=('user', 'device'), name='unique_authtoken_user_device'),
+        ),
+    ]
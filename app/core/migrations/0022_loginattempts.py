@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_authtoken_user_device'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginAttempts',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='loginattempts',
+            index=models.Index(fields=['expires_at'], name='loginattempts_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:38
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_loginattempts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='ingredient',
+            name='updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='updated_at',
+        ),
+        migrations.RemoveField(
+            model_name='tag',
+            name='updated_at',
+        ),
+    ]
@@ -2,14 +2,25 @@
 Database models.
 """
 
+import hashlib
 import os
+import secrets
 import uuid
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser
 from django.contrib.auth.models import BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections
 from django.db import models
+from django.db import router
+from django.db.models import F
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 
 def recipe_image_file_path(
@@ -71,6 +82,33 @@ class Recipe(models.Model):
     tags = models.ManyToManyField("Tag")
     ingredients = models.ManyToManyField("Ingredient")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image_derivatives = models.JSONField(default=dict, blank=True)
+    # ID of the transaction that last wrote the row, set by a database
+    # trigger. Delta sync reads changes in transaction order from it.
+    change_xid = models.BigIntegerField(default=0, editable=False)
+    # Maintained by database triggers from the title, the description and
+    # the names of the linked tags and ingredients.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-id"], name="recipe_user_id_idx"),
+            GinIndex(fields=["search_vector"], name="recipe_search_idx"),
+            models.Index(
+                fields=["user", "change_xid", "id"],
+                name="recipe_user_change_idx",
+            ),
+            # Serve range filters and ordering on time and price from the
+            # index, in the (value, id) order the cursor pages expect.
+            models.Index(
+                fields=["user", "time_minutes", "id"],
+                name="recipe_user_time_idx",
+            ),
+            models.Index(
+                fields=["user", "price", "id"],
+                name="recipe_user_price_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -84,6 +122,40 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    # ID of the transaction that last wrote the row, set by a database
+    # trigger. Delta sync reads changes in transaction order from it.
+    change_xid = models.BigIntegerField(default=0, editable=False)
+    # Number of linked recipes, maintained by database triggers.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                name="unique_tag_user_name",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "change_xid", "id"],
+                name="tag_user_change_idx",
+            ),
+            models.Index(
+                fields=["user", "recipe_count", "name"],
+                name="tag_user_count_idx",
+            ),
+            # Serves case-insensitive substring and similarity matches.
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="tag_name_trgm_idx",
+            ),
+            # Serves the prefix matches of short texts for one user.
+            models.Index(
+                F("user"),
+                OpClass(Upper("name"), name="text_pattern_ops"),
+                name="tag_user_prefix_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -97,6 +169,250 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE,
     )
     name = models.CharField(max_length=255)
+    # ID of the transaction that last wrote the row, set by a database
+    # trigger. Delta sync reads changes in transaction order from it.
+    change_xid = models.BigIntegerField(default=0, editable=False)
+    # Number of linked recipes, maintained by database triggers.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                name="unique_ingredient_user_name",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "change_xid", "id"],
+                name="ingredient_user_change_idx",
+            ),
+            models.Index(
+                fields=["user", "recipe_count", "name"],
+                name="ingredient_user_count_idx",
+            ),
+            # Serves case-insensitive substring and similarity matches.
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="ingredient_name_trgm_idx",
+            ),
+            # Serves the prefix matches of short texts for one user.
+            models.Index(
+                F("user"),
+                OpClass(Upper("name"), name="text_pattern_ops"),
+                name="ingredient_user_prefix_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class ImageJob(models.Model):
+    """Queued generation of resized copies of a recipe image."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    image = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(status="pending"),
+                name="imagejob_pending_idx",
+            ),
+            models.Index(
+                fields=["updated_at"],
+                condition=models.Q(status="running"),
+                name="imagejob_running_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.image} ({self.status})"
+
+
+class Tombstone(models.Model):
+    """Record of a deleted recipe, tag or ingredient for delta sync."""
+
+    RECIPE = "recipe"
+    TAG = "tag"
+    INGREDIENT = "ingredient"
+    MODEL_CHOICES = [
+        (RECIPE, "Recipe"),
+        (TAG, "Tag"),
+        (INGREDIENT, "Ingredient"),
+    ]
+
+    # No database constraint, as tombstones are written while the user's
+    # own deletion cascades. They are pruned after the retention period.
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+    )
+    model = models.CharField(max_length=10, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    # ID of the transaction that last wrote the row, set by a database
+    # trigger. Delta sync reads changes in transaction order from it.
+    change_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "change_xid", "id"],
+                name="tombstone_user_change_idx",
+            ),
+            models.Index(fields=["deleted_at"], name="tombstone_deleted_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id}"
+
+
+class AuthTokenManager(models.Manager):
+    """Manager for API tokens."""
+
+    def issue(self, user, device=""):
+        """Create a token and return it with its key.
+
+        The key is only known at this point; the database keeps its hash.
+        """
+        key = secrets.token_urlsafe(32)
+        lifetime = timedelta(days=settings.TOKEN_TTL_DAYS)
+        token = self.create(
+            user=user,
+            device=device,
+            key_hash=self.model.hash_key(key),
+            expires_at=timezone.now() + lifetime,
+        )
+        return token, key
+
+
+class AuthToken(models.Model):
+    """Expiring API token of one of a user's devices.
+
+    Only the SHA-256 digest of the key is stored, so tokens are looked up
+    through a fixed-width unique index and the table never holds keys.
+    """
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="auth_tokens",
+    )
+    key_hash = models.BinaryField(max_length=32, unique=True)
+    device = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    objects = AuthTokenManager()
+
+    class Meta:
+        constraints = [
+            # A named device holds a single token.
+            models.UniqueConstraint(
+                fields=["user", "device"],
+                condition=~models.Q(device=""),
+                name="unique_authtoken_user_device",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="authtoken_expires_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} ({self.device or 'token'})"
+
+    @staticmethod
+    def hash_key(key):
+        """Return the digest stored for a token key."""
+        return hashlib.sha256(key.encode()).digest()
+
+    @property
+    def is_expired(self):
+        """Return whether the token has expired."""
+        return self.expires_at <= timezone.now()
+
+
+class LoginAttemptsManager(models.Manager):
+    """Manager for login attempt counts."""
+
+    def hit(self, key, duration):
+        """Count an attempt for a key and return the count and its expiry.
+
+        The row is inserted or updated in a single statement, so attempts
+        made at the same time are all counted. An expired count starts
+        again from one, for another duration seconds.
+        """
+        now = timezone.now()
+        table = self.model._meta.db_table
+        with connections[router.db_for_write(self.model)].cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (key, count, expires_at)
+                VALUES (%s, 1, %s)
+                ON CONFLICT (key) DO UPDATE SET
+                    count = CASE WHEN {table}.expires_at <= %s
+                        THEN 1 ELSE {table}.count + 1 END,
+                    expires_at = CASE WHEN {table}.expires_at <= %s
+                        THEN EXCLUDED.expires_at ELSE {table}.expires_at END
+                RETURNING count, expires_at
+                """,
+                [key, now + timedelta(seconds=duration), now, now],
+            )
+            return cursor.fetchone()
+
+    def take_back(self, key):
+        """Remove one attempt from the count of a key."""
+        self.filter(key=key, count__gt=0).update(count=F("count") - 1)
+
+    def forget(self, key):
+        """Remove the count of a key."""
+        self.filter(key=key).delete()
+
+
+class LoginAttempts(models.Model):
+    """Count of the login attempts of an email or client address.
+
+    Attempts are counted until expires_at, when counting starts again.
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField()
+
+    objects = LoginAttemptsManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["expires_at"],
+                name="loginattempts_expires_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.count})"
@@ -0,0 +1,161 @@
+"""
+Query inspection: slow queries, N+1 patterns and query budgets.
+
+With QUERY_INSPECTION set, QueryInspectionMiddleware runs a QueryInspector
+over each request. SQL is grouped by fingerprint, its text with literals
+and placeholder lists normalized, so the same query run for each item of
+a list is caught however its parameters differ. Queries slower than
+SLOW_QUERY_MS and fingerprints run QUERY_REPEAT_THRESHOLD times or more
+are logged with the view and, when a serializer ran them, the serializer
+field being rendered.
+
+Views declare how many queries each action may run in query_budgets,
+with the query_budgets decorator for function views. Savepoints are not
+counted, as they only appear in nested transactions and in tests.
+"""
+
+import logging
+import re
+import sys
+import time
+
+from django.conf import settings
+from rest_framework.serializers import Serializer
+
+logger = logging.getLogger(__name__)
+
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+SPACES = re.compile(r"\s+")
+SAVEPOINTS = re.compile(
+    r"^\s*(?:SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b",
+    re.IGNORECASE,
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more queries than its budget allows."""
+
+
+def fingerprint(sql):
+    """Return the SQL with its literals and parameters normalized."""
+    sql = STRINGS.sub("?", sql)
+    sql = NUMBERS.sub("?", sql.replace("%s", "?"))
+    sql = PLACEHOLDER_LISTS.sub("(...)", sql)
+    return SPACES.sub(" ", sql).strip()
+
+
+def find_source():
+    """Return the serializer field being rendered, if any.
+
+    The innermost Serializer.to_representation on the stack is rendering
+    the field whose attribute or nested serializer ran the query.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == "to_representation":
+            serializer = frame.f_locals.get("self")
+            field = frame.f_locals.get("field")
+            if isinstance(serializer, Serializer) and field is not None:
+                return f"{type(serializer).__name__}.{field.field_name}"
+        frame = frame.f_back
+    return None
+
+
+def query_budgets(**budgets):
+    """Declare the query budgets of a function view by HTTP method."""
+
+    def decorator(view):
+        view.query_budgets = {
+            method.lower(): budget for method, budget in budgets.items()
+        }
+        return view
+
+    return decorator
+
+
+def get_budget(request):
+    """Return the query budget of the view and action of a request."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    budgets = getattr(match.func, "query_budgets", None) or getattr(
+        getattr(match.func, "cls", None), "query_budgets", None
+    )
+    if not budgets:
+        return None
+    action = request.method.lower()
+    actions = getattr(match.func, "actions", None)
+    if actions:
+        action = actions.get(action, action)
+    return budgets.get(action)
+
+
+class QueryInspector:
+    """Database execute wrapper collecting the queries of a request."""
+
+    def __init__(self):
+        self.count = 0
+        self.fingerprints = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - start)
+
+    def record(self, sql, duration):
+        """Record a query and where it came from."""
+        if SAVEPOINTS.match(sql):
+            return
+        self.count += 1
+        entry = self.fingerprints.setdefault(fingerprint(sql), [0, None])
+        entry[0] += 1
+        if entry[0] == 2:
+            entry[1] = find_source()
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            self.slow.append((duration, sql, find_source()))
+
+    def repeated(self):
+        """Return the fingerprints run too often, with their sources."""
+        return [
+            (sql, count, source)
+            for sql, (count, source) in self.fingerprints.items()
+            if count >= settings.QUERY_REPEAT_THRESHOLD
+        ]
+
+    def report(self, request, view):
+        """Log the slow and repeated queries and check the budget.
+
+        Raises QueryBudgetExceeded over budget if QUERY_BUDGETS_STRICT is
+        set, and logs the excess otherwise.
+        """
+        for duration, sql, source in self.slow:
+            logger.warning(
+                "Slow query in %s (%.1f ms, from %s): %s",
+                view,
+                duration * 1000,
+                source or "the view",
+                sql,
+            )
+        for sql, count, source in self.repeated():
+            logger.warning(
+                "Possible N+1 in %s: %d runs of one query (from %s): %s",
+                view,
+                count,
+                source or "the view",
+                sql,
+            )
+        budget = get_budget(request)
+        if budget is None or self.count <= budget:
+            return
+        message = (
+            f"{view} ({request.method}) ran {self.count} queries, "
+            f"over its budget of {budget}"
+        )
+        if settings.QUERY_BUDGETS_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,84 @@
+"""
+Database routing to read replicas.
+
+Reads go to a random replica only inside read_from_replicas(), which the
+API enables for list and retrieve requests. Everything else, including
+all writes, uses the primary. After a user writes, their reads stay on
+the primary for REPLICA_PIN_SECONDS, so replication lag never hides
+their own changes from them. Pins are kept in the default cache, which
+must be shared by all processes for a pin to reach the user's next
+request, and must not evict live pins: recipe.checks requires memcached.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+KEY_PREFIX = "db-primary"
+
+_use_replicas = ContextVar("use_replicas", default=False)
+
+
+def _pin_key(user):
+    """Return the cache key pinning a user to the primary."""
+    return f"{KEY_PREFIX}:{user.pk}"
+
+
+def pin_to_primary(user):
+    """Send the user's reads to the primary for a while."""
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        cache.set(_pin_key(user), 1, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    """Return whether the user's reads must go to the primary."""
+    return user.is_authenticated and cache.get(_pin_key(user)) is not None
+
+
+@contextmanager
+def read_from_replicas():
+    """Send the reads of the enclosed block to the replicas."""
+    token = _use_replicas.set(True)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+def reading_from_replicas():
+    """Return whether reads currently go to the replicas."""
+    return bool(settings.DATABASE_REPLICAS) and _use_replicas.get()
+
+
+class ReplicaRouter:
+    """Route reads to the replicas when enabled, and writes to the primary."""
+
+    def _databases(self):
+        return {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+
+    def db_for_read(self, model, **hints):
+        """Return a random replica inside read_from_replicas()."""
+        if reading_from_replicas():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        """Return the primary."""
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Allow relations between objects of the primary and replicas."""
+        databases = self._databases()
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Migrate the primary only; replicas follow it."""
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,20 @@
+"""
+Signal handlers for database connection reuse.
+"""
+
+from core import connections
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def count_connection(sender, **kwargs):
+    """Count each new database connection."""
+    connections.count_opened()
+
+
+@receiver(request_started)
+def expect_checks(sender, **kwargs):
+    """Check connections kept from earlier requests before they are used."""
+    connections.expect_checks()
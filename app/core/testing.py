@@ -0,0 +1,42 @@
+"""
+Test runner for app.
+"""
+
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Test runner failing requests that go over their query budget.
+
+    Tests use a file cache of their own, so they never see or clear the
+    cache of a server running on the same host. Tests run in a single
+    process, so the cache can also hold replica pins.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix="recipe-app-cache-")
+        self._test_settings = override_settings(
+            QUERY_INSPECTION=True,
+            QUERY_BUDGETS_STRICT=True,
+            SILENCED_SYSTEM_CHECKS=["recipe.E002"],
+            CACHES={
+                "default": {
+                    "BACKEND": (
+                        "django.core.cache.backends.filebased.FileBasedCache"
+                    ),
+                    "LOCATION": self._cache_dir,
+                    "OPTIONS": {"MAX_ENTRIES": 10000},
+                },
+            },
+        )
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,252 @@
+"""
+Tests for serving the app over ASGI.
+"""
+
+import asyncio
+import io
+import json
+import threading
+from decimal import Decimal
+from unittest.mock import patch
+
+from core import asgi
+from core import metrics
+from core.models import AuthToken
+from core.models import Recipe
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.client import BOUNDARY
+from django.test.client import MULTIPART_CONTENT
+from django.test.client import encode_multipart
+from django.urls import resolve
+from django.urls import reverse
+from PIL import Image
+from recipe.images import delete_derivatives
+
+
+async def collect(iterator):
+    """Return the items of an async iterator."""
+    return [item async for item in iterator]
+
+
+async def call_asgi(method, path, headers=(), body=b""):
+    """Send a request to the ASGI application and return its messages."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    path, _sep, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    }
+    await asgi.ASGIHandler()(scope, receive, send)
+    return messages
+
+
+class IterateInDbThreadTests(SimpleTestCase):
+    """Test iterating sync iterables from the event loop."""
+
+    def tearDown(self):
+        asgi.shutdown()
+
+    def test_items_on_pool_threads(self):
+        """Test items come in order from the pool threads."""
+
+        def threads():
+            for i in range(10):
+                yield i, threading.current_thread().name
+
+        items = asyncio.run(collect(asgi.iterate_in_db_thread(threads())))
+
+        self.assertEqual([i for i, _name in items], list(range(10)))
+        for _i, name in items:
+            self.assertTrue(name.startswith("async-db"))
+
+    @override_settings(ASYNC_DB_THREADS=1)
+    def test_thread_released_between_items(self):
+        """Test an iterable waiting for its client does not hold a thread."""
+
+        def endless():
+            while True:
+                yield 0
+
+        async def both():
+            waiting = asgi.iterate_in_db_thread(endless())
+            await waiting.__anext__()
+            try:
+                return await collect(asgi.iterate_in_db_thread(range(3)))
+            finally:
+                await waiting.aclose()
+
+        items = asyncio.run(asyncio.wait_for(both(), timeout=5))
+
+        self.assertEqual(items, [0, 1, 2])
+
+    def test_error_raised(self):
+        """Test an error of the iterable is raised to the consumer."""
+
+        def failing():
+            yield 1
+            raise ValueError("Broken")
+
+        with self.assertRaisesMessage(ValueError, "Broken"):
+            asyncio.run(collect(asgi.iterate_in_db_thread(failing())))
+
+    def test_closed_when_consumer_stops(self):
+        """Test the iterable is closed on its thread if the client leaves."""
+        closed_on = []
+
+        def endless():
+            try:
+                while True:
+                    yield 0
+            finally:
+                closed_on.append(threading.current_thread().name)
+
+        async def first():
+            items = asgi.iterate_in_db_thread(endless())
+            await items.__anext__()
+            await items.aclose()
+
+        asyncio.run(first())
+
+        self.assertEqual(len(closed_on), 1)
+        self.assertTrue(closed_on[0].startswith("async-db"))
+
+
+class RoutingTests(SimpleTestCase):
+    """Test async views are only served by the ASGI handler."""
+
+    def test_sync_views_under_wsgi(self):
+        """Test URLs resolve to sync views outside the ASGI handler."""
+        for url in (reverse("health-check"), reverse("recipe:recipe-export")):
+            func = resolve(url).func
+            self.assertFalse(asyncio.iscoroutinefunction(func))
+            self.assertTrue(asyncio.iscoroutinefunction(func.asgi_view))
+
+    def test_lifespan_shutdown(self):
+        """Test the database threads are stopped when the server stops."""
+        messages = [
+            {"type": "lifespan.startup"},
+            {"type": "lifespan.shutdown"},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        async def serve():
+            await asgi.run_in_db_thread(int)
+            await asgi.ASGIHandler()({"type": "lifespan"}, receive, send)
+
+        asyncio.run(serve())
+
+        self.assertEqual(
+            sent,
+            ["lifespan.startup.complete", "lifespan.shutdown.complete"],
+        )
+        self.assertIsNone(asgi._executor)
+
+
+@override_settings(IMAGE_WORKERS=0, METRICS_SAMPLE_RATE=1)
+class ASGIHandlerTests(TransactionTestCase):
+    """Test the async views served by the ASGI handler."""
+
+    def setUp(self):
+        metrics.reset_metrics()
+        self.user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        _token, key = AuthToken.objects.issue(self.user)
+        self.headers = [(b"authorization", f"Token {key}".encode())]
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title="Sample recipe",
+            time_minutes=10,
+            price=Decimal("5.00"),
+        )
+
+    def tearDown(self):
+        asgi.shutdown()
+        metrics.reset_metrics()
+        self.recipe.refresh_from_db()
+        delete_derivatives(self.recipe.image_derivatives)
+        self.recipe.image.delete()
+
+    def test_health_check(self):
+        """Test the health check is served by an async view."""
+        messages = asyncio.run(call_asgi("GET", reverse("health-check")))
+
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertEqual(json.loads(messages[1]["body"]), {"healthy": True})
+
+    def test_upload_image(self):
+        """Test uploading an image on the database threads."""
+        image = io.BytesIO()
+        Image.new("RGB", (10, 10)).save(image, format="JPEG")
+        image.seek(0)
+        image.name = "image.jpg"
+        url = reverse("recipe:recipe-upload-image", args=[self.recipe.id])
+
+        messages = asyncio.run(
+            call_asgi(
+                "POST",
+                url,
+                self.headers + [(b"content-type", MULTIPART_CONTENT.encode())],
+                encode_multipart(BOUNDARY, {"image": image}),
+            )
+        )
+
+        self.assertEqual(messages[0]["status"], 200)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image)
+        labels = ("recipe:recipe-upload-image", "POST")
+        self.assertGreater(metrics.DB_QUERIES.get(*labels)[1], 0)
+
+    def test_sync_view_queries_recorded(self):
+        """Test the queries of sync views are seen by the middleware."""
+        url = reverse("recipe:recipe-list")
+
+        # Django's thread for sync views closes its connection at the end.
+        with patch.dict(connection.settings_dict, {"CONN_MAX_AGE": 0}):
+            messages = asyncio.run(call_asgi("GET", url, self.headers))
+
+        self.assertEqual(messages[0]["status"], 200)
+        labels = ("recipe:recipe-list", "GET")
+        self.assertGreater(metrics.DB_QUERIES.get(*labels)[1], 0)
+
+    def test_export_streamed(self):
+        """Test exports are read on a pool thread and streamed."""
+        url = reverse("recipe:recipe-export")
+
+        messages = asyncio.run(call_asgi("GET", url, self.headers))
+
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertIn(
+            (b"Content-Type", b"application/x-ndjson"),
+            messages[0]["headers"],
+        )
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        lines = body.decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["title"], "Sample recipe")
+        self.assertFalse(messages[-1].get("more_body", False))
@@ -2,11 +2,34 @@
 Test custom Django management commands.
 """
 
+import json
+import subprocess
+import sys
+import tempfile
+import uuid
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
+from core import benchmark
+from core.models import AuthToken
+from core.models import Ingredient
+from core.models import Recipe
+from core.models import Tag
+from core.models import Tombstone
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.db import connections
 from django.db.utils import OperationalError
+from django.test import LiveServerTestCase
 from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import override_settings
+from django.test.testcases import LiveServerThread
+from django.test.testcases import QuietWSGIRequestHandler
+from django.utils import timezone
 from psycopg2 import OperationalError as Psycopg2Error
 
 
@@ -33,3 +56,282 @@ class CommandTests(SimpleTestCase):
         call_command("wait_for_db")
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=["default"])
+
+
+class ImportRecipesCommandTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+
+    def _import(self, records, **options):
+        """Write records to an NDJSON file and import it."""
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as f:
+            for record in records:
+                if not isinstance(record, str):
+                    record = json.dumps(record)
+                f.write(record + "\n")
+            f.flush()
+            out = StringIO()
+            call_command(
+                "import_recipes",
+                f.name,
+                email=self.user.email,
+                stdout=out,
+                stderr=StringIO(),
+                **options,
+            )
+        return out.getvalue()
+
+    def test_import_recipes(self):
+        """Test importing recipes with tags and ingredients."""
+        Tag.objects.create(user=self.user, name="Dinner")
+        records = [
+            {
+                "id": 99,
+                "title": f"Recipe {i}",
+                "time_minutes": 10,
+                "price": "4.50",
+                "image": "http://example.com/image.jpg",
+                "tags": [{"id": 1, "name": "Dinner"}, {"name": f"Tag {i}"}],
+                "ingredients": [{"name": "Salt"}],
+            }
+            for i in range(5)
+        ]
+
+        out = self._import(records, batch_size=2)
+
+        self.assertIn("Imported 5 recipes", out)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 5)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        recipe = recipes.get(title="Recipe 3")
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)),
+            ["Dinner", "Tag 3"],
+        )
+        self.assertEqual(recipe.ingredients.get().name, "Salt")
+
+    def test_import_skips_invalid_lines(self):
+        """Test invalid lines are reported and skipped."""
+        valid = {"title": "Soup", "time_minutes": 10, "price": "2.00"}
+        records = [valid, "{not json", {"title": "No price"}, "[]", ""]
+
+        out = self._import(records)
+
+        self.assertIn("Imported 1 recipes, 3 invalid lines", out)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_import_resolves_names_once(self):
+        """Test tag names are looked up once, not once per recipe."""
+        records = [
+            {
+                "title": f"Recipe {i}",
+                "time_minutes": 10,
+                "price": "4.50",
+                "tags": [{"name": "Shared"}],
+            }
+            for i in range(20)
+        ]
+        with patch.object(
+            Tag.objects,
+            "bulk_create",
+            wraps=Tag.objects.bulk_create,
+        ) as bulk_create:
+            self._import(records, batch_size=5)
+
+        self.assertEqual(bulk_create.call_count, 1)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_import_unknown_user(self):
+        """Test importing for an unknown user fails."""
+        with self.assertRaises(CommandError):
+            call_command("import_recipes", "-", email="nobody@example.com")
+
+
+class PruneTombstonesCommandTests(TestCase):
+    """Test the prune_tombstones command."""
+
+    def test_prune_tombstones(self):
+        """Test only tombstones past the retention period are deleted."""
+        user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        old = Tombstone.objects.create(user=user, model="tag", object_id=1)
+        recent = Tombstone.objects.create(user=user, model="tag", object_id=2)
+        Tombstone.objects.filter(id=old.id).update(
+            deleted_at=timezone.now() - timedelta(days=31),
+        )
+        out = StringIO()
+
+        with self.settings(TOMBSTONE_RETENTION_DAYS=30):
+            call_command("prune_tombstones", stdout=out)
+
+        self.assertIn("Pruned 1 tombstones.", out.getvalue())
+        self.assertEqual(
+            list(Tombstone.objects.values_list("id", flat=True)),
+            [recent.id],
+        )
+
+
+class PruneTokensCommandTests(TestCase):
+    """Test the prune_tokens command."""
+
+    def test_prune_tokens(self):
+        """Test expired tokens are deleted across several batches."""
+        user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        tokens = [AuthToken.objects.issue(user)[0] for _i in range(5)]
+        AuthToken.objects.filter(id__in=[t.id for t in tokens[:3]]).update(
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        out = StringIO()
+
+        with self.settings(TOKEN_PRUNE_BATCH_SIZE=2):
+            call_command("prune_tokens", stdout=out)
+
+        self.assertIn("Pruned 3 tokens.", out.getvalue())
+        self.assertEqual(
+            sorted(AuthToken.objects.values_list("id", flat=True)),
+            [t.id for t in tokens[3:]],
+        )
+
+
+class SeedBenchmarkCommandTests(TestCase):
+    """Test the seed_benchmark command."""
+
+    def test_seed_benchmark(self):
+        """Test users get skewed numbers of recipes and can log in."""
+        call_command(
+            "seed_benchmark",
+            users=3,
+            recipes=60,
+            tags=5,
+            ingredients=20,
+            stdout=StringIO(),
+        )
+
+        users = get_user_model().objects.filter(email__startswith="bench")
+        counts = [
+            Recipe.objects.filter(user__email=benchmark.EMAIL_FORMAT.format(i))
+            .count()
+            for i in range(3)
+        ]
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(sum(counts), 60)
+        self.assertGreater(counts[0], counts[2])
+        self.assertLessEqual(
+            Tag.objects.filter(user=users[0]).count(),
+            5,
+        )
+        self.assertTrue(users[0].check_password(benchmark.PASSWORD))
+
+    def test_seed_benchmark_twice(self):
+        """Test seeding again requires replacing the existing users."""
+        options = {"users": 1, "recipes": 1, "stdout": StringIO()}
+        call_command("seed_benchmark", **options)
+
+        with self.assertRaises(CommandError):
+            call_command("seed_benchmark", **options)
+
+        call_command("seed_benchmark", reset=True, **options)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_summarize(self):
+        """Test the latency percentiles are nearest-rank in ms."""
+        summary = benchmark.summarize(
+            [i / 1000 for i in range(100, 0, -1)],
+            errors=2,
+            elapsed=2,
+        )
+
+        self.assertEqual(summary["requests"], 100)
+        self.assertEqual(summary["throughput"], 50)
+        self.assertAlmostEqual(summary["p50_ms"], 50)
+        self.assertAlmostEqual(summary["p95_ms"], 95)
+        self.assertAlmostEqual(summary["p99_ms"], 99)
+
+    def test_process_memory(self):
+        """Test the memory of the processes matching a pattern is summed."""
+        marker = f"benchmark-{uuid.uuid4().hex}"
+        code = "import sys; print(flush=True); sys.stdin.read()"
+        with subprocess.Popen(
+            [sys.executable, "-c", code, marker],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        ) as process:
+            process.stdout.readline()  # pyright: ignore
+            memory = benchmark.process_memory(marker)
+            process.stdin.close()  # pyright: ignore
+
+        self.assertGreater(memory, 2**20)
+        self.assertEqual(benchmark.process_memory(marker), 0)
+
+
+class ConnectionClosingServer(ThreadedWSGIServer):
+    """Server closing the connections of each request thread.
+
+    With CONN_MAX_AGE set, Django 3.2 leaves them open after the tests,
+    which keeps the test database from being dropped. Django 4.0 closes
+    them the same way.
+    """
+
+    def close_request(self, request):
+        connections.close_all()
+        super().close_request(request)
+
+
+class ConnectionClosingServerThread(LiveServerThread):
+    """Live server thread using ConnectionClosingServer."""
+
+    def _create_server(self):
+        return ConnectionClosingServer(
+            (self.host, self.port),
+            QuietWSGIRequestHandler,
+            allow_reuse_address=False,
+        )
+
+
+# Image jobs stay queued, so no worker thread keeps a connection open.
+@override_settings(IMAGE_WORKERS=0)
+class BenchmarkApiCommandTests(LiveServerTestCase):
+    """Test the benchmark_api command against a live server."""
+
+    server_thread_class = ConnectionClosingServerThread
+
+    def test_benchmark_api(self):
+        """Test each scenario runs without errors and results are saved."""
+        call_command(
+            "seed_benchmark",
+            users=2,
+            recipes=10,
+            stdout=StringIO(),
+        )
+        out = StringIO()
+
+        with tempfile.NamedTemporaryFile(suffix=".json") as f:
+            call_command(
+                "benchmark_api",
+                url=self.live_server_url,
+                users=2,
+                concurrency=2,
+                duration=0.2,
+                warmup=0,
+                output=f.name,
+                compare=None,
+                stdout=out,
+            )
+            results = json.load(f)
+
+        self.assertEqual(set(results["scenarios"]), set(benchmark.SCENARIOS))
+        for scenario, summary in results["scenarios"].items():
+            self.assertGreater(summary["requests"], 0, scenario)
+            self.assertEqual(summary["errors"], 0, scenario)
+        self.assertIn("p99", out.getvalue())
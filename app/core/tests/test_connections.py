@@ -0,0 +1,100 @@
+"""
+Tests for database connection reuse and health checks.
+"""
+
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from core import connections
+from django.contrib.auth import get_user_model
+from django.db import connections as db_connections
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+DB_STATS_URL = reverse("db-stats")
+
+
+def make_connection(usable=True, health_checks=True):
+    """Return a mock of an open database connection."""
+    conn = MagicMock(in_atomic_block=False)
+    conn.settings_dict = {"CONN_HEALTH_CHECKS": health_checks}
+    conn.is_usable.return_value = usable
+    return conn
+
+
+class ConnectionTests(TestCase):
+    """Test connection checks and counters."""
+
+    def setUp(self):
+        connections.reset_stats()
+
+    def test_unusable_connection_closed(self):
+        """Test a connection failing the health check is closed."""
+        conn = make_connection(usable=False)
+
+        connections.check_connection(conn)
+
+        conn.close.assert_called_once()
+        self.assertEqual(connections.get_stats()["discarded"], 1)
+
+    def test_health_checks_disabled(self):
+        """Test connections are reused unchecked without health checks."""
+        conn = make_connection(usable=False, health_checks=False)
+
+        connections.check_connection(conn)
+
+        conn.is_usable.assert_not_called()
+        conn.close.assert_not_called()
+        self.assertEqual(connections.get_stats()["reused"], 1)
+
+    def test_connection_checked_on_first_use(self):
+        """Test a reused connection is checked once, when first queried."""
+        conn = db_connections["default"]
+        conn.ensure_connection()
+        connections.expect_checks()
+
+        with patch("core.backends.postgresql.base.check_connection") as check:
+            self.assertFalse(check.called)
+            conn.ensure_connection()
+            conn.ensure_connection()
+
+        check.assert_called_once_with(conn)
+
+    def test_requests_reuse_connection(self):
+        """Test requests querying the database reuse its connection."""
+        client = APIClient()
+        client.get(reverse("health-check"))
+        for email in ["one@example.com", "two@example.com"]:
+            client.post(
+                reverse("user:create"),
+                {"email": email, "password": "testpass123", "name": "Test"},
+            )
+
+        stats = connections.get_stats()
+
+        self.assertEqual(stats["reused"], 2)
+        self.assertEqual(stats["opened"], 0)
+        self.assertEqual(stats["reuse_rate"], 1.0)
+
+    def test_db_stats_staff_only(self):
+        """Test the connection counters are exposed to staff only."""
+        user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        res = client.get(DB_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        user.save()
+        res = client.get(DB_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(res.data),  # pyright: ignore
+            {"opened", "reused", "discarded", "reuse_rate"},
+        )
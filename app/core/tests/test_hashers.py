@@ -0,0 +1,104 @@
+"""
+Tests for password hashing.
+"""
+
+import threading
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from core import hashers
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+TOKEN_URL = reverse("user:token")
+
+
+class PasswordHashingTests(TestCase):
+    """Test password hashing and rehashing."""
+
+    def test_new_passwords_use_argon2(self):
+        """Test passwords are hashed with Argon2 and the set costs."""
+        user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+
+        self.assertTrue(user.password.startswith("argon2$argon2id$"))
+        self.assertIn("m=19456,t=2,p=1", user.password)
+
+    def test_rehash_on_login(self):
+        """Test a PBKDF2 password is rehashed with Argon2 on login."""
+        user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+        )
+        user.password = make_password("testpass123", hasher="pbkdf2_sha256")
+        user.save()
+
+        res = APIClient().post(
+            TOKEN_URL,
+            {"email": "user@example.com", "password": "testpass123"},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("argon2$"))
+
+    def test_rehash_on_cost_change(self):
+        """Test a password is rehashed after the costs change."""
+        user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+
+        with self.settings(ARGON2_TIME_COST=3):
+            self.assertTrue(user.check_password("testpass123"))
+
+        self.assertIn("t=3", user.password)
+
+    @override_settings(PASSWORD_HASH_WAIT=0)
+    def test_busy_executor_refuses(self):
+        """Test hashing fails fast when every executor slot is taken."""
+        executor = hashers.BoundedExecutor()
+        with self.settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0):
+            release = threading.Event()
+            blocked = threading.Thread(
+                target=executor.run,
+                args=(release.wait,),
+            )
+            blocked.start()
+            while executor._slots is None or executor._slots._value:
+                time.sleep(0.01)
+
+            with self.assertRaises(hashers.HashingBusy):
+                executor.run(len, "password")
+
+            release.set()
+            blocked.join()
+
+        self.assertEqual(executor.run(len, "password"), 8)
+
+    @patch("core.hashers.executor.run", side_effect=hashers.HashingBusy)
+    def test_busy_login_unavailable(self, patched_run):
+        """Test a login is answered with 503 while hashing is saturated."""
+        res = APIClient().post(
+            TOKEN_URL,
+            {"email": "user@example.com", "password": "testpass123"},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_benchmark_hashers(self):
+        """Test the benchmark reports a rate for each hasher."""
+        out = StringIO()
+
+        call_command("benchmark_hashers", iterations=1, stdout=out)
+
+        self.assertIn("argon2:", out.getvalue())
+        self.assertIn("pbkdf2_sha256:", out.getvalue())
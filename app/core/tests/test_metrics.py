@@ -0,0 +1,207 @@
+"""
+Tests for request metrics.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from core import metrics
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+METRICS_URL = reverse("metrics")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+class HistogramTests(TestCase):
+    """Test the histogram format."""
+
+    def test_histogram_samples(self):
+        """Test buckets are cumulative and labels are escaped."""
+        histogram = metrics.Histogram("size", "Sizes.", ("view",), (1, 10))
+        histogram.observe(1, 'a"b')
+        histogram.observe(5, 'a"b')
+
+        self.assertEqual(
+            list(histogram.samples()),
+            [
+                'size_bucket{view="a\\"b",le="1"} 1',
+                'size_bucket{view="a\\"b",le="10"} 2',
+                'size_bucket{view="a\\"b",le="+Inf"} 2',
+                'size_sum{view="a\\"b"} 6',
+                'size_count{view="a\\"b"} 2',
+            ],
+        )
+
+
+@override_settings(METRICS_SAMPLE_RATE=1)
+class MetricsMiddlewareTests(TestCase):
+    """Test requests are measured and the metrics exposed."""
+
+    def setUp(self):
+        metrics.reset_metrics()
+        self.user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        metrics.reset_metrics()
+
+    def test_request_measured(self):
+        """Test a sampled request records its timings, queries and size."""
+        res = self.client.get(TAGS_URL)
+
+        labels = ("recipe:tag-list", "GET")
+        self.assertEqual(metrics.REQUESTS.get(*labels, "200"), 1)
+        self.assertEqual(metrics.DURATION.get(*labels)[0], 1)
+        self.assertEqual(metrics.RENDER_DURATION.get(*labels)[0], 1)
+        count, seconds = metrics.SERIALIZE_DURATION.get(*labels)
+        self.assertEqual(count, 1)
+        self.assertGreater(seconds, 0)
+        self.assertEqual(
+            metrics.RESPONSE_SIZE.get(*labels),
+            (1, len(res.content)),
+        )
+        count, queries = metrics.DB_QUERIES.get(*labels)
+        self.assertEqual(count, 1)
+        self.assertGreater(queries, 0)
+        self.assertGreater(metrics.DB_DURATION.get(*labels)[1], 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_counted(self):
+        """Test requests outside the sample are only counted."""
+        self.client.get(TAGS_URL)
+
+        labels = ("recipe:tag-list", "GET")
+        self.assertEqual(metrics.REQUESTS.get(*labels, "200"), 1)
+        self.assertEqual(metrics.DURATION.get(*labels), (0, 0))
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_metrics_disabled(self):
+        """Test nothing is recorded with metrics disabled."""
+        self.client.get(TAGS_URL)
+
+        labels = ("recipe:tag-list", "GET", "200")
+        self.assertEqual(metrics.REQUESTS.get(*labels), 0)
+
+    def test_unmatched_request(self):
+        """Test requests matching no view are grouped together."""
+        self.client.get("/api/missing/")
+
+        self.assertEqual(metrics.REQUESTS.get("unmatched", "GET", "404"), 1)
+
+    def test_metrics_endpoint(self):
+        """Test the metrics are exposed to staff in Prometheus format."""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(TAGS_URL)
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], metrics.CONTENT_TYPE)
+        body = res.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", body)
+        self.assertIn(
+            'http_request_db_queries_count{view="recipe:tag-list",'
+            'method="GET"} 1',
+            body,
+        )
+
+
+class SharedMetricsTests(TestCase):
+    """Test the metrics of all processes are added up."""
+
+    def setUp(self):
+        metrics.reset_metrics()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        metrics.reset_metrics()
+        shutil.rmtree(self.directory)
+
+    def test_processes_added_up(self):
+        """Test the files of other processes are merged with this one's."""
+        other = {
+            "http_requests_total": [[["recipe:tag-list", "GET", "200"], 2]],
+            "http_request_db_queries": [
+                [["recipe:tag-list", "GET"], [[0, 1] + [0] * 8, 1, 1]],
+            ],
+        }
+        with open(os.path.join(self.directory, "1.json"), "w") as file:
+            json.dump(other, file)
+        metrics.REQUESTS.inc("recipe:tag-list", "GET", "200")
+        metrics.DB_QUERIES.observe(2, "recipe:tag-list", "GET")
+
+        with override_settings(METRICS_DIR=self.directory):
+            body = metrics.render_metrics()
+
+        self.assertIn(f"{os.getpid()}.json", os.listdir(self.directory))
+        self.assertIn(
+            'http_requests_total{view="recipe:tag-list",method="GET",'
+            'status="200"} 3',
+            body,
+        )
+        self.assertIn(
+            'http_request_db_queries_sum{view="recipe:tag-list",'
+            'method="GET"} 3',
+            body,
+        )
+        self.assertIn(
+            'http_request_db_queries_bucket{view="recipe:tag-list",'
+            'method="GET",le="2"} 2',
+            body,
+        )
+
+    def test_exited_processes_merged(self):
+        """Test files of exited workers are merged into a single file."""
+        process = subprocess.Popen(["true"])
+        process.wait()
+        other = {
+            "http_requests_total": [[["recipe:tag-list", "GET", "200"], 2]],
+        }
+        for name in (f"{process.pid}.json", metrics.EXITED_FILE):
+            with open(os.path.join(self.directory, name), "w") as file:
+                json.dump(other, file)
+
+        with override_settings(METRICS_DIR=self.directory):
+            metrics.render_metrics()
+            body = metrics.render_metrics()
+
+        self.assertNotIn(f"{process.pid}.json", os.listdir(self.directory))
+        self.assertIn(
+            'http_requests_total{view="recipe:tag-list",method="GET",'
+            'status="200"} 4',
+            body,
+        )
+
+    def test_late_updates_flushed(self):
+        """Test updates made too soon after a write are written later."""
+        with override_settings(
+            METRICS_DIR=self.directory,
+            METRICS_FLUSH_SECONDS=0.05,
+        ):
+            metrics.flush(force=True)
+            metrics.REQUESTS.inc("recipe:tag-list", "GET", "200")
+            metrics.flush()
+            time.sleep(0.2)
+
+            data = metrics._read(metrics._process_file())
+
+        self.assertEqual(
+            data["http_requests_total"],
+            {("recipe:tag-list", "GET", "200"): 1},
+        )
@@ -7,6 +7,7 @@ from unittest.mock import patch
 
 from core import models
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.test import TestCase
 
 
@@ -94,6 +95,31 @@ class ModelTests(TestCase):
         )
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot have two tags with the same name."""
+        user = create_user()
+        other_user = create_user(email="other@example.com")
+        models.Tag.objects.create(user=user, name="Tag1")
+        models.Tag.objects.create(user=other_user, name="Tag1")
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name="Tag1")
+
+    def test_ingredient_name_unique_per_user(self):
+        """Test a user cannot have two ingredients with the same name."""
+        user = create_user()
+        models.Ingredient.objects.create(user=user, name="Ingredient1")
+        with self.assertRaises(IntegrityError):
+            models.Ingredient.objects.create(user=user, name="Ingredient1")
+
+    def test_token_unique_per_device(self):
+        """Test a named device cannot hold two tokens."""
+        user = create_user()
+        models.AuthToken.objects.issue(user)
+        models.AuthToken.objects.issue(user)
+        models.AuthToken.objects.issue(user, "phone")
+        with self.assertRaises(IntegrityError):
+            models.AuthToken.objects.issue(user, "phone")
+
     @patch("core.models.uuid.uuid4")
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generating image path."""
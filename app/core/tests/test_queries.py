@@ -0,0 +1,103 @@
+"""
+Tests for query inspection.
+"""
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from core import queries
+from core.models import Recipe
+from core.models import Tag
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
+from recipe.serializers import RecipeSerializer
+from recipe.views import TagViewSet
+from rest_framework.test import APIClient
+
+TAGS_URL = reverse("recipe:tag-list")
+
+
+class FingerprintTests(TestCase):
+    """Test SQL fingerprints."""
+
+    def test_literals_normalized(self):
+        """Test queries differing only in literals share a fingerprint."""
+        first = queries.fingerprint(
+            "SELECT * FROM core_tag WHERE name = 'a''b' AND id IN (1, 2)"
+        )
+        second = queries.fingerprint(
+            "SELECT *  FROM core_tag\nWHERE name = %s AND id IN (%s)"
+        )
+
+        self.assertEqual(first, second)
+        self.assertEqual(
+            first,
+            "SELECT * FROM core_tag WHERE name = ? AND id IN (...)",
+        )
+
+
+@override_settings(QUERY_INSPECTION=True, QUERY_BUDGETS_STRICT=True)
+class QueryInspectionTests(TestCase):
+    """Test N+1 detection and query budgets."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_query_attributed_to_field(self):
+        """Test a query run per item is reported with its field."""
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f"Recipe {i}",
+                time_minutes=10,
+                price=Decimal("5.00"),
+            )
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"{i}"))
+        inspector = queries.QueryInspector()
+
+        with connection.execute_wrapper(inspector):
+            RecipeSerializer(Recipe.objects.all(), many=True).data
+        request = RequestFactory().get("/")
+        with self.assertLogs("core.queries", "WARNING") as logs:
+            inspector.report(request, "recipe:recipe-list")
+
+        self.assertEqual(inspector.count, 7)
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn("in recipe:recipe-list: 3 runs", logs.output[0])
+        self.assertIn("from RecipeSerializer.tags", logs.output[0])
+        self.assertIn("from RecipeSerializer.ingredients", logs.output[1])
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_query_logged(self):
+        """Test queries slower than the threshold are logged."""
+        with self.assertLogs("core.queries", "WARNING") as logs:
+            self.client.get(TAGS_URL)
+
+        self.assertIn("Slow query in recipe:tag-list", logs.output[0])
+
+    @patch.object(TagViewSet, "query_budgets", {"list": 0})
+    def test_over_budget_fails(self):
+        """Test a view over its query budget fails the request."""
+        with self.assertRaises(queries.QueryBudgetExceeded):
+            self.client.get(TAGS_URL)
+
+    @override_settings(QUERY_BUDGETS_STRICT=False)
+    @patch.object(TagViewSet, "query_budgets", {"list": 0})
+    def test_over_budget_logged(self):
+        """Test going over budget is only logged outside of tests."""
+        with self.assertLogs("core.queries", "WARNING") as logs:
+            self.client.get(TAGS_URL)
+
+        self.assertIn(
+            "recipe:tag-list (GET) ran 1 queries, over its budget of 0",
+            logs.output[0],
+        )
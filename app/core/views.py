@@ -2,11 +2,61 @@
 Core views for app.
 """
 
+from core.asgi import with_asgi_view
+from core.connections import get_stats
+from core.metrics import CONTENT_TYPE
+from core.metrics import render_metrics
+from django.http import HttpResponse
+from django.http import HttpResponseNotAllowed
+from django.http import JsonResponse
+from drf_spectacular.utils import extend_schema
 from rest_framework.decorators import api_view
+from rest_framework.decorators import authentication_classes
+from rest_framework.decorators import permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from user.authentication import CachedTokenAuthentication
 
 
+async def async_health_check(request):
+    """Returns successful response, without taking a thread under ASGI."""
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    return JsonResponse({"healthy": True})
+
+
+@with_asgi_view(async_health_check)
 @api_view(["GET"])
 def health_check(request):  # pyright: ignore
     """Returns successful response."""
     return Response({"healthy": True})
+
+
+@extend_schema(
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "opened": {"type": "integer"},
+                "reused": {"type": "integer"},
+                "discarded": {"type": "integer"},
+                "reuse_rate": {"type": "number"},
+            },
+        }
+    }
+)
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAdminUser])
+def db_stats(request):  # pyright: ignore
+    """Return the database connection counters."""
+    return Response(get_stats())
+
+
+@extend_schema(exclude=True)
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAdminUser])
+def metrics(request):  # pyright: ignore
+    """Return the request metrics of all workers for Prometheus."""
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
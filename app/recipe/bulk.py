@@ -0,0 +1,273 @@
+"""
+Batch writes for the recipe APIs.
+"""
+
+from core.models import Ingredient
+from core.models import Recipe
+from core.models import Tag
+from django.conf import settings
+from django.db import DatabaseError
+from django.db import transaction
+from django.utils.translation import gettext as _
+from recipe.cache import bump_user_version
+from recipe.serializers import RecipeDetailSerializer
+from recipe.serializers import get_or_create_by_name
+
+RELATIONS = [
+    ("tags", Tag, Recipe.tags.through, "tag_id"),
+    ("ingredients", Ingredient, Recipe.ingredients.through, "ingredient_id"),
+]
+
+
+class RecipeBulkWriter:
+    """Apply a batch of recipe create, update and delete operations.
+
+    Every operation is validated with RecipeDetailSerializer. Valid
+    operations are then written in chunks with bulk inserts, updates and
+    deletes, resolving the tags and ingredients of a whole chunk at once.
+    """
+
+    def __init__(self, request, chunk_size=None):
+        self.request = request
+        self.user = request.user
+        self.chunk_size = chunk_size or settings.BULK_CHUNK_SIZE
+
+    def run(self, operations, atomic=False):
+        """Apply operations and return (results, success).
+
+        In atomic mode nothing is written unless every operation is
+        valid, and all chunks are written in a single transaction.
+        Otherwise each chunk is written in its own transaction and
+        invalid operations are reported without stopping the others.
+        """
+        results = [None] * len(operations)
+        indexed = list(enumerate(operations))
+        chunks = []
+        for start in range(0, len(indexed), self.chunk_size):
+            stop = start + self.chunk_size
+            chunks.append(self._validate_chunk(indexed[start:stop], results))
+
+        failed = any(result["status"] == "error" for result in results)
+        if atomic and failed:
+            return results, False
+
+        if atomic:
+            with transaction.atomic():
+                for chunk in chunks:
+                    self._write_chunk(chunk, results)
+            bump_user_version(self.user.id)
+            return results, True
+
+        for chunk in chunks:
+            try:
+                with transaction.atomic():
+                    self._write_chunk(chunk, results)
+            except DatabaseError:
+                for index, kind, instance, data in chunk:
+                    results[index] = self._error(
+                        kind,
+                        instance.id if instance else None,
+                        _("The batch containing this operation failed."),
+                    )
+                failed = True
+        bump_user_version(self.user.id)
+        return results, not failed
+
+    def _error(self, op, obj_id, errors):
+        """Return the result of a failed operation."""
+        return {"op": op, "id": obj_id, "status": "error", "errors": errors}
+
+    def _validate_chunk(self, indexed, results):
+        """Validate operations and return the writable ones."""
+        ids = [op["id"] for index, op in indexed if op["op"] != "create"]
+        instances = Recipe.objects.filter(user=self.user, id__in=ids).in_bulk()
+        context = {"request": self.request}
+        chunk = []
+        for index, op in indexed:
+            kind = op["op"]
+            instance = instances.get(op.get("id"))
+            if kind != "create" and instance is None:
+                results[index] = self._error(kind, op["id"], _("Not found."))
+                continue
+            results[index] = {"op": kind, "id": op.get("id"), "status": "ok"}
+            if kind == "delete":
+                chunk.append((index, kind, instance, None))
+                continue
+            serializer = RecipeDetailSerializer(
+                instance,
+                data=op["data"],
+                partial=kind == "update",
+                context=context,
+            )
+            if serializer.is_valid():
+                chunk.append(
+                    (index, kind, instance, serializer.validated_data)
+                )
+            else:
+                results[index] = self._error(
+                    kind,
+                    op.get("id"),
+                    serializer.errors,
+                )
+        return chunk
+
+    def _write_chunk(self, chunk, results):
+        """Write validated operations with set-based statements."""
+        creates = []
+        updates = []
+        links = {relation[0]: {} for relation in RELATIONS}
+        names = {relation[0]: [] for relation in RELATIONS}
+        update_fields = set()
+
+        for index, kind, instance, data in chunk:
+            if kind == "delete":
+                continue
+            data = dict(data)
+            for name in names:
+                items = data.pop(name, None)
+                if items is not None:
+                    names[name].extend(item["name"] for item in items)
+            if kind == "create":
+                instance = Recipe(user=self.user, **data)
+                creates.append((index, instance))
+            else:
+                for attr, value in data.items():
+                    setattr(instance, attr, value)
+                update_fields.update(data)
+                updates.append(instance)
+
+        Recipe.objects.bulk_create([recipe for index, recipe in creates])
+        if updates and update_fields:
+            Recipe.objects.bulk_update(updates, sorted(update_fields))
+
+        created = {index: recipe for index, recipe in creates}
+        for index, kind, instance, data in chunk:
+            if kind == "delete":
+                continue
+            recipe = created.get(index, instance)
+            results[index]["id"] = recipe.id
+            for name in links:
+                if data.get(name) is not None:
+                    links[name][recipe.id] = [
+                        item["name"] for item in data[name]
+                    ]
+
+        for name, model, through, column in RELATIONS:
+            if not links[name]:
+                continue
+            objs = get_or_create_by_name(model, self.user, names[name])
+            wanted = {
+                recipe_id: {objs[n].id for n in recipe_names}
+                for recipe_id, recipe_names in links[name].items()
+            }
+            self._replace_links(through, column, wanted)
+
+        deletes = [
+            instance.id
+            for index, kind, instance, data in chunk
+            if kind == "delete"
+        ]
+        if deletes:
+            Recipe.objects.filter(id__in=deletes).delete()
+
+    def _replace_links(self, through, column, wanted):
+        """Make the recipes' links match wanted, a recipe ID -> IDs map."""
+        current = through.objects.filter(
+            recipe_id__in=wanted,
+        ).values_list("id", "recipe_id", column)
+        stale = []
+        existing = set()
+        for link_id, recipe_id, obj_id in current:
+            if obj_id in wanted[recipe_id]:
+                existing.add((recipe_id, obj_id))
+            else:
+                stale.append(link_id)
+        if stale:
+            through.objects.filter(id__in=stale).delete()
+        through.objects.bulk_create(
+            [
+                through(recipe_id=recipe_id, **{column: obj_id})
+                for recipe_id, obj_ids in wanted.items()
+                for obj_id in obj_ids
+                if (recipe_id, obj_id) not in existing
+            ]
+        )
+
+
+class RecipeImporter:
+    """Insert validated recipes for one user in batches.
+
+    Tag and ingredient names are resolved through an in-memory name -> ID
+    map per relation, loaded once from the database and extended as new
+    names are inserted, so rows never cost a lookup of their own.
+    """
+
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or settings.BULK_CHUNK_SIZE
+        self.pending = []
+        self.name_ids = {relation[0]: None for relation in RELATIONS}
+        self.imported = 0
+
+    def add(self, data):
+        """Queue validated recipe data, writing a batch when full."""
+        self.pending.append(data)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the queued recipes in one transaction."""
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create(
+                [
+                    Recipe(
+                        user=self.user,
+                        **{
+                            field: value
+                            for field, value in data.items()
+                            if field not in self.name_ids
+                        },
+                    )
+                    for data in batch
+                ]
+            )
+            for name, model, through, column in RELATIONS:
+                items = [
+                    (recipe.id, item["name"])
+                    for recipe, data in zip(recipes, batch)
+                    for item in data.get(name, [])
+                ]
+                ids = self._resolve(name, model, [n for r, n in items])
+                through.objects.bulk_create(
+                    [
+                        through(recipe_id=recipe_id, **{column: ids[n]})
+                        for recipe_id, n in dict.fromkeys(items)
+                    ]
+                )
+        bump_user_version(self.user.id)
+        self.imported += len(batch)
+
+    def _resolve(self, name, model, names):
+        """Return the name -> ID map of a relation, adding missing names."""
+        ids = self.name_ids[name]
+        if ids is None:
+            ids = dict(
+                model.objects.filter(user=self.user).values_list("name", "id")
+            )
+            self.name_ids[name] = ids
+        missing = [n for n in dict.fromkeys(names) if n not in ids]
+        if missing:
+            model.objects.bulk_create(
+                [model(user=self.user, name=n) for n in missing],
+                ignore_conflicts=True,
+            )
+            ids.update(
+                model.objects.filter(
+                    user=self.user,
+                    name__in=missing,
+                ).values_list("name", "id")
+            )
+        return ids
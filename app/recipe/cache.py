@@ -0,0 +1,154 @@
+"""
+Per-user response cache for the recipe APIs.
+
+Cached responses are keyed by a version number per user. Any write to
+one of the user's recipes, tags or ingredients bumps the version, which
+invalidates every cached list and detail response of that user at once.
+Versions are the time of the last write in nanoseconds, so they also
+serve as the Last-Modified time of the user's responses.
+
+Hits and misses are counted in memory by each process, like the other
+request metrics, and added up across workers by core.metrics. Counting
+them in the shared cache would cost a read and a write per request, and
+concurrent workers would lose updates.
+
+Responses read from a replica while the user is pinned to the primary
+are not cached: the user wrote after the request chose the replica, so
+the response may predate the write yet be stored under the new version.
+"""
+
+import functools
+import hashlib
+import time
+
+from core.metrics import RESPONSE_CACHE
+from core.metrics import collect
+from core.routers import is_pinned
+from core.routers import reading_from_replicas
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+KEY_PREFIX = "recipe-cache"
+STATS = ("hits", "misses")
+CACHED_HEADERS = ("ETag", "Last-Modified", "Cache-Control")
+
+
+def _cache():
+    """Return the cache backend used for responses."""
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    """Return the cache key of the user's version number."""
+    return f"{KEY_PREFIX}:version:{user_id}"
+
+
+def get_user_version(user_id):
+    """Return the user's current cache version.
+
+    Missing versions start from the current time in nanoseconds, so a
+    version evicted from the cache never comes back with an old value.
+    """
+    cache = _cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_id):
+    """Move the user's cache version to the current time.
+
+    The version always increases, even if the clock goes back.
+    """
+    cache = _cache()
+    key = _version_key(user_id)
+    version = max(time.time_ns(), (cache.get(key) or 0) + 1)
+    cache.set(key, version, timeout=None)
+
+
+def bump_user_version(user_id):
+    """Invalidate all cached responses of the user.
+
+    When called inside a transaction the version is bumped again on
+    commit, so responses cached from the old data while the transaction
+    was open are not served afterwards.
+    """
+    _bump(user_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(user_id))
+
+
+def get_stats():
+    """Return the hit and miss counters of all workers."""
+    values = collect(RESPONSE_CACHE)
+    return {stat: values.get((stat,), 0) for stat in STATS}
+
+
+def reset_stats():
+    """Reset the hit and miss counters of this process."""
+    RESPONSE_CACHE.reset()
+
+
+def _response_key(request, version):
+    """Return the cache key of a request for a user's cache version."""
+    url = request.build_absolute_uri()
+    digest = hashlib.sha256(url.encode()).hexdigest()
+    return f"{KEY_PREFIX}:response:{request.user.pk}:{version}:{digest}"
+
+
+def cached_response(view_method):
+    """Cache successful responses of a viewset action per user.
+
+    The validator headers of a response are cached with its data, so a
+    cached response can answer conditional requests on its own.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return view_method(self, request, *args, **kwargs)
+        cache = _cache()
+        key = _response_key(request, get_user_version(request.user.pk))
+        cached = cache.get(key)
+        if cached is not None:
+            RESPONSE_CACHE.inc("hits")
+            data, headers = cached
+            response = Response(data, status=status.HTTP_200_OK)
+            for header, value in headers.items():
+                response[header] = value
+            last_modified = headers.get("Last-Modified")
+            response = get_conditional_response(
+                request,
+                etag=headers.get("ETag"),
+                last_modified=last_modified
+                and parse_http_date_safe(last_modified),
+                response=response,
+            )
+            response["X-Cache"] = "HIT"
+            return response
+        RESPONSE_CACHE.inc("misses")
+        response = view_method(self, request, *args, **kwargs)
+        stale = reading_from_replicas() and is_pinned(request.user)
+        if response.status_code == status.HTTP_200_OK and not stale:
+            headers = {
+                header: response[header]
+                for header in CACHED_HEADERS
+                if response.has_header(header)
+            }
+            cache.set(
+                key,
+                (response.data, headers),
+                settings.RESPONSE_CACHE_TIMEOUT,
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
+    return wrapper
@@ -0,0 +1,62 @@
+"""
+System checks of the recipe app.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error
+from django.core.checks import register
+
+
+@register()
+def check_response_cache(app_configs, **kwargs):
+    """Refuse the response cache on a cache local to each process.
+
+    Each worker would keep its own user versions, so a write handled by
+    one worker would leave the others serving stale responses.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return []
+    if not isinstance(caches[settings.RESPONSE_CACHE_ALIAS], LocMemCache):
+        return []
+    return [
+        Error(
+            "The response cache needs a cache shared by all processes.",
+            hint=(
+                "Set CACHE_BACKEND to a file, database or memcached "
+                "cache, or RESPONSE_CACHE_ENABLED to 0."
+            ),
+            id="recipe.E001",
+        )
+    ]
+
+
+@register()
+def check_replica_pins(app_configs, **kwargs):
+    """Refuse read replicas on a default cache that can lose live pins.
+
+    A user's next request could reach a worker that does not know the
+    user just wrote, and read their data from a lagging replica. Local
+    caches are not shared by the workers, and the file and database
+    caches evict arbitrary keys when full, pins included.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return []
+    backend = caches["default"]
+    if not isinstance(
+        backend,
+        (LocMemCache, FileBasedCache, DatabaseCache, DummyCache),
+    ):
+        return []
+    return [
+        Error(
+            "Read replicas need a default cache shared by all processes "
+            "that only evicts the least recently used keys.",
+            hint="Set CACHE_BACKEND to memcached, or unset DB_REPLICA_HOSTS.",
+            id="recipe.E002",
+        )
+    ]
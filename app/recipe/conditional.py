@@ -0,0 +1,70 @@
+"""
+Conditional GET support for the recipe APIs.
+
+Validators are derived from the per-user cache version of recipe.cache,
+which changes on every write to the user's recipes, tags or ingredients
+and records when that write happened. A request whose If-None-Match or
+If-Modified-Since header still matches is answered with 304 Not Modified
+without querying the database.
+"""
+
+import functools
+import hashlib
+from datetime import datetime
+from datetime import timezone
+
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from recipe.cache import get_user_version
+from rest_framework import status
+
+
+def get_validators(request):
+    """Return the ETag and last modification time of the user's data.
+
+    The ETag covers the request URL, the requested media type, the user
+    and the user's cache version, so any write to the user's recipes,
+    tags or ingredients changes it. The time is the last such write, or
+    a later time if the version was evicted from the cache.
+    """
+    version = get_user_version(request.user.pk)
+    parts = [
+        request.build_absolute_uri(),
+        request.META.get("HTTP_ACCEPT"),
+        request.user.pk,
+        version,
+    ]
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()
+    last_modified = datetime.fromtimestamp(version / 10**9, tz=timezone.utc)
+    return f'W/"{digest}"', last_modified
+
+
+def set_validators(response, etag, last_modified):
+    """Add the validator headers to a response."""
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+
+
+def conditional_response(view_method):
+    """Answer conditional GET requests of a viewset action."""
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        etag, last_modified = get_validators(request)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()),
+        )
+        if response is None:
+            response = view_method(self, request, *args, **kwargs)
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            set_validators(response, etag, last_modified)
+        return response
+
+    return wrapper
@@ -0,0 +1,103 @@
+"""
+Streaming export of recipe collections.
+"""
+
+import csv
+import json
+
+from core.models import Ingredient
+from core.models import Tag
+from django.db.models import Prefetch
+from django.db.models import prefetch_related_objects
+from recipe.pagination import rows_after
+from recipe.serializers import RecipeDetailSerializer
+from rest_framework.utils.encoders import JSONEncoder
+
+CSV_FIELDS = [
+    "id",
+    "title",
+    "time_minutes",
+    "price",
+    "link",
+    "description",
+    "image",
+    "tags",
+    "ingredients",
+]
+
+
+class Echo:
+    """File-like object returning what is written to it."""
+
+    def write(self, value):
+        """Return the value instead of buffering it."""
+        return value
+
+
+def iter_recipes(queryset, ordering, chunk_size):
+    """Yield recipes with their tags and ingredients loaded.
+
+    Recipes are read in chunks, each starting after the last recipe of
+    the previous one, as pages are, and their relations are prefetched
+    per chunk, so memory use does not grow with the size of the
+    collection. No cursor or transaction stays open between chunks, so
+    they can be read on different threads and connections. The ordering
+    must end with a unique field.
+    """
+    queryset = queryset.order_by(*ordering)
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        prefetch_related_objects(
+            chunk,
+            Prefetch("tags", queryset=Tag.objects.only("id", "name")),
+            Prefetch(
+                "ingredients",
+                queryset=Ingredient.objects.only("id", "name"),
+            ),
+        )
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+        values = [getattr(last, order.lstrip("-")) for order in ordering]
+        after = queryset.filter(rows_after(ordering, values))
+        chunk = list(after[:chunk_size])
+
+
+def buffered(lines, size=64 * 1024):
+    """Join lines into blocks of about size characters."""
+    block = []
+    length = 0
+    for line in lines:
+        block.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(block)
+            block = []
+            length = 0
+    if block:
+        yield "".join(block)
+
+
+def iter_ndjson(recipes, context):
+    """Yield one JSON document per recipe."""
+    serializer = RecipeDetailSerializer(context=context)
+    for recipe in recipes:
+        data = serializer.to_representation(recipe)
+        yield json.dumps(data, cls=JSONEncoder) + "\n"
+
+
+def iter_csv(recipes, context):
+    """Yield CSV lines, joining tag and ingredient names with '|'."""
+    serializer = RecipeDetailSerializer(context=context)
+    writer = csv.DictWriter(
+        Echo(),
+        fieldnames=CSV_FIELDS,
+        extrasaction="ignore",
+    )
+    yield writer.writeheader()
+    for recipe in recipes:
+        data = serializer.to_representation(recipe)
+        for name in ("tags", "ingredients"):
+            data[name] = "|".join(item["name"] for item in data[name])
+        yield writer.writerow(data)
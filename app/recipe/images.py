@@ -0,0 +1,210 @@
+"""
+Background generation of resized recipe images.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from core.models import ImageJob
+from core.models import Recipe
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+from PIL import ImageOps
+from PIL import features
+from recipe.cache import bump_user_version
+
+logger = logging.getLogger(__name__)
+
+# Pillow format, Pillow feature and save options of each output format.
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": (
+        "JPEG",
+        "jpg",
+        {"quality": 82, "optimize": True, "progressive": True},
+    ),
+}
+
+_executor = None
+
+
+def _get_executor():
+    """Return the process-wide worker pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix="recipe-images",
+        )
+    return _executor
+
+
+def enqueue_derivatives(recipe):
+    """Queue generation of the derivatives of the recipe's current image.
+
+    The job is stored in the database so the process_image_jobs command
+    can pick it up. When IMAGE_WORKERS is set it is also handed to a
+    local thread pool once the transaction commits, which then goes on
+    with the other pending jobs.
+    """
+    job = ImageJob.objects.create(recipe=recipe, image=recipe.image.name)
+    if settings.IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: _get_executor().submit(_run_in_thread, job.id)
+        )
+    return job
+
+
+def _run_in_thread(job_id):
+    """Process jobs from the thread pool with its own connection."""
+    close_old_connections()
+    try:
+        process_pending_jobs(job_id)
+    except Exception:
+        logger.exception("Image job %s crashed.", job_id)
+    finally:
+        close_old_connections()
+
+
+def release_stale_jobs():
+    """Queue again the jobs of workers that died while running them.
+
+    A job still running IMAGE_JOB_TIMEOUT seconds after it was claimed is
+    assumed lost. It is marked failed if it used all its attempts, and
+    pending otherwise. Return the number of jobs released.
+    """
+    now = timezone.now()
+    stale = ImageJob.objects.filter(
+        status=ImageJob.RUNNING,
+        updated_at__lt=now - timedelta(seconds=settings.IMAGE_JOB_TIMEOUT),
+    )
+    error = "Timed out."
+    failed = stale.filter(
+        attempts__gte=settings.IMAGE_JOB_MAX_ATTEMPTS,
+    ).update(status=ImageJob.FAILED, error=error, updated_at=now)
+    retried = stale.update(
+        status=ImageJob.PENDING,
+        error=error,
+        updated_at=now,
+    )
+    if failed or retried:
+        logger.warning(
+            "Released %s timed out image jobs, %s failed.",
+            failed + retried,
+            failed,
+        )
+    return failed + retried
+
+
+def claim_job(job_id=None):
+    """Mark a pending job as running and return it, or None.
+
+    Timed out jobs are released first. Rows are locked with SKIP LOCKED
+    so concurrent workers never claim the same job.
+    """
+    release_stale_jobs()
+    with transaction.atomic():
+        jobs = ImageJob.objects.select_for_update(skip_locked=True).filter(
+            status=ImageJob.PENDING,
+        )
+        if job_id is not None:
+            jobs = jobs.filter(id=job_id)
+        job = jobs.order_by("id").first()
+        if job is None:
+            return None
+        job.status = ImageJob.RUNNING
+        job.attempts += 1
+        job.save(update_fields=["status", "attempts", "updated_at"])
+    return job
+
+
+def process_job(job_id=None):
+    """Claim and process one job, returning it or None if none is pending."""
+    job = claim_job(job_id)
+    if job is None:
+        return None
+    try:
+        derivatives = generate_derivatives(job.image)
+    except Exception as exc:
+        retry = job.attempts < settings.IMAGE_JOB_MAX_ATTEMPTS
+        job.status = ImageJob.PENDING if retry else ImageJob.FAILED
+        job.error = str(exc)
+        job.save(update_fields=["status", "error", "updated_at"])
+        logger.warning("Image job %s failed: %s", job.id, exc)
+        return job
+
+    updated = Recipe.objects.filter(
+        id=job.recipe_id,
+        image=job.image,
+    ).update(image_derivatives=derivatives)
+    if updated:
+        bump_user_version(job.recipe.user_id)
+    else:
+        # The image was replaced or the recipe deleted in the meantime.
+        delete_derivatives(derivatives)
+    job.status = ImageJob.DONE
+    job.error = ""
+    job.save(update_fields=["status", "error", "updated_at"])
+    return job
+
+
+def process_pending_jobs(job_id=None):
+    """Process a job, then every pending job until none is left.
+
+    Failed jobs queued for a retry and jobs released from dead workers
+    are pending too, so they are run by whichever worker comes next.
+    Return the number of jobs processed.
+    """
+    processed = 0 if process_job(job_id) is None else 1
+    while process_job() is not None:
+        processed += 1
+    return processed
+
+
+def generate_derivatives(name):
+    """Write resized copies of the stored image and return their names.
+
+    The result maps each width to the file name of every enabled format.
+    Widths larger than the original are skipped.
+    """
+    formats = [
+        fmt
+        for fmt in settings.IMAGE_DERIVATIVE_FORMATS
+        if features.check(FORMATS[fmt][1])
+    ]
+    with default_storage.open(name) as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original = original.convert("RGB")
+    base = os.path.splitext(name)[0]
+    derivatives = {}
+    for width in sorted(settings.IMAGE_DERIVATIVE_WIDTHS):
+        if width >= original.width:
+            continue
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS)
+        derivatives[str(width)] = {}
+        for fmt in formats:
+            pil_format, _feature, options = FORMATS[fmt]
+            buffer = BytesIO()
+            resized.save(buffer, format=pil_format, **options)
+            ext = "jpg" if fmt == "jpeg" else fmt
+            derivatives[str(width)][fmt] = default_storage.save(
+                f"{base}_{width}.{ext}",
+                ContentFile(buffer.getvalue()),
+            )
+    return derivatives
+
+
+def delete_derivatives(derivatives):
+    """Delete the files of a derivatives mapping."""
+    for files in derivatives.values():
+        for name in files.values():
+            default_storage.delete(name)
@@ -0,0 +1,139 @@
+"""
+Pagination classes for the recipe APIs.
+"""
+
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination over the newest recipes first.
+
+    Views with a get_ordering() method choose the ordering themselves.
+    Unlike CursorPagination, which keeps the value of the first ordering
+    field and an offset into its ties, cursors hold the values of every
+    ordering field. As each ordering ends with a unique field, a page
+    starts right after the last row of the previous one, whatever the
+    number of rows sharing a time, price or recipe count.
+    """
+
+    ordering = "-id"
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        """Return the ordering of the view, or the default one."""
+        if hasattr(view, "get_ordering"):
+            return view.get_ordering()
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the page of rows after or before the cursor position."""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = self.cursor.reverse, self.cursor.position
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [_reverse(order) for order in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._after(ordering, position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # One more row tells whether a page follows.
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        following = None
+        if len(results) > self.page_size:
+            following = self._get_position_from_instance(
+                results[-1],
+                self.ordering,
+            )
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = following is not None
+            self.next_position = position
+            self.previous_position = following
+        else:
+            self.has_next = following is not None
+            self.has_previous = position is not None
+            self.next_position = following
+            self.previous_position = position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _after(self, ordering, position):
+        """Return the condition on the rows after a position."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return rows_after(ordering, values)
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Return the values of all the ordering fields of a row."""
+        values = []
+        for order in ordering:
+            field = order.lstrip("-")
+            if isinstance(instance, dict):
+                value = instance[field]
+            else:
+                value = getattr(instance, field)
+            values.append(str(value))
+        return json.dumps(values)
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Keyset pagination over tags and ingredients by name."""
+
+    ordering = "-name"
+
+
+def rows_after(ordering, values):
+    """Return the condition on the rows after the ordering values of a row.
+
+    For an ordering (a, b) and values (x, y), the rows after it have
+    a > x, or a = x and b > y. The bound a >= x comes first so the
+    (user, a, b) indexes are scanned from the position.
+    """
+    condition = None
+    for order, value in reversed(list(zip(ordering, values))):
+        field = order.lstrip("-")
+        lookup = "lt" if order.startswith("-") else "gt"
+        after = Q(**{f"{field}__{lookup}": value})
+        if condition is not None:
+            after |= Q(**{field: value}) & condition
+        condition = after
+    first = ordering[0]
+    lookup = "lte" if first.startswith("-") else "gte"
+    bound = Q(**{f"{first.lstrip('-')}__{lookup}": values[0]})
+    return bound & condition
+
+
+def _reverse(order):
+    """Return the opposite direction of an ordering field."""
+    if order.startswith("-"):
+        return order[1:]
+    return f"-{order}"
@@ -2,13 +2,71 @@
 Serializers for recipe APIs.
 """
 
+from decimal import Decimal
+
 from core.models import Ingredient
 from core.models import Recipe
 from core.models import Tag
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.db import transaction
+from django.utils.translation import gettext as _
 from rest_framework import serializers
 
 
-class TagSerializer(serializers.ModelSerializer):
+def get_or_create_by_name(model, user, names):
+    """Map names to the user's objects of model, creating missing ones.
+
+    Existing objects are fetched in one query and missing ones are
+    inserted with a single bulk insert.
+    """
+    if not names:
+        return {}
+    objs = {
+        obj.name: obj
+        for obj in model.objects.filter(user=user, name__in=names)
+    }
+    missing = [
+        model(user=user, name=name)
+        for name in dict.fromkeys(names)
+        if name not in objs
+    ]
+    if missing:
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(missing)
+        except IntegrityError:
+            # A concurrent request created some of these names first.
+            model.objects.bulk_create(missing, ignore_conflicts=True)
+            missing = model.objects.filter(
+                user=user,
+                name__in=[obj.name for obj in missing],
+            )
+        objs.update((obj.name, obj) for obj in missing)
+    return objs
+
+
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """Base serializer for recipe attributes."""
+
+    def validate_name(self, value):
+        """Reject renaming to a name the user already uses."""
+        if self.instance is None:
+            return value
+        model = self.Meta.model  # pyright: ignore
+        taken = (
+            model.objects.filter(user=self.instance.user, name=value)
+            .exclude(pk=self.instance.pk)
+            .exists()
+        )
+        if taken:
+            msg = _("An item with this name already exists.")
+            raise serializers.ValidationError(msg, code="unique")
+        return value
+
+
+class TagSerializer(RecipeAttrSerializer):
     """Serializer for tags."""
 
     class Meta:
@@ -17,7 +75,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttrSerializer):
     """Serializer for ingredients."""
 
     class Meta:
@@ -26,11 +84,119 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
+class TagDetailSerializer(TagSerializer):
+    """Serializer for tags with the number of recipes using them."""
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ["recipe_count"]
+        read_only_fields = ["id", "recipe_count"]
+
+
+class IngredientDetailSerializer(IngredientSerializer):
+    """Serializer for ingredients with the number of recipes using them."""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ["recipe_count"]
+        read_only_fields = ["id", "recipe_count"]
+
+
+class RecipeAttrFilterSerializer(serializers.Serializer):
+    """Serializer for the ordering parameter of tag and ingredient lists."""
+
+    ORDERINGS = {
+        "name": ("name",),
+        "-name": ("-name",),
+        "recipe_count": ("recipe_count", "name"),
+        "-recipe_count": ("-recipe_count", "-name"),
+    }
+
+    ordering = serializers.ChoiceField(
+        choices=list(ORDERINGS),
+        required=False,
+        help_text="Order by name or popularity, -name by default",
+    )
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """Serializer for the range and ordering parameters of recipe lists."""
+
+    ORDERINGS = {
+        "time_minutes": ("time_minutes", "id"),
+        "-time_minutes": ("-time_minutes", "-id"),
+        "price": ("price", "id"),
+        "-price": ("-price", "-id"),
+    }
+
+    time_minutes_min = serializers.IntegerField(min_value=0, required=False)
+    time_minutes_max = serializers.IntegerField(min_value=0, required=False)
+    # Bounds above the largest price the column holds are clamped to it.
+    price_min = serializers.DecimalField(
+        max_digits=None,
+        decimal_places=2,
+        min_value=0,
+        required=False,
+    )
+    price_max = serializers.DecimalField(
+        max_digits=None,
+        decimal_places=2,
+        min_value=0,
+        required=False,
+    )
+    ordering = serializers.ChoiceField(
+        choices=list(ORDERINGS),
+        required=False,
+        help_text="Order by time or price, newest first by default",
+    )
+
+    def _clamp_price(self, value):
+        """Return a price bound within the range of the price column."""
+        field = Recipe._meta.get_field("price")
+        places = field.decimal_places
+        largest = Decimal(10 ** (field.max_digits - places))
+        return min(value, largest - Decimal(1).scaleb(-places))
+
+    def validate_price_min(self, value):
+        """Clamp the lower price bound."""
+        return self._clamp_price(value)
+
+    def validate_price_max(self, value):
+        """Clamp the upper price bound."""
+        return self._clamp_price(value)
+
+
+class RecipeAttrAutocompleteSerializer(serializers.Serializer):
+    """Serializer for the query parameters of tag and ingredient lookups."""
+
+    q = serializers.CharField(max_length=255)
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.AUTOCOMPLETE_MAX_LIMIT,
+        default=settings.AUTOCOMPLETE_LIMIT,
+    )
+
+
+class ImageDerivativesField(serializers.ReadOnlyField):
+    """URLs of the resized copies of an image, keyed by width and format."""
+
+    def to_representation(self, value):
+        request = self.context.get("request")
+        urls = {}
+        for width, files in value.items():
+            urls[width] = {}
+            for fmt, name in files.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[width][fmt] = url
+        return urls
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for recipes."""
 
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    image_derivatives = ImageDerivativesField()
 
     class Meta:
         model = Recipe
@@ -42,25 +208,46 @@ class RecipeSerializer(serializers.ModelSerializer):
             "link",
             "tags",
             "ingredients",
+            "image_derivatives",
         ]
         read_only_fields = ["id"]
 
-    def _get_or_create_tags(self, tags, recipe):
-        """Handle getting or creating tags as needed."""
+    def _get_or_create_objects(self, model, items):
+        """Return the user's objects named in items, creating missing ones."""
         auth_user = self.context["request"].user
-        for tag in tags:
-            tag_obj, _ = Tag.objects.get_or_create(user=auth_user, **tag)
-            recipe.tags.add(tag_obj)
+        names = list(dict.fromkeys(item["name"] for item in items))
+        objs = get_or_create_by_name(model, auth_user, names)
+        return [objs[name] for name in names]
+
+    def _set_related(self, manager, model, items, replace=False):
+        """Link objects named in items, unlinking others if replacing.
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
+        The recipe is saved along with its links, so the m2m_changed
+        receiver is told not to invalidate its owner's cache again.
+        """
+        objs = self._get_or_create_objects(model, items)
+        manager.instance._saving_links = True
+        try:
+            if replace:
+                current = set(manager.values_list("id", flat=True))
+                stale = current.difference(obj.id for obj in objs)
+                if stale:
+                    manager.remove(*stale)
+                objs = [obj for obj in objs if obj.id not in current]
+            if objs:
+                manager.add(*objs)
+        finally:
+            del manager.instance._saving_links
+
+    def _get_or_create_tags(self, tags, recipe, replace=False):
+        """Handle getting or creating tags as needed."""
+        self._set_related(recipe.tags, Tag, tags, replace)
+
+    def _get_or_create_ingredients(self, ingredients, recipe, replace=False):
         """Handle getting or creating ingredients as needed."""
-        auth_user = self.context["request"].user
-        for ingredient in ingredients:
-            ingredient_obj, _ = Ingredient.objects.get_or_create(
-                user=auth_user, **ingredient
-            )
-            recipe.ingredients.add(ingredient_obj)
+        self._set_related(recipe.ingredients, Ingredient, ingredients, replace)
 
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe."""
         tags = validated_data.pop("tags", [])
@@ -70,18 +257,19 @@ class RecipeSerializer(serializers.ModelSerializer):
         self._get_or_create_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update recipe."""
         tags = validated_data.pop("tags", None)
         ingredients = validated_data.pop("ingredients", None)
 
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._get_or_create_tags(tags, instance, replace=True)
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._get_or_create_ingredients(
+                ingredients, instance, replace=True
+            )
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -100,12 +288,77 @@ class RecipeDetailSerializer(RecipeSerializer):
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes."""
 
+    image_derivatives = ImageDerivativesField()
+
     class Meta:
         model = Recipe
-        fields = ["id", "image"]
+        fields = ["id", "image", "image_derivatives"]
         read_only_fields = ["id"]
         extra_kwargs = {
             "image": {
                 "required": "True",
             }
         }
+
+
+class RecipeBulkOperationSerializer(serializers.Serializer):
+    """Serializer for one operation of a recipe batch."""
+
+    op = serializers.ChoiceField(choices=["create", "update", "delete"])
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        """Require the recipe ID for updates and deletes."""
+        if attrs["op"] != "create" and "id" not in attrs:
+            msg = _("This field is required for updates and deletes.")
+            raise serializers.ValidationError({"id": msg}, code="required")
+        return attrs
+
+
+class RecipeBulkSerializer(serializers.Serializer):
+    """Serializer for a batch of recipe operations."""
+
+    operations = RecipeBulkOperationSerializer(many=True, allow_empty=False)
+    atomic = serializers.BooleanField(default=False)
+
+    def validate_operations(self, value):
+        """Limit the batch size and allow one operation per recipe."""
+        if len(value) > settings.BULK_MAX_OPERATIONS:
+            msg = _("Ensure there are at most %(max)d operations.") % {
+                "max": settings.BULK_MAX_OPERATIONS,
+            }
+            raise serializers.ValidationError(msg, code="max_length")
+        ids = [op["id"] for op in value if op["op"] != "create"]
+        if len(ids) != len(set(ids)):
+            msg = _("Each recipe can only appear in one operation.")
+            raise serializers.ValidationError(msg, code="unique")
+        return value
+
+
+class RecipeBulkResultSerializer(serializers.Serializer):
+    """Serializer for the outcome of one batch operation."""
+
+    op = serializers.CharField()
+    id = serializers.IntegerField(allow_null=True)
+    status = serializers.ChoiceField(choices=["ok", "error"])
+    errors = serializers.JSONField(required=False)
+
+
+class RecipeSyncDeletedSerializer(serializers.Serializer):
+    """Serializer for the IDs of objects deleted since a sync token."""
+
+    recipes = serializers.ListField(child=serializers.IntegerField())
+    tags = serializers.ListField(child=serializers.IntegerField())
+    ingredients = serializers.ListField(child=serializers.IntegerField())
+
+
+class RecipeSyncSerializer(serializers.Serializer):
+    """Serializer for a page of changes since a sync token."""
+
+    recipes = RecipeDetailSerializer(many=True)
+    tags = TagDetailSerializer(many=True)
+    ingredients = IngredientDetailSerializer(many=True)
+    deleted = RecipeSyncDeletedSerializer()
+    token = serializers.CharField()
+    has_more = serializers.BooleanField()
@@ -0,0 +1,64 @@
+"""
+Signal handlers for the recipe app.
+"""
+
+from core.models import Ingredient
+from core.models import Recipe
+from core.models import Tag
+from core.models import Tombstone
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from recipe.cache import bump_user_version
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_user_cache(
+    sender,  # pyright: ignore
+    instance,
+    **kwargs,  # pyright: ignore
+):
+    """Invalidate the cached responses of the owner of a changed object."""
+    bump_user_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_relinked_recipes(
+    sender,  # pyright: ignore
+    instance,
+    action,
+    **kwargs,  # pyright: ignore
+):
+    """Invalidate the cached responses of the owner of changed links.
+
+    Links are changed from either the recipe or the tag or ingredient
+    side. Recipes saved along with their links, by the recipe
+    serializers, are invalidated by their own save.
+    """
+    if getattr(instance, "_saving_links", False):
+        return
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_user_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_tombstone(
+    sender,
+    instance,
+    **kwargs,  # pyright: ignore
+):
+    """Remember a deletion so delta sync can report it."""
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        model=sender._meta.model_name,
+        object_id=instance.pk,
+    )
@@ -0,0 +1,185 @@
+"""
+Delta sync of recipes, tags and ingredients.
+
+Rows are stamped by a database trigger with the ID of the transaction
+that last wrote them (change_xid). A sync token records, for each kind
+of object and for deletions, the (change_xid, ID) of the last change
+returned. Changes after it are read with a range scan of the (user,
+change_xid, id) indexes, so a sync costs in proportion to the number of
+changes rather than the collection size.
+
+Transactions get their IDs when they start writing but may commit in any
+order, so only changes below the oldest transaction still running are
+read. Those transactions have all ended, and no change below the
+cursor can show up later, however long a transaction takes to commit.
+"""
+
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+
+from core.models import Ingredient
+from core.models import Recipe
+from core.models import Tag
+from core.models import Tombstone
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.db.models import Prefetch
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework import status
+
+SALT = "recipe.sync"
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+KINDS = ["recipes", "tags", "ingredients", "deleted"]
+
+# Response key of the deletions of each tombstone model.
+DELETED_KEYS = {
+    Tombstone.RECIPE: "recipes",
+    Tombstone.TAG: "tags",
+    Tombstone.INGREDIENT: "ingredients",
+}
+
+
+class SyncTokenExpired(exceptions.APIException):
+    """The deletions since the sync token are no longer known."""
+
+    status_code = status.HTTP_410_GONE
+    default_detail = _("The sync token has expired, a full sync is required.")
+    default_code = "sync_token_expired"
+
+
+def _to_micros(value):
+    """Return a datetime as microseconds since the epoch."""
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value):
+    """Return microseconds since the epoch as a datetime."""
+    return EPOCH + timedelta(microseconds=value)
+
+
+def make_token(user, cursors):
+    """Return the signed sync token of a user's cursors."""
+    data = {"u": user.pk, "t": _to_micros(timezone.now()), "c": cursors}
+    return signing.dumps(data, salt=SALT)
+
+
+def read_token(user, token):
+    """Return the cursors of a sync token issued to the user."""
+    try:
+        data = signing.loads(token, salt=SALT)
+        cursors = data["c"]
+        valid = data["u"] == user.pk and sorted(cursors) == sorted(KINDS)
+    except (signing.BadSignature, KeyError, TypeError):
+        valid = False
+    if not valid:
+        raise exceptions.ValidationError(
+            {"token": [_("Invalid sync token.")]},
+            code="invalid",
+        )
+    # Tokens issued before change_xid have no issue time; their clients
+    # need a full resync.
+    retention = timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+    issued = data.get("t")
+    if issued is None or _from_micros(issued) < timezone.now() - retention:
+        raise SyncTokenExpired()
+    return cursors
+
+
+def get_horizon():
+    """Return the ID of the oldest transaction still running.
+
+    Every transaction with a lower ID has committed or rolled back.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+        )
+        return cursor.fetchone()[0]
+
+
+def _querysets(user):
+    """Return the querysets of the changes of each kind."""
+    return {
+        "recipes": Recipe.objects.filter(user=user).prefetch_related(
+            Prefetch("tags", queryset=Tag.objects.only("id", "name")),
+            Prefetch(
+                "ingredients",
+                queryset=Ingredient.objects.only("id", "name"),
+            ),
+        ),
+        "tags": Tag.objects.filter(user=user),
+        "ingredients": Ingredient.objects.filter(user=user),
+        "deleted": Tombstone.objects.filter(user=user),
+    }
+
+
+def _changes_after(queryset, cursor, horizon, limit):
+    """Return rows changed after cursor, the next cursor and if more remain.
+
+    The redundant lower bound lets the database scan the index range
+    from the cursor on instead of filtering every row of the user.
+    """
+    since, last_id = cursor
+    rows = list(
+        queryset.filter(
+            Q(change_xid__gt=since) | Q(id__gt=last_id),
+            change_xid__gte=since,
+            change_xid__lt=horizon,
+        ).order_by("change_xid", "id")[: limit + 1]
+    )
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, [last.change_xid, last.id], True
+    return rows, [horizon, 0], False
+
+
+def get_changes(user, token=None, limit=None):
+    """Return the user's changes since token, with the next sync token.
+
+    Without a token every object is returned, across as many pages as
+    needed. Changes of transactions newer than the oldest one still
+    running are held back until it ends.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    if token:
+        cursors = read_token(user, token)
+    horizon = get_horizon()
+    if not token:
+        # A client without data only needs deletions from now on.
+        cursors = {kind: [0, 0] for kind in KINDS}
+        cursors["deleted"] = [horizon, 0]
+
+    changes = {}
+    has_more = False
+    for kind, queryset in _querysets(user).items():
+        rows, cursors[kind], more = _changes_after(
+            queryset,
+            cursors[kind],
+            horizon,
+            limit,
+        )
+        changes[kind] = rows
+        has_more = has_more or more
+
+    deleted = {key: [] for key in DELETED_KEYS.values()}
+    for tombstone in changes["deleted"]:
+        deleted[DELETED_KEYS[tombstone.model]].append(tombstone.object_id)
+    changes["deleted"] = deleted
+    changes["token"] = make_token(user, cursors)
+    changes["has_more"] = has_more
+    return changes
+
+
+def prune_tombstones():
+    """Delete tombstones older than the retention period."""
+    retention = timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+    deleted, _rows = Tombstone.objects.filter(
+        deleted_at__lt=timezone.now() - retention,
+    ).delete()
+    return deleted
@@ -0,0 +1,212 @@
+"""
+Tests for conditional GET requests to the recipe APIs.
+"""
+
+from decimal import Decimal
+
+from core.models import Recipe
+from core.models import Tag
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+BULK_URL = reverse("recipe:recipe-bulk")
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 22,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(**params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalRequestTests(TestCase):
+    """Test ETag and Last-Modified handling."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.url = detail_url(self.recipe.id)  # pyright: ignore
+
+    def assertChanged(self, url, etag):
+        """Assert a request with the old ETag gets the full response."""
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_detail_has_validators(self):
+        """Test a recipe is returned with an ETag and Last-Modified."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["ETag"].startswith('W/"'))
+        self.assertIn("Last-Modified", res)
+        self.assertIn("no-cache", res["Cache-Control"])
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_detail_not_modified(self):
+        """Test a matching If-None-Match skips the database."""
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(res.content, b"")
+
+    def test_cached_detail_not_modified(self):
+        """Test a cached response answers If-None-Match on its own."""
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["X-Cache"], "HIT")
+
+    def test_detail_if_modified_since(self):
+        """Test If-Modified-Since is answered from the recipe."""
+        last_modified = self.client.get(self.url)["Last-Modified"]
+
+        res = self.client.get(
+            self.url,
+            HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_update_changes_etag(self):
+        """Test updating a recipe changes its ETag."""
+        etag = self.client.get(self.url)["ETag"]
+
+        self.client.patch(self.url, {"title": "New title"})
+
+        self.assertChanged(self.url, etag)
+
+    def test_link_change_changes_etag(self):
+        """Test changing only the tags of a recipe changes its ETag."""
+        etag = self.client.get(self.url)["ETag"]
+
+        self.client.patch(
+            self.url,
+            {"tags": [{"name": "Dinner"}]},
+            format="json",
+        )
+
+        self.assertChanged(self.url, etag)
+
+    def test_bulk_link_change_changes_etag(self):
+        """Test changing tags through the batch endpoint changes the ETag."""
+        etag = self.client.get(self.url)["ETag"]
+
+        self.client.post(
+            BULK_URL,
+            {
+                "operations": [
+                    {
+                        "op": "update",
+                        "id": self.recipe.id,  # pyright: ignore
+                        "data": {"tags": [{"name": "Dinner"}]},
+                    }
+                ]
+            },
+            format="json",
+        )
+
+        self.assertChanged(self.url, etag)
+
+    def test_tag_rename_changes_etag(self):
+        """Test renaming a tag changes the ETag of its recipes."""
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+        self.recipe.tags.add(tag)
+        etag = self.client.get(self.url)["ETag"]
+
+        self.client.patch(
+            reverse("recipe:tag-detail", args=[tag.id]),  # pyright: ignore
+            {"name": "Dinner"},
+        )
+
+        self.assertChanged(self.url, etag)
+
+    def test_missing_recipe(self):
+        """Test a missing recipe is reported without validators."""
+        url = detail_url(self.recipe.id + 1)  # pyright: ignore
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn("ETag", res)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_list_not_modified(self):
+        """Test a list with a matching ETag is not sent again."""
+        res = self.client.get(RECIPES_URL)
+        self.assertIn("Last-Modified", res)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_delete_changes_etag(self):
+        """Test deleting a recipe changes the ETag of the list."""
+        create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)["ETag"]
+
+        self.client.delete(self.url)
+
+        self.assertChanged(RECIPES_URL, etag)
+
+    def test_direct_link_change_changes_etag(self):
+        """Test linking a tag outside the API changes the recipe."""
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+        etag = self.client.get(self.url)["ETag"]
+
+        tag.recipe_set.add(self.recipe)
+
+        self.assertChanged(self.url, etag)
+
+    def test_direct_link_clear_changes_etag(self):
+        """Test clearing a tag's links from the tag changes its recipes."""
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+        self.recipe.tags.add(tag)
+        etag = self.client.get(self.url)["ETag"]
+
+        tag.recipe_set.clear()
+
+        self.assertChanged(self.url, etag)
+
+    def test_assigned_tags_link_change_changes_etag(self):
+        """Test linking a tag changes the ETag of the assigned tags."""
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+        url = f"{TAGS_URL}?assigned_only=1"
+        etag = self.client.get(url)["ETag"]
+
+        self.client.patch(
+            self.url,
+            {"tags": [{"name": tag.name}]},
+            format="json",
+        )
+
+        self.assertChanged(url, etag)
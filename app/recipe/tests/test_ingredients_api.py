@@ -9,11 +9,12 @@ from core.models import Recipe
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
-from recipe.serializers import IngredientSerializer
+from recipe.serializers import IngredientDetailSerializer
 from rest_framework import status
 from rest_framework.test import APIClient
 
 INGREDIENTS_URL = reverse("recipe:ingredient-list")
+AUTOCOMPLETE_URL = reverse("recipe:ingredient-autocomplete")
 
 
 def detail_url(ingredient_id):
@@ -58,9 +59,9 @@ class PrivateIngredientsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
         ingredients = Ingredient.objects.all().order_by("-name")
-        serializer = IngredientSerializer(ingredients, many=True)
+        serializer = IngredientDetailSerializer(ingredients, many=True)
         self.assertEqual(
-            res.data,  # pyright: ignore
+            res.data["results"],  # pyright: ignore
             serializer.data,
         )
 
@@ -76,7 +77,7 @@ class PrivateIngredientsApiTests(TestCase):
         res = self.client.get(INGREDIENTS_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        res_data = res.data  # pyright: ignore
+        res_data = res.data["results"]  # pyright: ignore
         self.assertEqual(len(res_data), 1)
         self.assertEqual(res_data[0]["name"], ingredient.name)
         self.assertEqual(
@@ -120,10 +121,11 @@ class PrivateIngredientsApiTests(TestCase):
         )
         recipe.ingredients.add(in1)
 
+        in1.refresh_from_db()
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
-        s1 = IngredientSerializer(in1)
-        s2 = IngredientSerializer(in2)
-        res_data = res.data  # pyright: ignore
+        s1 = IngredientDetailSerializer(in1)
+        s2 = IngredientDetailSerializer(in2)
+        res_data = res.data["results"]  # pyright: ignore
         self.assertIn(s1.data, res_data)
         self.assertNotIn(s2.data, res_data)
 
@@ -149,6 +151,75 @@ class PrivateIngredientsApiTests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
         self.assertEqual(
-            len(res.data),  # pyright: ignore
+            len(res.data["results"]),  # pyright: ignore
             1,
         )
+
+    def _autocomplete(self, text, **params):
+        """Autocomplete ingredient names and return the names found."""
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": text, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item["name"] for item in res.data]  # pyright: ignore
+
+    def test_autocomplete_ranks_prefix_matches_first(self):
+        """Test names starting with the text come before other matches."""
+        for name in ["Cherry tomatoes", "Tomato", "Potato", "Rice"]:
+            Ingredient.objects.create(user=self.user, name=name)
+        other_user = create_user(email="other@example.com")
+        Ingredient.objects.create(user=other_user, name="Tomato paste")
+
+        names = self._autocomplete("tom")
+
+        self.assertEqual(names, ["Tomato", "Cherry tomatoes"])
+
+    def test_autocomplete_similar_names(self):
+        """Test misspelled names still find similar ingredients."""
+        Ingredient.objects.create(user=self.user, name="Tomato")
+
+        self.assertEqual(self._autocomplete("tomatos"), ["Tomato"])
+
+    def test_autocomplete_short_text_matches_prefixes(self):
+        """Test texts too short for similarity only match name prefixes."""
+        Ingredient.objects.create(user=self.user, name="Tofu")
+        Ingredient.objects.create(user=self.user, name="Potato")
+        tomato = Ingredient.objects.create(user=self.user, name="Tomato")
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title="Salad",
+            time_minutes=5,
+            price=Decimal("2.00"),
+        )
+        recipe.ingredients.add(tomato)
+
+        self.assertEqual(self._autocomplete("to"), ["Tomato", "Tofu"])
+        self.assertEqual(self._autocomplete("ot"), [])
+
+    def test_autocomplete_prefers_used_ingredients(self):
+        """Test equally good matches are ranked by recipe count."""
+        Ingredient.objects.create(user=self.user, name="Sugar brown")
+        white = Ingredient.objects.create(user=self.user, name="Sugar white")
+        for title in ["Cake", "Cookies"]:
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=30,
+                price=Decimal("3.00"),
+            )
+            recipe.ingredients.add(white)
+
+        names = self._autocomplete("sugar")
+
+        self.assertEqual(names, ["Sugar white", "Sugar brown"])
+
+    def test_autocomplete_limit(self):
+        """Test the number of matches is limited."""
+        for i in range(5):
+            Ingredient.objects.create(user=self.user, name=f"Pepper {i}")
+
+        self.assertEqual(len(self._autocomplete("pepper", limit=2)), 2)
+
+    def test_autocomplete_invalid_parameters(self):
+        """Test a missing text or an invalid limit is rejected."""
+        for params in [{}, {"q": "pepper", "limit": 0}]:
+            res = self.client.get(AUTOCOMPLETE_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,203 @@
+"""
+Tests for routing recipe API reads to read replicas.
+"""
+
+import random
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from core.models import Recipe
+from core.routers import ReplicaRouter
+from core.routers import pin_to_primary
+from core.routers import read_from_replicas
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from recipe.checks import check_replica_pins
+from rest_framework.test import APIClient
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+FILE_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": "/tmp/recipe-app-unused",
+    },
+}
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+class ReplicaRouterTests(TestCase):
+    """Test the database router."""
+
+    @override_settings(DATABASE_REPLICAS=["replica_0", "replica_1"])
+    def test_reads_use_replicas_when_enabled(self):
+        """Test reads go to a replica only inside read_from_replicas()."""
+        router = ReplicaRouter()
+
+        self.assertEqual(router.db_for_read(Recipe), "default")
+        with read_from_replicas():
+            self.assertIn(
+                router.db_for_read(Recipe),
+                ["replica_0", "replica_1"],
+            )
+            self.assertEqual(router.db_for_write(Recipe), "default")
+        self.assertEqual(router.db_for_read(Recipe), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica_0"])
+    def test_replicas_not_migrated(self):
+        """Test migrations only run on the primary."""
+        router = ReplicaRouter()
+
+        self.assertFalse(router.allow_migrate("replica_0", "core"))
+        self.assertIsNone(router.allow_migrate("default", "core"))
+
+
+# The primary stands in for the replica, so routed queries still run.
+@override_settings(DATABASE_REPLICAS=["default"], REPLICA_PIN_SECONDS=60)
+@patch("core.routers.random.choice", wraps=random.choice)
+class ReplicaReadTests(TestCase):
+    """Test which API requests read from the replicas."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title="Sample recipe",
+            time_minutes=10,
+            price=Decimal("5.00"),
+        )
+
+    def test_list_and_retrieve_use_replicas(self, patched_choice):
+        """Test listing and retrieving read from a replica."""
+        for url in [
+            RECIPES_URL,
+            detail_url(self.recipe.id),  # pyright: ignore
+            TAGS_URL,
+        ]:
+            patched_choice.reset_mock()
+
+            self.client.get(url)
+
+            patched_choice.assert_called()
+
+    def test_writes_use_primary(self, patched_choice):
+        """Test writes and the reads they make use the primary."""
+        self.client.patch(
+            detail_url(self.recipe.id),  # pyright: ignore
+            {"title": "New title"},
+        )
+
+        patched_choice.assert_not_called()
+
+    def test_reads_pinned_after_write(self, patched_choice):
+        """Test a user's reads stay on the primary after they write."""
+        self.client.patch(
+            detail_url(self.recipe.id),  # pyright: ignore
+            {"title": "New title"},
+        )
+        res = self.client.get(RECIPES_URL)
+
+        patched_choice.assert_not_called()
+        self.assertEqual(
+            res.data["results"][0]["title"],  # pyright: ignore
+            "New title",
+        )
+
+        cache.clear()
+        self.client.get(RECIPES_URL)
+
+        patched_choice.assert_called()
+
+    def test_replica_read_not_cached_when_pinned(self, patched_choice):
+        """Test a replica read racing a write of the user is not cached."""
+        url = detail_url(self.recipe.id)  # pyright: ignore
+        pin_to_primary(self.user)
+
+        # The user was not pinned yet when the request chose a replica.
+        with patch("recipe.views.is_pinned", return_value=False):
+            self.client.get(url)
+            res = self.client.get(url)
+
+        patched_choice.assert_called()
+        self.assertEqual(res["X-Cache"], "MISS")
+
+
+class ReplicaPinCheckTests(TestCase):
+    """Test read replicas need a default cache shared by all processes."""
+
+    @override_settings(CACHES=LOCMEM_CACHES, DATABASE_REPLICAS=["replica_0"])
+    def test_local_cache_refused(self):
+        """Test replicas are refused with a per-process default cache."""
+        errors = check_replica_pins(None)
+
+        self.assertEqual([error.id for error in errors], ["recipe.E002"])
+
+    @override_settings(CACHES=FILE_CACHES, DATABASE_REPLICAS=["replica_0"])
+    def test_file_cache_refused(self):
+        """Test replicas are refused with a cache evicting any key."""
+        errors = check_replica_pins(None)
+
+        self.assertEqual([error.id for error in errors], ["recipe.E002"])
+
+    @override_settings(CACHES=LOCMEM_CACHES, DATABASE_REPLICAS=[])
+    def test_local_cache_without_replicas(self):
+        """Test a per-process cache is accepted without replicas."""
+        self.assertEqual(check_replica_pins(None), [])
+
+
+# Run with DB_REPLICA_HOSTS set to check routing over real connections.
+# Replica aliases mirror the test database on connections of their own,
+# which only see committed data, hence TransactionTestCase.
+@skipUnless(settings.DATABASE_REPLICAS, "No read replicas configured")
+class ReplicaConnectionTests(TransactionTestCase):
+    """Test reads reach the replica connections."""
+
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+        Recipe.objects.create(
+            user=user,
+            title="Sample recipe",
+            time_minutes=10,
+            price=Decimal("5.00"),
+        )
+
+    def test_list_reads_replica(self):
+        """Test a recipe list is read from a replica connection."""
+        alias = settings.DATABASE_REPLICAS[0]
+
+        with override_settings(DATABASE_REPLICAS=[alias]):
+            with CaptureQueriesContext(connections[alias]) as queries:
+                res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data["results"]), 1)  # pyright: ignore
+        self.assertTrue(queries.captured_queries)
@@ -4,15 +4,28 @@ Tests for recipe APIs.
 
 import os
 import tempfile
+from base64 import b64encode
+from datetime import timedelta
 from decimal import Decimal
+from unittest.mock import patch
+from urllib.parse import urlencode
 
+from core.models import ImageJob
 from core.models import Ingredient
 from core.models import Recipe
 from core.models import Tag
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.test import TestCase
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from PIL import Image
+from recipe.images import claim_job
+from recipe.images import delete_derivatives
+from recipe.images import process_job
+from recipe.images import process_pending_jobs
+from recipe.pagination import RecipeCursorPagination
 from recipe.serializers import RecipeDetailSerializer
 from recipe.serializers import RecipeSerializer
 from rest_framework import status
@@ -84,7 +97,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.all().order_by("-id")
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(
-            res.data,  # pyright: ignore
+            res.data["results"],  # pyright: ignore
             serializer.data,
         )
 
@@ -103,10 +116,46 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(
-            res.data,  # pyright: ignore
+            res.data["results"],  # pyright: ignore
             serializer.data,
         )
 
+    def test_recipe_list_paginated_by_cursor(self):
+        """Test recipes are paginated newest first with a cursor."""
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res_data = res.data  # pyright: ignore
+        self.assertEqual(
+            [r["id"] for r in res_data["results"]],
+            [r.id for r in recipes[:-3:-1]],  # pyright: ignore
+        )
+        self.assertIsNone(res_data["previous"])
+
+        seen = [r["id"] for r in res_data["results"]]
+        while res_data["next"]:
+            res = self.client.get(res_data["next"])
+            res_data = res.data  # pyright: ignore
+            seen.extend(r["id"] for r in res_data["results"])
+        self.assertEqual(
+            seen,
+            [r.id for r in reversed(recipes)],  # pyright: ignore
+        )
+
+    def test_recipe_list_page_size_capped(self):
+        """Test the requested page size cannot exceed the maximum."""
+        for _ in range(4):
+            create_recipe(user=self.user)
+
+        with patch.object(RecipeCursorPagination, "max_page_size", 3):
+            res = self.client.get(RECIPES_URL, {"page_size": 50})
+
+        self.assertEqual(
+            len(res.data["results"]),  # pyright: ignore
+            3,
+        )
+
     def test_get_recipe_detail(self):
         """Test get recipe detail."""
         recipe = create_recipe(user=self.user)
@@ -289,6 +338,36 @@ class PrivateRecipeApiTests(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_with_concurrently_created_tag(self):
+        """Test a tag created by a concurrent request is reused."""
+        bulk_create = Tag.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            if not kwargs:
+                Tag.objects.create(user=self.user, name="Thai")
+            return bulk_create(objs, **kwargs)
+
+        payload = {
+            "title": "Thai Prawn Curry",
+            "time_minutes": 30,
+            "price": Decimal("2.50"),
+            "tags": [{"name": "Thai"}, {"name": "Dinner"}],
+        }
+        with patch.object(
+            Tag.objects,
+            "bulk_create",
+            side_effect=racing_bulk_create,
+        ):
+            res = self.client.post(RECIPES_URL, data=payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        recipe = Recipe.objects.get(id=res.data["id"])  # pyright: ignore
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)),
+            ["Dinner", "Thai"],
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
     def test_create_tag_on_update(self):
         """Test creating tag when updating a recipe."""
         recipe = create_recipe(user=self.user)
@@ -479,7 +558,7 @@ class PrivateRecipeApiTests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        res_data = res.data  # pyright: ignore
+        res_data = res.data["results"]  # pyright: ignore
         self.assertIn(s1.data, res_data)
         self.assertIn(s2.data, res_data)
         self.assertNotIn(s3.data, res_data)
@@ -502,11 +581,207 @@ class PrivateRecipeApiTests(TestCase):
         s1 = RecipeSerializer(r1)
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
-        res_data = res.data  # pyright: ignore
+        res_data = res.data["results"]  # pyright: ignore
         self.assertIn(s1.data, res_data)
         self.assertIn(s2.data, res_data)
         self.assertNotIn(s3.data, res_data)
 
+    def test_filter_by_all_tags(self):
+        """Test filtering recipes having every requested tag."""
+        r1 = create_recipe(user=self.user, title="Vegan Curry")
+        r2 = create_recipe(user=self.user, title="Vegetable Soup")
+
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Dinner")
+
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+
+        params = {
+            "tags": f"{tag1.id},{tag2.id}",  # pyright: ignore
+            "tags_mode": "all",
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        res_data = res.data["results"]  # pyright: ignore
+        self.assertEqual(res_data, [RecipeSerializer(r1).data])
+
+    def test_filter_by_all_ingredients(self):
+        """Test filtering recipes having every requested ingredient."""
+        r1 = create_recipe(user=self.user, title="Omelette")
+        r2 = create_recipe(user=self.user, title="Boiled Eggs")
+        r3 = create_recipe(user=self.user, title="Cheese Toast")
+
+        in1 = Ingredient.objects.create(user=self.user, name="Eggs")
+        in2 = Ingredient.objects.create(user=self.user, name="Cheese")
+
+        r1.ingredients.add(in1, in2)
+        r2.ingredients.add(in1)
+        r3.ingredients.add(in2)
+
+        params = {
+            "ingredients": f"{in1.id},{in2.id}",  # pyright: ignore
+            "ingredients_mode": "all",
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        res_data = res.data["results"]  # pyright: ignore
+        self.assertEqual(res_data, [RecipeSerializer(r1).data])
+
+    def test_filter_by_all_tags_and_any_ingredient(self):
+        """Test combining the tag and ingredient filters."""
+        r1 = create_recipe(user=self.user, title="Vegan Curry")
+        r2 = create_recipe(user=self.user, title="Vegan Salad")
+        r3 = create_recipe(user=self.user, title="Curry Soup")
+
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Dinner")
+        in1 = Ingredient.objects.create(user=self.user, name="Rice")
+
+        r1.tags.add(tag1, tag2)
+        r1.ingredients.add(in1)
+        r2.tags.add(tag1, tag2)
+        r3.tags.add(tag1)
+        r3.ingredients.add(in1)
+
+        params = {
+            "tags": f"{tag1.id},{tag2.id}",  # pyright: ignore
+            "tags_mode": "all",
+            "ingredients": f"{in1.id}",  # pyright: ignore
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        res_data = res.data["results"]  # pyright: ignore
+        self.assertEqual(res_data, [RecipeSerializer(r1).data])
+
+    def test_filter_by_tags_no_duplicates(self):
+        """Test a recipe matching several tags is returned once."""
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name="Quick")
+        tag2 = Tag.objects.create(user=self.user, name="Easy")
+        recipe.tags.add(tag1, tag2)
+
+        params = {"tags": f"{tag1.id},{tag2.id}"}  # pyright: ignore
+        res = self.client.get(RECIPES_URL, params)
+
+        res_data = res.data["results"]  # pyright: ignore
+        self.assertEqual(len(res_data), 1)
+
+    def test_filter_by_time_and_price_range(self):
+        """Test filtering recipes by time and price ranges."""
+        r1 = create_recipe(user=self.user, time_minutes=10, price="4.00")
+        create_recipe(user=self.user, time_minutes=5, price="4.00")
+        create_recipe(user=self.user, time_minutes=10, price="9.50")
+        create_recipe(user=self.user, time_minutes=45, price="4.00")
+
+        params = {
+            "time_minutes_min": 10,
+            "time_minutes_max": 30,
+            "price_max": "5.00",
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        res_data = res.data["results"]  # pyright: ignore
+        self.assertEqual(res_data, [RecipeSerializer(r1).data])
+
+    def test_filter_by_range_and_tags(self):
+        """Test range filters combine with the tag filters."""
+        r1 = create_recipe(user=self.user, price="3.00")
+        r2 = create_recipe(user=self.user, price="12.00")
+        tag = Tag.objects.create(user=self.user, name="Dinner")
+        r1.tags.add(tag)
+        r2.tags.add(tag)
+
+        params = {"tags": f"{tag.id}", "price_max": "5"}  # pyright: ignore
+        res = self.client.get(RECIPES_URL, params)
+
+        res_data = res.data["results"]  # pyright: ignore
+        self.assertEqual(res_data, [RecipeSerializer(r1).data])
+
+    def test_order_by_price(self):
+        """Test ordering recipes by price, across pages."""
+        r1 = create_recipe(user=self.user, price="7.00")
+        r2 = create_recipe(user=self.user, price="2.00")
+        r3 = create_recipe(user=self.user, price="7.00")
+
+        found = []
+        url = f"{RECIPES_URL}?ordering=-price&page_size=1"
+        while url:
+            data = self.client.get(url).data  # pyright: ignore
+            found.extend(r["id"] for r in data["results"])
+            url = data["next"]
+
+        self.assertEqual(found, [r3.id, r1.id, r2.id])  # pyright: ignore
+
+    def test_order_by_price_pages_through_ties(self):
+        """Test cursors page through many recipes with the same price."""
+        recipes = [
+            create_recipe(user=self.user, price="5.00") for _i in range(5)
+        ]
+        create_recipe(user=self.user, price="9.00")
+
+        ids = []
+        url = f"{RECIPES_URL}?ordering=price&page_size=2"
+        pages = 0
+        while url:
+            data = self.client.get(url).data  # pyright: ignore
+            ids.extend(r["id"] for r in data["results"])
+            url = data["next"]
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids[:5], [r.id for r in recipes])  # pyright: ignore
+
+        back = []
+        while data["previous"]:
+            data = self.client.get(data["previous"]).data  # pyright: ignore
+            back = [r["id"] for r in data["results"]] + back
+        self.assertEqual(back, ids[:4])
+
+    def test_invalid_cursor(self):
+        """Test malformed cursor positions are rejected."""
+        for position in ['["x", "1"]', '"5.00"', "[1"]:
+            cursor = b64encode(urlencode({"p": position}).encode()).decode()
+            res = self.client.get(
+                RECIPES_URL,
+                {"ordering": "price", "cursor": cursor},
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_price_bounds_clamped(self):
+        """Test price bounds above the largest price are accepted."""
+        recipe = create_recipe(user=self.user, price="999.99")
+
+        res = self.client.get(
+            RECIPES_URL,
+            {"price_min": "999.99", "price_max": "100000"},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res_data = res.data["results"]  # pyright: ignore
+        self.assertEqual([r["id"] for r in res_data], [recipe.id])
+
+    def test_order_by_time_minutes(self):
+        """Test ordering recipes by preparation time."""
+        r1 = create_recipe(user=self.user, time_minutes=30)
+        r2 = create_recipe(user=self.user, time_minutes=5)
+
+        res = self.client.get(RECIPES_URL, {"ordering": "time_minutes"})
+
+        res_ids = [r["id"] for r in res.data["results"]]  # pyright: ignore
+        self.assertEqual(res_ids, [r2.id, r1.id])  # pyright: ignore
+
+    def test_invalid_range_and_ordering(self):
+        """Test bad range values and unknown orderings are rejected."""
+        for params in [
+            {"time_minutes_min": "soon"},
+            {"price_max": "-1"},
+            {"ordering": "title"},
+        ]:
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class ImageUploadTests(TestCase):
     """Tests for the image upload API."""
@@ -521,8 +796,23 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        delete_derivatives(self.recipe.image_derivatives)
         self.recipe.image.delete()
 
+    def _upload(self, size=(10, 10)):
+        """Upload a JPEG image of the given size to the recipe."""
+        url = image_upload_url(self.recipe.id)  # pyright: ignore
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            img = Image.new("RGB", size)
+            img.save(image_file, format="JPEG")
+            image_file.seek(0)
+            return self.client.post(
+                url,
+                data={"image": image_file},
+                format="multipart",
+            )
+
     def test_upload_image(self):
         """Test uploading an image to a recipe."""
         url = image_upload_url(self.recipe.id)  # pyright: ignore
@@ -555,3 +845,114 @@ class ImageUploadTests(TestCase):
             format="multipart",
         )
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_queues_derivatives(self):
+        """Test uploading an image queues a resize job."""
+        res = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["image_derivatives"],  # pyright: ignore
+            {},
+        )
+        self.recipe.refresh_from_db()
+        job = ImageJob.objects.get(recipe=self.recipe)
+        self.assertEqual(job.status, ImageJob.PENDING)
+        self.assertEqual(job.image, self.recipe.image.name)
+
+    @override_settings(
+        IMAGE_DERIVATIVE_WIDTHS=[4, 20],
+        IMAGE_DERIVATIVE_FORMATS=["jpeg"],
+    )
+    def test_process_job_generates_derivatives(self):
+        """Test processing a job stores smaller copies of the image."""
+        self._upload(size=(10, 6))
+
+        job = process_job()
+
+        self.assertEqual(job.status, ImageJob.DONE)  # pyright: ignore
+        self.recipe.refresh_from_db()
+        derivatives = self.recipe.image_derivatives
+        self.assertEqual(list(derivatives), ["4"])
+        with default_storage.open(derivatives["4"]["jpeg"]) as f:
+            self.assertEqual(Image.open(f).size, (4, 2))
+
+        res = self.client.get(detail_url(self.recipe.id))  # pyright: ignore
+        url = res.data["image_derivatives"]["4"]["jpeg"]  # pyright: ignore
+        self.assertTrue(url.startswith("http://testserver/static/media/"))
+
+    def test_process_job_retries_then_fails(self):
+        """Test a job failing repeatedly is eventually marked failed."""
+        self._upload()
+        self.recipe.refresh_from_db()
+        default_storage.delete(self.recipe.image.name)
+
+        with self.settings(IMAGE_JOB_MAX_ATTEMPTS=2):
+            first = process_job()
+            second = process_job()
+
+        self.assertEqual(first.status, ImageJob.PENDING)  # pyright: ignore
+        self.assertEqual(second.status, ImageJob.FAILED)  # pyright: ignore
+        self.assertIsNone(process_job())
+
+    @override_settings(
+        IMAGE_DERIVATIVE_WIDTHS=[4],
+        IMAGE_DERIVATIVE_FORMATS=["jpeg"],
+    )
+    def test_pending_jobs_retried(self):
+        """Test a worker runs the retries of failed jobs and other jobs."""
+        self._upload(size=(10, 6))
+        first = ImageJob.objects.get()
+        other = ImageJob.objects.create(recipe=self.recipe, image=first.image)
+
+        with patch(
+            "recipe.images.generate_derivatives",
+            side_effect=[OSError("Broken"), {}, {}],
+        ):
+            processed = process_pending_jobs(first.id)
+
+        self.assertEqual(processed, 3)
+        first.refresh_from_db()
+        self.assertEqual(first.status, ImageJob.DONE)
+        self.assertEqual(first.attempts, 2)
+        other.refresh_from_db()
+        self.assertEqual(other.status, ImageJob.DONE)
+
+    @override_settings(
+        IMAGE_DERIVATIVE_WIDTHS=[4],
+        IMAGE_DERIVATIVE_FORMATS=["jpeg"],
+        IMAGE_JOB_MAX_ATTEMPTS=2,
+        IMAGE_JOB_TIMEOUT=60,
+    )
+    def test_stuck_job_reclaimed(self):
+        """Test a job left running by a dead worker is run again."""
+        self._upload(size=(10, 6))
+        job = claim_job()
+        running = ImageJob.objects.filter(id=job.id)  # pyright: ignore
+        running.update(updated_at=timezone.now() - timedelta(seconds=30))
+
+        self.assertIsNone(process_job())
+
+        running.update(updated_at=timezone.now() - timedelta(seconds=90))
+        reclaimed = process_job()
+
+        self.assertEqual(reclaimed.id, job.id)  # pyright: ignore
+        self.assertEqual(reclaimed.status, ImageJob.DONE)  # pyright: ignore
+        self.assertEqual(reclaimed.attempts, 2)  # pyright: ignore
+        self.recipe.refresh_from_db()
+        self.assertEqual(list(self.recipe.image_derivatives), ["4"])
+
+    @override_settings(IMAGE_JOB_MAX_ATTEMPTS=1, IMAGE_JOB_TIMEOUT=60)
+    def test_stuck_job_out_of_attempts_fails(self):
+        """Test a stuck job that used all its attempts is marked failed."""
+        self._upload()
+        job = claim_job()
+        ImageJob.objects.filter(id=job.id).update(  # pyright: ignore
+            updated_at=timezone.now() - timedelta(seconds=90),
+        )
+
+        self.assertIsNone(process_job())
+
+        job.refresh_from_db()  # pyright: ignore
+        self.assertEqual(job.status, ImageJob.FAILED)  # pyright: ignore
+        self.assertEqual(job.error, "Timed out.")  # pyright: ignore
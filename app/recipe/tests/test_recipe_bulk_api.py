@@ -0,0 +1,257 @@
+"""
+Tests for the batch recipe API.
+"""
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from core.models import Ingredient
+from core.models import Recipe
+from core.models import Tag
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from recipe.bulk import RecipeBulkWriter
+from rest_framework import status
+from rest_framework.test import APIClient
+
+BULK_URL = reverse("recipe:recipe-bulk")
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 22,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(**params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(**params):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(**params)  # pyright: ignore
+
+
+def create_op(title, **data):
+    """Return a create operation for a recipe."""
+    data.update(title=title, time_minutes=10, price="4.50")
+    return {"op": "create", "data": data}
+
+
+class PublicRecipeBulkApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Test auth is required to call API."""
+        res = self.client.post(BULK_URL, {}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateRecipeBulkApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.user = create_user(
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_create_update_delete(self):
+        """Test applying a mix of operations."""
+        updated = create_recipe(user=self.user, title="Old title")
+        deleted = create_recipe(user=self.user)
+        payload = {
+            "operations": [
+                create_op("Soup", tags=[{"name": "Dinner"}]),
+                {
+                    "op": "update",
+                    "id": updated.id,  # pyright: ignore
+                    "data": {"title": "New title"},
+                },
+                {"op": "delete", "id": deleted.id},  # pyright: ignore
+            ]
+        }
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res_data = res.data  # pyright: ignore
+        self.assertEqual([r["status"] for r in res_data], ["ok"] * 3)
+        created = Recipe.objects.get(id=res_data[0]["id"])
+        self.assertEqual(created.title, "Soup")
+        self.assertEqual(created.user, self.user)
+        self.assertEqual(
+            list(created.tags.values_list("name", flat=True)),
+            ["Dinner"],
+        )
+        updated.refresh_from_db()
+        self.assertEqual(updated.title, "New title")
+        self.assertFalse(
+            Recipe.objects.filter(
+                id=deleted.id,  # pyright: ignore
+            ).exists()
+        )
+
+    def test_bulk_reuses_and_replaces_links(self):
+        """Test tags and ingredients are shared and replaced."""
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        pepper = Ingredient.objects.create(user=self.user, name="Pepper")
+        recipe = create_recipe(user=self.user)
+        recipe.ingredients.add(salt, pepper)
+        payload = {
+            "operations": [
+                create_op("Chips", ingredients=[{"name": "Salt"}]),
+                create_op("Fish", ingredients=[{"name": "Lemon"}]),
+                {
+                    "op": "update",
+                    "id": recipe.id,  # pyright: ignore
+                    "data": {
+                        "ingredients": [{"name": "Salt"}, {"name": "Lemon"}],
+                    },
+                },
+            ]
+        }
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(),
+            3,
+        )
+        self.assertEqual(
+            sorted(recipe.ingredients.values_list("name", flat=True)),
+            ["Lemon", "Salt"],
+        )
+        chips = Recipe.objects.get(
+            id=res.data[0]["id"],  # pyright: ignore
+        )
+        self.assertEqual(list(chips.ingredients.all()), [salt])
+
+    def test_bulk_invalid_items_reported(self):
+        """Test invalid operations are reported and others applied."""
+        other_user = create_user(
+            email="other@example.com",
+            password="testpass123",
+        )
+        other_recipe = create_recipe(user=other_user)
+        payload = {
+            "operations": [
+                create_op("Valid"),
+                {"op": "create", "data": {"title": "No time or price"}},
+                {"op": "delete", "id": other_recipe.id},  # pyright: ignore
+            ]
+        }
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res_data = res.data  # pyright: ignore
+        self.assertEqual(
+            [r["status"] for r in res_data],
+            ["ok", "error", "error"],
+        )
+        self.assertIn("time_minutes", res_data[1]["errors"])
+        self.assertTrue(Recipe.objects.filter(title="Valid").exists())
+        self.assertTrue(
+            Recipe.objects.filter(
+                id=other_recipe.id,  # pyright: ignore
+            ).exists()
+        )
+
+    def test_bulk_atomic_writes_nothing_on_error(self):
+        """Test atomic batches are not applied if any item is invalid."""
+        recipe = create_recipe(user=self.user)
+        payload = {
+            "atomic": True,
+            "operations": [
+                create_op("Valid", tags=[{"name": "Lunch"}]),
+                {"op": "delete", "id": recipe.id},  # pyright: ignore
+                {"op": "update", "id": 0, "data": {"title": "Missing"}},
+            ],
+        }
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data[2]["status"],  # pyright: ignore
+            "error",
+        )
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_duplicate_recipe_error(self):
+        """Test a recipe cannot appear in several operations."""
+        recipe = create_recipe(user=self.user)
+        payload = {
+            "operations": [
+                {
+                    "op": "update",
+                    "id": recipe.id,  # pyright: ignore
+                    "data": {"title": "New"},
+                },
+                {"op": "delete", "id": recipe.id},  # pyright: ignore
+            ]
+        }
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(
+            Recipe.objects.filter(
+                id=recipe.id,  # pyright: ignore
+            ).exists()
+        )
+
+    def test_bulk_update_requires_id(self):
+        """Test updates without a recipe ID are rejected."""
+        payload = {"operations": [{"op": "update", "data": {"title": "X"}}]}
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_query_count_independent_of_size(self):
+        """Test writes are set-based rather than per recipe."""
+
+        def payload(count):
+            return {
+                "operations": [
+                    create_op(
+                        f"Recipe {i}",
+                        tags=[{"name": f"Tag {i}"}, {"name": "Shared"}],
+                        ingredients=[{"name": f"Ingredient {i}"}],
+                    )
+                    for i in range(count)
+                ]
+            }
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(BULK_URL, payload(2), format="json")
+        Recipe.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.post(BULK_URL, payload(40), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(Recipe.objects.count(), 40)
+        self.assertEqual(Tag.objects.count(), 41)
+
+    def test_bulk_writes_in_chunks(self):
+        """Test operations are written one chunk at a time."""
+        payload = {"operations": [create_op(f"R{i}") for i in range(5)]}
+        with patch.object(
+            RecipeBulkWriter,
+            "_write_chunk",
+            autospec=True,
+            side_effect=RecipeBulkWriter._write_chunk,
+        ) as write_chunk, self.settings(BULK_CHUNK_SIZE=2):
+            res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(write_chunk.call_count, 3)
+        self.assertEqual(Recipe.objects.count(), 5)
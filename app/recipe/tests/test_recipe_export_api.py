@@ -0,0 +1,167 @@
+"""
+Tests for the recipe export API.
+"""
+
+import csv
+import io
+import json
+from decimal import Decimal
+
+from core.models import Ingredient
+from core.models import Recipe
+from core.models import Tag
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+EXPORT_URL = reverse("recipe:recipe-export")
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 22,
+        "price": Decimal("5.25"),
+        "description": "Sample description",
+    }
+    defaults.update(**params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(**params):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(**params)  # pyright: ignore
+
+
+class PublicRecipeExportApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """Test auth is required to call API."""
+        res = self.client.get(EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateRecipeExportApiTests(TestCase):
+    """Test authenticated API requests."""
+
+    def setUp(self):
+        self.user = create_user(
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _content(self, res):
+        """Return the streamed body of a response as text."""
+        return b"".join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test exporting recipes as NDJSON."""
+        r1 = create_recipe(user=self.user, title="Curry")
+        r1.tags.add(Tag.objects.create(user=self.user, name="Dinner"))
+        r1.ingredients.add(
+            Ingredient.objects.create(user=self.user, name="Rice")
+        )
+        r2 = create_recipe(user=self.user, title="Salad")
+        other_user = create_user(
+            email="other@example.com",
+            password="testpass123",
+        )
+        create_recipe(user=other_user)
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in self._content(res).splitlines()]
+        self.assertEqual(
+            [row["id"] for row in rows],
+            [r2.id, r1.id],  # pyright: ignore
+        )
+        self.assertEqual(rows[1]["price"], "5.25")
+        self.assertEqual(rows[1]["tags"][0]["name"], "Dinner")
+        self.assertEqual(rows[1]["ingredients"][0]["name"], "Rice")
+
+    def test_export_csv(self):
+        """Test exporting recipes as CSV."""
+        recipe = create_recipe(user=self.user, title="Pasta, Fresh")
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name="Italian"),
+            Tag.objects.create(user=self.user, name="Quick"),
+        )
+
+        res = self.client.get(EXPORT_URL, {"export_format": "csv"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(io.StringIO(self._content(res))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["title"], "Pasta, Fresh")
+        self.assertEqual(
+            sorted(rows[0]["tags"].split("|")),
+            ["Italian", "Quick"],
+        )
+
+    def test_export_applies_filters(self):
+        """Test the export honours the list filters."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        create_recipe(user=self.user)
+
+        res = self.client.get(
+            EXPORT_URL,
+            {"tags": str(tag.id)},  # pyright: ignore
+        )
+
+        lines = self._content(res).splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(
+            json.loads(lines[0])["id"],
+            recipe.id,  # pyright: ignore
+        )
+
+    def test_export_invalid_format(self):
+        """Test an unknown export format is rejected."""
+        res = self.client.get(EXPORT_URL, {"export_format": "xml"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_prefetches_per_chunk(self):
+        """Test relations are loaded once per chunk, not per recipe."""
+        for _ in range(5):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f"Tag {recipe.id}")
+            )
+
+        res = self.client.get(EXPORT_URL)
+        # One query and two relation loads per chunk of two recipes.
+        with self.assertNumQueries(9):
+            lines = self._content(res).splitlines()
+        self.assertEqual(len(lines), 5)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_chunks_keep_ordering(self):
+        """Test chunks continue after recipes sharing the ordered value."""
+        prices = ["3.00", "1.00", "3.00", "3.00", "2.00"]
+        recipes = [
+            create_recipe(user=self.user, price=Decimal(price))
+            for price in prices
+        ]
+
+        res = self.client.get(EXPORT_URL, {"ordering": "-price"})
+
+        lines = self._content(res).splitlines()
+        ids = [json.loads(line)["id"] for line in lines]
+        expected = sorted(recipes, key=lambda r: (-r.price, -r.id))
+        self.assertEqual(ids, [r.id for r in expected])
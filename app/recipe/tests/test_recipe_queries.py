@@ -0,0 +1,168 @@
+"""
+Tests for the number of queries issued by the recipe APIs.
+"""
+
+from decimal import Decimal
+
+from core.models import Ingredient
+from core.models import Recipe
+from core.models import Tag
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_user(**params):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(**params)  # pyright: ignore
+
+
+def create_recipes(user, count, tags_per_recipe=3, ingredients_per_recipe=3):
+    """Create recipes with their own tags and ingredients."""
+    recipes = []
+    for _ in range(count):
+        recipe = Recipe.objects.create(
+            user=user,
+            title="Sample recipe",
+            time_minutes=10,
+            price=Decimal("5.00"),
+        )
+        recipe.tags.add(
+            *[
+                Tag.objects.create(user=user, name=f"Tag {recipe.pk}-{j}")
+                for j in range(tags_per_recipe)
+            ]
+        )
+        recipe.ingredients.add(
+            *[
+                Ingredient.objects.create(
+                    user=user,
+                    name=f"Ingredient {recipe.pk}-{j}",
+                )
+                for j in range(ingredients_per_recipe)
+            ]
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+class RecipeQueryCountTests(TestCase):
+    """Test the recipe APIs run a constant number of queries."""
+
+    def setUp(self):
+        self.user = create_user(
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_query_count_is_constant(self):
+        """Test listing recipes does not query once per recipe."""
+        create_recipes(self.user, 2)
+        # The recipes and their two relations.
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data["results"]), 2)  # pyright: ignore
+
+        create_recipes(self.user, 10, tags_per_recipe=5)
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data["results"]), 12)  # pyright: ignore
+
+    def test_filtered_list_query_count_is_constant(self):
+        """Test filtering recipes does not query once per recipe."""
+        recipes = create_recipes(self.user, 5)
+        tag_ids = [
+            str(recipe.tags.first().id)  # pyright: ignore
+            for recipe in recipes
+        ]
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL, {"tags": ",".join(tag_ids)})
+        self.assertEqual(len(res.data["results"]), 5)  # pyright: ignore
+
+    def test_filtered_list_does_not_use_distinct(self):
+        """Test filtering recipes uses one subquery instead of DISTINCT."""
+        recipe = create_recipes(self.user, 1)[0]
+        tag_ids = ",".join(str(t.id) for t in recipe.tags.all())
+        ingredient_ids = ",".join(
+            str(i.id) for i in recipe.ingredients.all()
+        )
+        params = {"tags": tag_ids, "ingredients": ingredient_ids}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(len(res.data["results"]), 1)  # pyright: ignore
+        query = ctx.captured_queries[0]["sql"]
+        self.assertNotIn("DISTINCT", query)
+        self.assertEqual(query.count("IN (SELECT"), 2)
+
+    def test_detail_query_count_is_constant(self):
+        """Test retrieving a recipe does not query once per relation."""
+        recipe = create_recipes(self.user, 1, 10, 20)[0]
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))  # pyright: ignore
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["tags"]), 10)  # pyright: ignore
+        self.assertEqual(len(res.data["ingredients"]), 20)  # pyright: ignore
+
+    def test_create_with_many_ingredients_query_count(self):
+        """Test creating a recipe resolves ingredients in batches."""
+        Ingredient.objects.create(user=self.user, name="Ingredient 0")
+        payload = {
+            "title": "Big Stew",
+            "time_minutes": 90,
+            "price": Decimal("12.00"),
+            "ingredients": [{"name": f"Ingredient {i}"} for i in range(30)],
+        }
+        # Recipe insert, ingredient lookup, bulk insert, existing link
+        # lookup (run by Django when m2m_changed has receivers), link
+        # insert, two savepoints with their releases and the two relation
+        # loads of the response.
+        with self.assertNumQueries(11):
+            res = self.client.post(RECIPES_URL, data=payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])  # pyright: ignore
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(),
+            30,
+        )
+
+    def test_update_only_changes_modified_links(self):
+        """Test updating tags only removes and adds changed links."""
+        recipe = create_recipes(self.user, 1, tags_per_recipe=3)[0]
+        kept = list(recipe.tags.order_by("id")[:2])
+        payload = {
+            "tags": [{"name": tag.name} for tag in kept] + [{"name": "New"}]
+        }
+        res = self.client.patch(
+            detail_url(recipe.id),  # pyright: ignore
+            data=payload,
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)),
+            sorted([tag.name for tag in kept] + ["New"]),
+        )
+        self.assertEqual(
+            Recipe.tags.through.objects.filter(
+                recipe=recipe,
+                tag__in=kept,
+            ).count(),
+            2,
+        )
@@ -0,0 +1,169 @@
+"""
+Tests for full-text recipe search.
+"""
+
+from decimal import Decimal
+
+from core.models import Ingredient
+from core.models import Recipe
+from core.models import Tag
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+RECIPES_URL = reverse("recipe:recipe-list")
+BULK_URL = reverse("recipe:recipe-bulk")
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 22,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(**params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSearchTests(TestCase):
+    """Test searching recipes."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _search(self, text, **params):
+        """Search recipes and return the IDs found, in order."""
+        res = self.client.get(RECIPES_URL, {"search": text, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [r["id"] for r in res.data["results"]]  # pyright: ignore
+
+    def test_search_fields(self):
+        """Test titles, descriptions, tags and ingredients are searched."""
+        by_title = create_recipe(user=self.user, title="Lemon cake")
+        by_description = create_recipe(
+            user=self.user,
+            description="A fresh lemon dressing.",
+        )
+        by_tag = create_recipe(user=self.user)
+        by_tag.tags.add(Tag.objects.create(user=self.user, name="Lemon"))
+        by_ingredient = create_recipe(user=self.user)
+        by_ingredient.ingredients.add(
+            Ingredient.objects.create(user=self.user, name="Lemons"),
+        )
+        create_recipe(user=self.user, title="Steak")
+        other_user = get_user_model().objects.create_user(  # pyright: ignore
+            email="other@example.com",
+            password="testpass123",
+        )
+        create_recipe(user=other_user, title="Lemon tart")
+
+        found = self._search("lemon")
+
+        self.assertEqual(
+            sorted(found),
+            sorted(
+                recipe.id  # pyright: ignore
+                for recipe in [by_title, by_description, by_tag, by_ingredient]
+            ),
+        )
+
+    def test_search_ranks_title_first(self):
+        """Test title matches rank above description matches."""
+        by_description = create_recipe(
+            user=self.user,
+            description="Served with baked potatoes.",
+        )
+        by_title = create_recipe(user=self.user, title="Baked potatoes")
+
+        found = self._search("baking potato")
+
+        self.assertEqual(
+            found,
+            [by_title.id, by_description.id],  # pyright: ignore
+        )
+
+    def test_search_paginated_by_rank(self):
+        """Test search results are paged in rank order."""
+        recipes = [
+            create_recipe(user=self.user, title="Soup", description=""),
+            create_recipe(user=self.user, description="Soup"),
+            create_recipe(user=self.user, title="Soup", description="Soup"),
+        ]
+
+        found = []
+        url = f"{RECIPES_URL}?search=soup&page_size=1"
+        for _page in recipes:
+            data = self.client.get(url).data  # pyright: ignore
+            found.extend(r["id"] for r in data["results"])
+            url = data["next"]
+
+        self.assertIsNone(url)
+        self.assertEqual(
+            found,
+            [recipes[2].id, recipes[0].id, recipes[1].id],  # pyright: ignore
+        )
+
+    def test_search_follows_updates(self):
+        """Test the search index follows edits, links and renames."""
+        recipe = create_recipe(user=self.user, title="Curry")
+        tag = Tag.objects.create(user=self.user, name="Spicy")
+        recipe_id = recipe.id  # pyright: ignore
+
+        self.client.patch(
+            detail_url(recipe_id),
+            {"tags": [{"name": "Spicy"}]},
+            format="json",
+        )
+        self.assertEqual(self._search("spicy"), [recipe_id])
+
+        self.client.patch(
+            reverse("recipe:tag-detail", args=[tag.id]),  # pyright: ignore
+            {"name": "Mild"},
+        )
+        self.assertEqual(self._search("spicy"), [])
+        self.assertEqual(self._search("mild"), [recipe_id])
+
+        self.client.patch(detail_url(recipe_id), {"tags": []}, format="json")
+        self.assertEqual(self._search("mild"), [])
+
+        self.client.patch(detail_url(recipe_id), {"title": "Stew"})
+        self.assertEqual(self._search("curry"), [])
+        self.assertEqual(self._search("stew"), [recipe_id])
+
+    def test_search_bulk_created(self):
+        """Test recipes written by the batch endpoint are searchable."""
+        res = self.client.post(
+            BULK_URL,
+            {
+                "operations": [
+                    {
+                        "op": "create",
+                        "data": {
+                            "title": "Pancakes",
+                            "time_minutes": 5,
+                            "price": "1.00",
+                            "ingredients": [{"name": "Blueberries"}],
+                        },
+                    }
+                ]
+            },
+            format="json",
+        )
+        recipe_id = res.data[0]["id"]  # pyright: ignore
+
+        self.assertEqual(self._search("blueberry"), [recipe_id])
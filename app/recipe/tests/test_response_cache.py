@@ -0,0 +1,256 @@
+"""
+Tests for the per-user response cache of the recipe APIs.
+"""
+
+import os
+import subprocess
+import sys
+from decimal import Decimal
+
+from core.models import Recipe
+from core.models import Tag
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
+from recipe.cache import reset_stats
+from recipe.checks import check_response_cache
+from rest_framework import status
+from rest_framework.test import APIClient
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+BULK_URL = reverse("recipe:recipe-bulk")
+CACHE_STATS_URL = reverse("recipe:cache-stats")
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 22,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(**params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(**params):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(**params)  # pyright: ignore
+
+
+class ResponseCacheTests(TestCase):
+    """Test caching of recipe API responses."""
+
+    def setUp(self):
+        cache.clear()
+        reset_stats()
+        self.user = create_user(
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_repeated_list_served_from_cache(self):
+        """Test listing twice only queries the database once."""
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPES_URL)
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached["X-Cache"], "HIT")
+        self.assertEqual(
+            cached.data,  # pyright: ignore
+            res.data,  # pyright: ignore
+        )
+
+    def test_query_parameters_cached_separately(self):
+        """Test different filters do not share a cache entry."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        create_recipe(user=self.user)
+
+        self.client.get(RECIPES_URL)
+        res = self.client.get(
+            RECIPES_URL,
+            {"tags": str(tag.id)},  # pyright: ignore
+        )
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.data["results"]), 1)  # pyright: ignore
+
+    def test_write_invalidates_cache(self):
+        """Test writing through the API invalidates list and detail."""
+        recipe = create_recipe(user=self.user, title="Old title")
+        url = detail_url(recipe.id)  # pyright: ignore
+        self.client.get(RECIPES_URL)
+        self.client.get(url)
+
+        self.client.patch(url, {"title": "New title"})
+
+        res = self.client.get(url)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["title"], "New title")  # pyright: ignore
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(
+            res.data["results"][0]["title"],  # pyright: ignore
+            "New title",
+        )
+
+    def test_tag_change_invalidates_recipes(self):
+        """Test renaming a tag invalidates the cached recipes."""
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        self.client.get(RECIPES_URL)
+
+        self.client.patch(
+            reverse("recipe:tag-detail", args=[tag.id]),  # pyright: ignore
+            {"name": "Dinner"},
+        )
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(
+            res.data["results"][0]["tags"][0]["name"],  # pyright: ignore
+            "Dinner",
+        )
+
+    def test_bulk_write_invalidates_cache(self):
+        """Test the batch endpoint invalidates the cache."""
+        self.client.get(RECIPES_URL)
+
+        self.client.post(
+            BULK_URL,
+            {
+                "operations": [
+                    {
+                        "op": "create",
+                        "data": {
+                            "title": "Bulk",
+                            "time_minutes": 5,
+                            "price": "1.00",
+                        },
+                    }
+                ]
+            },
+            format="json",
+        )
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data["results"]), 1)  # pyright: ignore
+
+    def test_cache_is_per_user(self):
+        """Test users never see each other's cached responses."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other_user = create_user(
+            email="other@example.com",
+            password="testpass123",
+        )
+        client = APIClient()
+        client.force_authenticate(user=other_user)
+
+        res = client.get(RECIPES_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"], [])  # pyright: ignore
+
+    def test_tags_list_cached(self):
+        """Test the tag list is cached."""
+        Tag.objects.create(user=self.user, name="Vegan")
+        self.client.get(TAGS_URL)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res["X-Cache"], "HIT")
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_cache_disabled(self):
+        """Test responses are not cached when disabled."""
+        self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL)
+        self.assertNotIn("X-Cache", res)
+
+    def test_cache_stats(self):
+        """Test hit and miss counters are exposed to staff."""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = get_user_model().objects.create_superuser(  # pyright: ignore
+            email="admin@example.com",
+            password="testpass123",
+        )
+        self.client.force_authenticate(user=admin)
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data,  # pyright: ignore
+            {"hits": 1, "misses": 1},
+        )
+
+    def test_write_in_other_process_invalidates_cache(self):
+        """Test a write handled by another worker invalidates the cache."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        default = settings.CACHES["default"]
+        env = dict(
+            os.environ,
+            CACHE_BACKEND=default["BACKEND"],
+            CACHE_LOCATION=default["LOCATION"],
+        )
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import django; django.setup(); "
+                "from recipe.cache import bump_user_version; "
+                f"bump_user_version({self.user.pk})",
+            ],
+            env=env,
+            check=True,
+        )
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+
+
+class ResponseCacheCheckTests(TestCase):
+    """Test the response cache needs a cache shared by all processes."""
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_local_cache_refused(self):
+        """Test the response cache is refused on a per-process cache."""
+        errors = check_response_cache(None)
+
+        self.assertEqual([error.id for error in errors], ["recipe.E001"])
+
+    @override_settings(CACHES=LOCMEM_CACHES, RESPONSE_CACHE_ENABLED=False)
+    def test_local_cache_without_response_cache(self):
+        """Test a per-process cache is accepted with the cache disabled."""
+        self.assertEqual(check_response_cache(None), [])
+
+    def test_shared_cache_accepted(self):
+        """Test the default file cache is accepted."""
+        self.assertEqual(check_response_cache(None), [])
@@ -0,0 +1,227 @@
+"""
+Tests for the delta sync API.
+"""
+
+import threading
+from decimal import Decimal
+
+from core.models import Ingredient
+from core.models import Recipe
+from core.models import Tag
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import connection
+from django.db import transaction
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+from recipe import sync
+from rest_framework import status
+from rest_framework.test import APIClient
+
+SYNC_URL = reverse("recipe:sync")
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 22,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(**params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(**params):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(**params)  # pyright: ignore
+
+
+class PublicSyncApiTests(TestCase):
+    """Test unauthenticated API requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to sync."""
+        res = APIClient().get(SYNC_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTests(TransactionTestCase):
+    """Test authenticated API requests.
+
+    Changes are only synced once their transaction has ended, so these
+    tests commit their writes.
+    """
+
+    def setUp(self):
+        self.user = create_user(
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _sync(self, token=None):
+        """Sync and return the response data."""
+        params = {"token": token} if token else {}
+        res = self.client.get(SYNC_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data  # pyright: ignore
+
+    def test_initial_sync_returns_everything(self):
+        """Test syncing without a token returns all of the user's data."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe.tags.add(tag)
+        Ingredient.objects.create(user=self.user, name="Salt")
+        create_recipe(user=create_user(email="other@example.com"))
+
+        data = self._sync()
+
+        self.assertEqual([r["id"] for r in data["recipes"]], [recipe.id])
+        self.assertEqual(data["recipes"][0]["tags"][0]["name"], "Vegan")
+        self.assertEqual(
+            data["tags"],
+            [{"id": tag.id, "name": "Vegan", "recipe_count": 1}],
+        )
+        self.assertEqual(len(data["ingredients"]), 1)
+        self.assertEqual(
+            data["deleted"],
+            {"recipes": [], "tags": [], "ingredients": []},
+        )
+        self.assertFalse(data["has_more"])
+
+    def test_sync_without_changes(self):
+        """Test a sync without changes returns nothing, in five queries."""
+        create_recipe(user=self.user)
+        token = self._sync()["token"]
+
+        with self.assertNumQueries(5):
+            data = self._sync(token)
+
+        self.assertEqual(data["recipes"], [])
+        self.assertEqual(data["tags"], [])
+        self.assertEqual(data["ingredients"], [])
+
+    def test_sync_returns_changes_only(self):
+        """Test only objects changed since the token are returned."""
+        recipe = create_recipe(user=self.user, title="Old title")
+        create_recipe(user=self.user)
+        token = self._sync()["token"]
+
+        self.client.patch(
+            reverse("recipe:recipe-detail", args=[recipe.id]),
+            {"title": "New title", "tags": [{"name": "Dinner"}]},
+            format="json",
+        )
+        data = self._sync(token)
+
+        self.assertEqual(len(data["recipes"]), 1)
+        self.assertEqual(data["recipes"][0]["title"], "New title")
+        self.assertEqual([t["name"] for t in data["tags"]], ["Dinner"])
+
+    def test_sync_reports_deletions(self):
+        """Test deleted objects are reported by ID."""
+        recipe = create_recipe(user=self.user)
+        kept = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        kept.tags.add(tag)
+        token = self._sync()["token"]
+
+        recipe_id = recipe.id
+        recipe.delete()
+        tag_id = tag.id
+        tag.delete()
+        data = self._sync(token)
+
+        self.assertEqual(data["deleted"]["recipes"], [recipe_id])
+        self.assertEqual(data["deleted"]["tags"], [tag_id])
+        self.assertEqual([r["id"] for r in data["recipes"]], [kept.id])
+        self.assertEqual(data["recipes"][0]["tags"], [])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_sync_pages(self):
+        """Test large changes are returned across several pages."""
+        recipes = [create_recipe(user=self.user) for _i in range(5)]
+
+        seen = []
+        data = {"token": None, "has_more": True}
+        while data["has_more"]:
+            data = self._sync(data["token"])
+            seen.extend(r["id"] for r in data["recipes"])
+
+        self.assertEqual(sorted(seen), [r.id for r in recipes])
+
+    def test_late_commit_not_skipped(self):
+        """Test a transaction committing after newer ones is not skipped.
+
+        The first recipe is written by a transaction that started first
+        but commits last, as long imports and batch writes do.
+        """
+        written = threading.Event()
+        commit = threading.Event()
+
+        def write_slowly():
+            try:
+                with transaction.atomic():
+                    create_recipe(user=self.user, title="Slow")
+                    written.set()
+                    commit.wait(10)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=write_slowly)
+        writer.start()
+        written.wait(10)
+        create_recipe(user=self.user, title="Fast")
+
+        data = self._sync()
+        commit.set()
+        writer.join()
+        self.assertEqual(data["recipes"], [])
+
+        data = self._sync(data["token"])
+        self.assertEqual(
+            sorted(r["title"] for r in data["recipes"]),
+            ["Fast", "Slow"],
+        )
+
+    def test_invalid_token(self):
+        """Test a tampered token is rejected."""
+        res = self.client.get(SYNC_URL, {"token": "not-a-token"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_token(self):
+        """Test a token issued to another user is rejected."""
+        token = self._sync()["token"]
+        other_user = create_user(email="other@example.com")
+        self.client.force_authenticate(user=other_user)
+
+        res = self.client.get(SYNC_URL, {"token": token})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_token(self):
+        """Test a token older than the tombstone retention is refused."""
+        token = self._sync()["token"]
+
+        with self.settings(TOMBSTONE_RETENTION_DAYS=0):
+            res = self.client.get(SYNC_URL, {"token": token})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_token_without_issue_time(self):
+        """Test a token from before the issue time was recorded expires."""
+        token = signing.dumps(
+            {
+                "u": self.user.pk,
+                "c": {kind: [0, 0] for kind in sync.KINDS},
+            },
+            salt=sync.SALT,
+        )
+
+        res = self.client.get(SYNC_URL, {"token": token})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
@@ -9,11 +9,12 @@ from core.models import Tag
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
-from recipe.serializers import TagSerializer
+from recipe.serializers import TagDetailSerializer
 from rest_framework import status
 from rest_framework.test import APIClient
 
 TAGS_URL = reverse("recipe:tag-list")
+AUTOCOMPLETE_URL = reverse("recipe:tag-autocomplete")
 
 
 def detail_url(tag_id):
@@ -58,9 +59,9 @@ class PrivateTagsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
         tags = Tag.objects.all().order_by("-name")
-        serializer = TagSerializer(tags, many=True)
+        serializer = TagDetailSerializer(tags, many=True)
         self.assertEqual(
-            res.data,  # pyright: ignore
+            res.data["results"],  # pyright: ignore
             serializer.data,
         )
 
@@ -73,7 +74,7 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        res_data = res.data  # pyright: ignore
+        res_data = res.data["results"]  # pyright: ignore
         self.assertEqual(len(res_data), 1)
         self.assertEqual(res_data[0]["name"], tag.name)
         self.assertEqual(
@@ -93,6 +94,18 @@ class PrivateTagsApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload["name"])
 
+    def test_update_tag_to_existing_name_error(self):
+        """Test renaming a tag to another tag's name fails."""
+        Tag.objects.create(user=self.user, name="Dessert")
+        tag = Tag.objects.create(user=self.user, name="After Dinner")
+        url = detail_url(tag.id)  # pyright: ignore
+
+        res = self.client.patch(url, data={"name": "Dessert"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, "After Dinner")
+
     def test_delete_tag(self):
         """Test deleting a tag."""
         tag = Tag.objects.create(user=self.user, name="Breakfast")
@@ -117,10 +130,11 @@ class PrivateTagsApiTests(TestCase):
         )
         recipe.tags.add(tag1)
 
+        tag1.refresh_from_db()
         res = self.client.get(TAGS_URL, {"assigned_only": 1})
-        s1 = TagSerializer(tag1)
-        s2 = TagSerializer(tag2)
-        res_data = res.data  # pyright: ignore
+        s1 = TagDetailSerializer(tag1)
+        s2 = TagDetailSerializer(tag2)
+        res_data = res.data["results"]  # pyright: ignore
         self.assertIn(s1.data, res_data)
         self.assertNotIn(s2.data, res_data)
 
@@ -146,6 +160,78 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {"assigned_only": 1})
         self.assertEqual(
-            len(res.data),  # pyright: ignore
+            len(res.data["results"]),  # pyright: ignore
             1,
         )
+
+    def test_recipe_count_follows_links(self):
+        """Test the recipe count follows linking, unlinking and deletes."""
+        tag = Tag.objects.create(user=self.user, name="Breakfast")
+        recipes = [
+            Recipe.objects.create(
+                user=self.user,
+                title="Pancakes",
+                time_minutes=5,
+                price=Decimal("5.00"),
+            )
+            for _i in range(3)
+        ]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+        recipes[0].tags.remove(tag)
+        recipes[1].delete()
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+    def test_order_tags_by_popularity_across_pages(self):
+        """Test cursors page through tags with the same recipe count."""
+        names = [f"Tag {i}" for i in range(5)]
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+
+        found = []
+        url = f"{TAGS_URL}?ordering=recipe_count&page_size=2"
+        while url:
+            data = self.client.get(url).data  # pyright: ignore
+            found.extend(t["name"] for t in data["results"])
+            url = data["next"]
+
+        self.assertEqual(found, names)
+
+    def test_order_tags_by_popularity(self):
+        """Test tags are listed most used first, then by name."""
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Lunch")
+        tag3 = Tag.objects.create(user=self.user, name="Dinner")
+        for _i in range(2):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title="Soup",
+                time_minutes=10,
+                price=Decimal("3.00"),
+            )
+            recipe.tags.add(tag2)
+        recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {"ordering": "-recipe_count"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [t["id"] for t in res.data["results"]],  # pyright: ignore
+            [tag2.id, tag1.id, tag3.id],  # pyright: ignore
+        )
+
+    def test_autocomplete_tags(self):
+        """Test tags are looked up by partial name."""
+        Tag.objects.create(user=self.user, name="Vegetarian")
+        Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="Dessert")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "veg"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag["name"] for tag in res.data],  # pyright: ignore
+            ["Vegan", "Vegetarian"],
+        )
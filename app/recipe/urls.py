@@ -2,12 +2,12 @@
 URL mappings for the recipe app.
 """
 
+from core.asgi import AsyncActionRouter
 from django.urls import include
 from django.urls import path
 from recipe import views
-from rest_framework.routers import DefaultRouter
 
-router = DefaultRouter()
+router = AsyncActionRouter()
 router.register("recipes", views.RecipeViewSet)
 router.register("tags", views.TagViewSet)
 router.register("ingredients", views.IngredientViewSet)
@@ -15,5 +15,7 @@ router.register("ingredients", views.IngredientViewSet)
 app_name = "recipe"
 
 urlpatterns = [
+    path("cache-stats/", views.cache_stats, name="cache-stats"),
+    path("sync/", views.sync, name="sync"),
     path("", include(router.urls)),
 ]
@@ -2,21 +2,108 @@
 Views for the recipe APIs.
 """
 
+from contextlib import ExitStack
+
+from core.middleware import TimedSerializationMixin
 from core.models import Ingredient
 from core.models import Recipe
 from core.models import Tag
+from core.queries import query_budgets
+from core.routers import is_pinned
+from core.routers import pin_to_primary
+from core.routers import read_from_replicas
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import transaction
+from django.db.models import BooleanField
+from django.db.models import Count
+from django.db.models import ExpressionWrapper
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models import Prefetch
+from django.db.models import Q
+from django.db.models.functions import Cast
+from django.db.models.functions import Upper
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import OpenApiParameter
 from drf_spectacular.utils import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 from drf_spectacular.utils import extend_schema_view
 from recipe import serializers
+from recipe.bulk import RecipeBulkWriter
+from recipe.cache import cached_response
+from recipe.cache import get_stats
+from recipe.conditional import conditional_response
+from recipe.export import buffered
+from recipe.export import iter_csv
+from recipe.export import iter_ndjson
+from recipe.export import iter_recipes
+from recipe.images import delete_derivatives
+from recipe.images import enqueue_derivatives
+from recipe.pagination import RecipeAttrCursorPagination
+from recipe.pagination import RecipeCursorPagination
+from recipe.sync import get_changes
 from rest_framework import mixins
 from rest_framework import status
 from rest_framework import viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.decorators import api_view
+from rest_framework.decorators import authentication_classes
+from rest_framework.decorators import permission_classes
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.permissions import IsAdminUser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from user.authentication import CachedTokenAuthentication
+
+# Text search configuration of the recipe search vectors, which are built
+# by the triggers of migration core.0011.
+SEARCH_CONFIG = "english"
+
+# Query parameters of the recipe range filters and their lookups.
+RANGE_FILTERS = {
+    "time_minutes_min": "time_minutes__gte",
+    "time_minutes_max": "time_minutes__lte",
+    "price_min": "price__gte",
+    "price_max": "price__lte",
+}
+
+
+class ReplicaReadMixin:
+    """Read list and retrieve requests from the read replicas.
+
+    Any other request by a user pins their reads to the primary for
+    REPLICA_PIN_SECONDS, so they always see their own changes.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        """Enable replica reads for safe requests of unpinned users."""
+        super().initial(request, *args, **kwargs)  # pyright: ignore
+        self._replica_reads = ExitStack()
+        if (
+            settings.DATABASE_REPLICAS
+            and self.action in self.replica_actions  # pyright: ignore
+            and request.method in SAFE_METHODS
+            and not is_pinned(request.user)
+        ):
+            self._replica_reads.enter_context(read_from_replicas())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Stop replica reads, and pin the user after a write."""
+        if hasattr(self, "_replica_reads"):
+            self._replica_reads.close()
+        if request.method not in SAFE_METHODS:
+            pin_to_primary(request.user)
+        return super().finalize_response(  # pyright: ignore
+            request,
+            response,
+            *args,
+            **kwargs,
+        )
 
 
 @extend_schema_view(
@@ -32,21 +119,88 @@ from rest_framework.response import Response
                 OpenApiTypes.STR,
                 description="Comma separated list of ingredient IDs to filter",
             ),
+            OpenApiParameter(
+                "tags_mode",
+                OpenApiTypes.STR,
+                enum=["any", "all"],
+                description="Match recipes with any or all of the tags",
+            ),
+            OpenApiParameter(
+                "ingredients_mode",
+                OpenApiTypes.STR,
+                enum=["any", "all"],
+                description="Match recipes with any or all of the ingredients",
+            ),
+            OpenApiParameter(
+                "search",
+                OpenApiTypes.STR,
+                description=(
+                    "Search titles, descriptions, tags and ingredients, "
+                    "best matches first"
+                ),
+            ),
+            serializers.RecipeFilterSerializer,
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    TimedSerializationMixin,
+    ReplicaReadMixin,
+    viewsets.ModelViewSet,
+):
     """View for manage recipe APIs."""
 
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    # Queries each action may run, whatever the number of recipes, tags
+    # and ingredients, counting the token lookup of a token missing from
+    # the cache. Bulk requests run a set number per chunk, and exports run
+    # theirs while streaming.
+    query_budgets = {
+        "list": 4,
+        "retrieve": 4,
+        "create": 12,
+        "update": 12,
+        "partial_update": 12,
+        "destroy": 7,
+        "upload_image": 4,
+    }
+    # Actions served by async views under ASGI, as they wait on uploads,
+    # storage and long exports.
+    async_actions = ("upload_image", "export")
+
+    @cached_response
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        """List recipes, from the cache when possible."""
+        return super().list(request, *args, **kwargs)
+
+    @cached_response
+    @conditional_response
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a recipe, from the cache when possible."""
+        return super().retrieve(request, *args, **kwargs)
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers."""
         return [int(str_id) for str_id in qs.split(",")]
 
+    def _linked_recipes(self, through, column, ids, mode):
+        """Return the IDs of the recipes linked to the given IDs.
+
+        One IN list per relation; in "all" mode, the recipes are those
+        with a link to each of the IDs. Both are read from the link
+        table's (<column>, recipe_id) index alone.
+        """
+        links = through.objects.filter(**{f"{column}__in": ids})
+        if mode == "all":
+            links = links.values("recipe_id").annotate(links=Count("*"))
+            links = links.filter(links=len(set(ids)))
+        return links.values("recipe_id")
+
     def get_queryset(self):
         """Retrieve recipes for authenticated user."""
         qp = self.request.query_params  # pyright: ignore
@@ -54,16 +208,88 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ingredients = qp.get("ingredients")
         queryset = self.queryset
 
+        # Semi-joins never duplicate recipe rows, so no DISTINCT is
+        # needed. Combined filters are nested in a single subquery, so
+        # the links are matched with each other before the recipes.
+        linked = None
         if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            linked = self._linked_recipes(
+                Recipe.tags.through,
+                "tag_id",
+                self._params_to_ints(tags),
+                qp.get("tags_mode"),
+            )
 
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            ingredient_links = self._linked_recipes(
+                Recipe.ingredients.through,
+                "ingredient_id",
+                self._params_to_ints(ingredients),
+                qp.get("ingredients_mode"),
+            )
+            if linked is None:
+                linked = ingredient_links
+            else:
+                linked = linked.filter(recipe_id__in=ingredient_links)
+
+        if linked is not None:
+            queryset = queryset.filter(pk__in=linked)
+
+        filters = self._get_filters()
+        for param, lookup in RANGE_FILTERS.items():
+            if param in filters:
+                queryset = queryset.filter(**{lookup: filters[param]})
+
+        queryset = queryset.filter(user=self.request.user)
+        queryset = self._with_related(queryset)
+
+        search = qp.get("search")
+        if search:
+            query = SearchQuery(
+                search,
+                config=SEARCH_CONFIG,
+                search_type="websearch",
+            )
+            queryset = queryset.filter(search_vector=query).annotate(
+                # ts_rank() returns a real, which does not survive the
+                # round trip through a pagination cursor exactly.
+                rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+            )
+        return queryset.order_by(*self.get_ordering())
+
+    def _get_filters(self):
+        """Return the validated range and ordering parameters."""
+        if not hasattr(self, "_filters"):
+            params = serializers.RecipeFilterSerializer(
+                data=self.request.query_params,  # pyright: ignore
+            )
+            params.is_valid(raise_exception=True)
+            self._filters = params.validated_data
+        return self._filters
+
+    def get_ordering(self):
+        """Return the ordering of the recipes.
 
-        return (
-            queryset.filter(user=self.request.user).order_by("-id").distinct()
+        Every ordering ends with the ID, so the (user, time_minutes, id)
+        and (user, price, id) indexes return pages already sorted.
+        """
+        ordering = self._get_filters().get("ordering")
+        if ordering:
+            return serializers.RecipeFilterSerializer.ORDERINGS[ordering]
+        if self.request.query_params.get("search"):  # pyright: ignore
+            return ("-rank", "-id")
+        return ("-id",)
+
+    def _with_related(self, queryset):
+        """Load the relations rendered by the serializer for this action."""
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        return queryset.select_related("user").prefetch_related(
+            Prefetch("tags", queryset=Tag.objects.only("id", "name")),
+            Prefetch(
+                "ingredients",
+                queryset=Ingredient.objects.only("id", "name"),
+            ),
         )
 
     def get_serializer_class(self):
@@ -72,6 +298,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == "upload_image":
             return serializers.RecipeImageSerializer
+        elif self.action == "bulk":
+            return serializers.RecipeBulkSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
@@ -88,10 +316,82 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            old_derivatives = recipe.image_derivatives
+            with transaction.atomic():
+                serializer.save(image_derivatives={})
+                enqueue_derivatives(recipe)
+                transaction.on_commit(
+                    lambda: delete_derivatives(old_derivatives)
+                )
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        responses={
+            200: serializers.RecipeBulkResultSerializer(many=True),
+            400: serializers.RecipeBulkResultSerializer(many=True),
+        }
+    )
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    def bulk(self, request):
+        """Create, update and delete recipes in one request."""
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        writer = RecipeBulkWriter(request)
+        atomic = serializer.validated_data["atomic"]
+        results, success = writer.run(
+            serializer.validated_data["operations"],
+            atomic=atomic,
+        )
+        if atomic and not success:
+            return Response(results, status=status.HTTP_400_BAD_REQUEST)
+        return Response(results, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "export_format",
+                OpenApiTypes.STR,
+                enum=["ndjson", "csv"],
+                description="Output format, NDJSON by default",
+            ),
+        ],
+        responses={(200, "application/x-ndjson"): OpenApiTypes.STR},
+    )
+    @action(methods=["GET"], detail=False, url_path="export")
+    def export(self, request):
+        """Stream the filtered recipes as NDJSON or CSV."""
+        export_format = request.query_params.get("export_format", "ndjson")
+        if export_format not in ("ndjson", "csv"):
+            return Response(
+                {"export_format": ["Must be 'ndjson' or 'csv'."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        recipes = iter_recipes(
+            self.get_queryset(),
+            self.get_ordering(),
+            settings.EXPORT_CHUNK_SIZE,
+        )
+        context = self.get_serializer_context()
+        if export_format == "csv":
+            response = StreamingHttpResponse(
+                buffered(iter_csv(recipes, context)),
+                content_type="text/csv",
+            )
+            filename = "recipes.csv"
+        else:
+            response = StreamingHttpResponse(
+                buffered(iter_ndjson(recipes, context)),
+                content_type="application/x-ndjson",
+            )
+            filename = "recipes.ndjson"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -102,10 +402,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 enum=[0, 1],
                 description="Filter by items assigned to recipes",
             ),
+            serializers.RecipeAttrFilterSerializer,
         ]
     )
 )
 class BaseRecipeAttrViewSet(
+    TimedSerializationMixin,
+    ReplicaReadMixin,
     mixins.DestroyModelMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
@@ -113,8 +416,80 @@ class BaseRecipeAttrViewSet(
 ):
     """Base viewset for recipe attributes."""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
+    query_budgets = {
+        "list": 2,
+        "autocomplete": 2,
+        "update": 6,
+        "partial_update": 6,
+        "destroy": 6,
+    }
+
+    @cached_response
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        """List items, from the cache when possible."""
+        return super().list(request, *args, **kwargs)
+
+    def get_ordering(self):
+        """Return the ordering of the items, by name by default."""
+        params = serializers.RecipeAttrFilterSerializer(
+            data=self.request.query_params,  # pyright: ignore
+        )
+        params.is_valid(raise_exception=True)
+        ordering = params.validated_data.get("ordering", "-name")
+        return serializers.RecipeAttrFilterSerializer.ORDERINGS[ordering]
+
+    @extend_schema(parameters=[serializers.RecipeAttrAutocompleteSerializer])
+    @action(methods=["GET"], detail=False)
+    def autocomplete(self, request):
+        """Return the items best matching a partial name.
+
+        Items whose name starts with the text come first, then items
+        containing it or similar to it, by similarity and then by the
+        number of recipes using them. Texts shorter than
+        AUTOCOMPLETE_TRIGRAM_MIN_LENGTH only match name prefixes, by the
+        number of recipes using them.
+        """
+        params = serializers.RecipeAttrAutocompleteSerializer(
+            data=request.query_params,
+        )
+        params.is_valid(raise_exception=True)
+        text = params.validated_data["q"]
+        term = text.upper()
+        queryset = self.queryset.filter(  # pyright: ignore
+            user=request.user,
+        ).alias(upper_name=Upper("name"))
+        if len(text) < settings.AUTOCOMPLETE_TRIGRAM_MIN_LENGTH:
+            queryset = queryset.filter(upper_name__startswith=term).order_by(
+                "-recipe_count",
+                "name",
+            )
+        else:
+            queryset = (
+                queryset.filter(
+                    Q(upper_name__contains=term)
+                    | Q(upper_name__trigram_similar=term)
+                )
+                .annotate(
+                    is_prefix=ExpressionWrapper(
+                        Q(upper_name__startswith=term),
+                        output_field=BooleanField(),
+                    ),
+                    similarity=TrigramSimilarity("name", text),
+                )
+                .order_by(
+                    "-is_prefix",
+                    "-similarity",
+                    "-recipe_count",
+                    "name",
+                )
+            )
+        items = queryset[: params.validated_data["limit"]]
+        serializer = self.get_serializer(items, many=True)
+        return Response(serializer.data)
 
     def get_queryset(self):
         """Filter queryset to authenticated user."""
@@ -122,25 +497,68 @@ class BaseRecipeAttrViewSet(
         assigned_only = bool(int(qp.get("assigned_only", 0)))
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(  # pyright: ignore
-                recipe__isnull=False,
-            )
-        return (
-            queryset.filter(user=self.request.user)  # pyright: ignore
-            .order_by("-name")
-            .distinct()
-        )
+            queryset = queryset.filter(recipe_count__gt=0)  # pyright: ignore
+        return queryset.filter(  # pyright: ignore
+            user=self.request.user,
+        ).order_by(*self.get_ordering())
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database."""
 
-    serializer_class = serializers.TagSerializer
+    serializer_class = serializers.TagDetailSerializer
     queryset = Tag.objects.all()
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database."""
 
-    serializer_class = serializers.IngredientSerializer
+    serializer_class = serializers.IngredientDetailSerializer
     queryset = Ingredient.objects.all()
+
+
+@extend_schema(
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "hits": {"type": "integer"},
+                "misses": {"type": "integer"},
+            },
+        }
+    }
+)
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAdminUser])
+def cache_stats(request):  # pyright: ignore
+    """Return the response cache hit and miss counters."""
+    return Response(get_stats())
+
+
+@query_budgets(get=8)
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            "token",
+            OpenApiTypes.STR,
+            description="Sync token of the previous response, if any",
+        ),
+    ],
+    responses=serializers.RecipeSyncSerializer,
+)
+@api_view(["GET"])
+@authentication_classes([CachedTokenAuthentication])
+@permission_classes([IsAuthenticated])
+def sync(request):
+    """Return recipes, tags and ingredients changed since a sync token.
+
+    Call again with the returned token while has_more is true, and later
+    to get the changes made in the meantime.
+    """
+    changes = get_changes(request.user, request.query_params.get("token"))
+    serializer = serializers.RecipeSyncSerializer(
+        changes,
+        context={"request": request},
+    )
+    return Response(serializer.data)
@@ -0,0 +1,140 @@
+"""
+Token authentication with cached token lookups.
+
+Tokens are found by the hash of their key, with their user, in a single
+query. CachedTokenAuthentication keeps each token found in a bounded LRU
+of each process, optionally backed by a shared Django cache, and checks
+its expiry on every request without querying the database. Each request
+gets its own copy of the token and its user, so changes a view makes to
+them never reach the cache. Entries are dropped when the token is
+deleted or its user is saved, which covers logout, rotation,
+deactivation and password changes. Other processes may keep their copy
+for up to TOKEN_CACHE_TTL seconds.
+
+QuerySet.update() sends no signals: code deactivating users in bulk
+must call forget_user_tokens() with their IDs, or the users stay signed
+in for up to TOKEN_CACHE_TTL seconds.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from core.models import AuthToken
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+KEY_PREFIX = "auth-token"
+
+
+def _copy(token):
+    """Return a copy of a token and of its user."""
+    token = copy.copy(token)
+    token.user = copy.copy(token.user)
+    return token
+
+
+class TokenCache:
+    """Bounded LRU of tokens whose entries expire after a TTL."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _shared(self):
+        """Return the shared cache backend, if any."""
+        alias = settings.TOKEN_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        """Return a copy of a cached token, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    return _copy(entry[0])
+                del self._entries[key]
+        shared = self._shared()
+        if shared is None:
+            return None
+        token = shared.get(f"{KEY_PREFIX}:{key}")
+        if token is not None:
+            self._store(key, token)
+        return token
+
+    def set(self, key, token):
+        """Cache a token."""
+        self._store(key, token)
+        shared = self._shared()
+        if shared is not None:
+            shared.set(
+                f"{KEY_PREFIX}:{key}",
+                token,
+                timeout=settings.TOKEN_CACHE_TTL,
+            )
+
+    def _store(self, key, token):
+        """Cache a copy of a token in this process."""
+        expires = time.monotonic() + settings.TOKEN_CACHE_TTL
+        token = _copy(token)
+        with self._lock:
+            self._entries[key] = (token, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Forget a token."""
+        with self._lock:
+            self._entries.pop(key, None)
+        shared = self._shared()
+        if shared is not None:
+            shared.delete(f"{KEY_PREFIX}:{key}")
+
+    def clear(self):
+        """Forget every token cached by this process."""
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def forget_user_tokens(user_ids):
+    """Drop the cached tokens of users, so they are loaded again."""
+    for key_hash in AuthToken.objects.filter(
+        user__in=user_ids,
+    ).values_list("key_hash", flat=True):
+        token_cache.delete(bytes(key_hash).hex())
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Expiring token authentication answered from the cache if possible."""
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        """Return the user and token of a key, if it has not expired."""
+        key_hash = AuthToken.hash_key(key)
+        token = token_cache.get(key_hash.hex())
+        if token is None:
+            try:
+                token = AuthToken.objects.select_related("user").get(
+                    key_hash=key_hash,
+                )
+            except AuthToken.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(
+                    _("User inactive or deleted.")
+                )
+            token_cache.set(key_hash.hex(), token)
+        if token.is_expired:
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        return token.user, token
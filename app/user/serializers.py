@@ -45,6 +45,12 @@ class AuthTokenSerializer(serializers.Serializer):
         style={"input_type": "password"},
         trim_whitespace=False,
     )
+    device = serializers.CharField(
+        max_length=255,
+        required=False,
+        default="",
+        help_text="Device name; a new token replaces the device's old one",
+    )
 
     def validate(self, attrs):
         """Validate and authenticate the user."""
@@ -60,3 +66,11 @@ class AuthTokenSerializer(serializers.Serializer):
             raise serializers.ValidationError(msg, code="authorization")
         attrs["user"] = user
         return attrs
+
+
+class TokenSerializer(serializers.Serializer):
+    """Serializer for a newly issued auth token."""
+
+    token = serializers.CharField()
+    device = serializers.CharField()
+    expires_at = serializers.DateTimeField()
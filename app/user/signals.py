@@ -0,0 +1,25 @@
+"""
+Signal handlers for the user app.
+"""
+
+from core.models import AuthToken
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from user.authentication import forget_user_tokens
+from user.authentication import token_cache
+
+
+@receiver(post_delete, sender=AuthToken)
+def forget_token(sender, instance, **kwargs):
+    """Stop accepting a deleted token, as on logout or rotation."""
+    token_cache.delete(bytes(instance.key_hash).hex())
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_tokens_of_user(sender, instance, created, **kwargs):
+    """Reload the tokens of a user after changes such as deactivation."""
+    if created:
+        return
+    forget_user_tokens([instance.pk])
@@ -0,0 +1,152 @@
+"""
+Tests for cached token authentication.
+"""
+
+from datetime import timedelta
+from unittest.mock import patch
+
+from core.models import AuthToken
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from user.authentication import forget_user_tokens
+from user.authentication import token_cache
+
+ME_URL = reverse("user:me")
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token lookups are cached and invalidated."""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(  # pyright: ignore
+            email="user@example.com",
+            password="testpass123",
+        )
+        self.token, key = AuthToken.objects.issue(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {key}")
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_token_lookup_cached(self):
+        """Test a token is looked up in the database once."""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)  # pyright: ignore
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops working at once."""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test the token of a deactivated user stops working at once."""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_rejected(self):
+        """Test an expired token is refused, even from the cache."""
+        self.client.get(ME_URL)
+
+        later = self.token.expires_at + timedelta(seconds=1)
+        with self.assertNumQueries(0):
+            with patch("core.models.timezone.now", return_value=later):
+                res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_deactivation_rejected(self):
+        """Test users deactivated in bulk are rejected once forgotten."""
+        self.client.get(ME_URL)
+
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False,
+        )
+        forget_user_tokens([self.user.pk])
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_token_copied(self):
+        """Test changes to a cached token or user stay in one request."""
+        self.client.get(ME_URL)
+        key = self.token.key_hash.hex()
+
+        token = token_cache.get(key)
+        token.user.name = "Changed"
+
+        self.assertNotEqual(token_cache.get(key).user.name, "Changed")
+
+    def test_password_change_reloads_user(self):
+        """Test a password change drops the cached user."""
+        self.client.get(ME_URL)
+
+        self.user.set_password("newpass123")
+        self.user.save()
+
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    @override_settings(TOKEN_CACHE_SIZE=1)
+    def test_cache_bounded(self):
+        """Test the least recently used token is evicted."""
+        other = get_user_model().objects.create_user(  # pyright: ignore
+            email="other@example.com",
+            password="testpass123",
+        )
+        other_token, other_key = AuthToken.objects.issue(other)
+        self.client.get(ME_URL)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {other_key}")
+        self.client.get(ME_URL)
+
+        self.assertIsNone(token_cache.get(self.token.key_hash.hex()))
+        self.assertEqual(
+            token_cache.get(other_token.key_hash.hex()).user,
+            other,
+        )
+
+    @override_settings(TOKEN_CACHE_TTL=0)
+    def test_cache_expires(self):
+        """Test cached tokens are looked up again after the TTL."""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    @override_settings(TOKEN_CACHE_ALIAS="default")
+    def test_shared_cache(self):
+        """Test other processes find the token in the shared cache."""
+        self.client.get(ME_URL)
+        token_cache.clear()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.token.delete()
+        token_cache.clear()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
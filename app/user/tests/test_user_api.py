@@ -2,15 +2,27 @@
 Tests for the user API.
 """
 
+import threading
+from unittest.mock import patch
+
+from core.models import LoginAttempts
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test import TransactionTestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from user.throttles import FailedLoginThrottle
+from user.tokens import issue_token
+from user.tokens import rotate_token
 
 CREATE_USER_URL = reverse("user:create")
 ME_URL = reverse("user:me")
 TOKEN_URL = reverse("user:token")
+ROTATE_TOKEN_URL = reverse("user:token-rotate")
+LOGIN_RATES = {"login": "2/min", "login_ip": "3/min"}
 
 
 def create_user(**params):
@@ -22,6 +34,7 @@ class PublicUserApiTests(TestCase):
     """Test the public features of the user API."""
 
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
 
     def test_create_user_success(self):
@@ -81,6 +94,54 @@ class PublicUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn("token", res.data)  # pyright: ignore
 
+    def test_create_token_per_device(self):
+        """Test a new token for a device replaces its old token."""
+        user = create_user(email="test@example.com", password="testpass123")
+        payload = {
+            "email": "test@example.com",
+            "password": "testpass123",
+            "device": "phone",
+        }
+
+        first = self.client.post(TOKEN_URL, data=payload).data
+        self.client.post(TOKEN_URL, data={**payload, "device": "laptop"})
+        second = self.client.post(TOKEN_URL, data=payload).data
+
+        self.assertNotEqual(first["token"], second["token"])  # pyright: ignore
+        self.assertIn("expires_at", second)  # pyright: ignore
+        self.assertEqual(
+            sorted(user.auth_tokens.values_list("device", flat=True)),
+            ["laptop", "phone"],
+        )
+
+    def test_rotate_token(self):
+        """Test rotating a token revokes it and returns a new one."""
+        create_user(email="test@example.com", password="testpass123")
+        payload = {"email": "test@example.com", "password": "testpass123"}
+        old = self.client.post(TOKEN_URL, data=payload).data["token"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {old}")
+
+        res = self.client.post(ROTATE_TOKEN_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        new = res.data["token"]  # pyright: ignore
+        self.assertEqual(
+            self.client.get(ME_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {new}")
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_rotate_token_once(self):
+        """Test a token already rotated is not rotated again."""
+        user = create_user(email="test@example.com", password="testpass123")
+        token, _key = issue_token(user, "phone")
+
+        self.assertIsNotNone(rotate_token(token))
+        self.assertIsNone(rotate_token(token))
+        self.assertEqual(user.auth_tokens.count(), 1)
+
     def test_create_token_bad_credentials(self):
         """Test returns error if credentials invalid."""
         create_user(email="test@example.com", password="goodpass")
@@ -96,6 +157,73 @@ class PublicUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertNotIn("token", res.data)  # pyright: ignore
 
+    @patch.object(FailedLoginThrottle, "THROTTLE_RATES", LOGIN_RATES)
+    def test_create_token_throttled_per_email(self):
+        """Test failed token requests are limited per email address."""
+        create_user(email="test@example.com", password="goodpass")
+        payload = {"email": "test@example.com", "password": "badpass"}
+        for _i in range(2):
+            self.client.post(TOKEN_URL, payload)
+
+        res = self.client.post(TOKEN_URL, {**payload, "password": "goodpass"})
+        other = self.client.post(
+            TOKEN_URL,
+            {"email": "other@example.com", "password": "badpass"},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch.object(FailedLoginThrottle, "THROTTLE_RATES", LOGIN_RATES)
+    def test_successful_logins_not_throttled(self):
+        """Test logging in with the right password is never throttled."""
+        create_user(email="test@example.com", password="goodpass")
+        payload = {"email": "test@example.com", "password": "goodpass"}
+
+        for _i in range(3):
+            res = self.client.post(TOKEN_URL, payload)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @patch.object(FailedLoginThrottle, "THROTTLE_RATES", LOGIN_RATES)
+    def test_create_token_throttled_per_ip(self):
+        """Test failed token requests are limited per client address."""
+        create_user(email="test@example.com", password="goodpass")
+        for i in range(3):
+            self.client.post(
+                TOKEN_URL,
+                {"email": f"user{i}@example.com", "password": "badpass"},
+            )
+
+        res = self.client.post(
+            TOKEN_URL,
+            {"email": "test@example.com", "password": "goodpass"},
+        )
+        other = self.client.post(
+            TOKEN_URL,
+            {"email": "test@example.com", "password": "goodpass"},
+            REMOTE_ADDR="10.0.0.2",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+
+    @patch.object(FailedLoginThrottle, "THROTTLE_RATES", LOGIN_RATES)
+    def test_attempts_counted_before_password_check(self):
+        """Test attempts still checking their password are counted."""
+        counts = []
+
+        def authenticate(**kwargs):
+            counts.append(LoginAttempts.objects.get(key__contains="ip").count)
+
+        with patch("user.serializers.authenticate", authenticate):
+            self.client.post(
+                TOKEN_URL,
+                {"email": "test@example.com", "password": "badpass"},
+            )
+
+        self.assertEqual(counts, [1])
+
     def test_retrieve_user_unauthorized(self):
         """Test authentication is required for users."""
         res = self.client.get(ME_URL)
@@ -143,3 +271,37 @@ class PrivateUserApiTests(TestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.name, payload["name"])
         self.assertTrue(self.user.check_password(payload["password"]))
+
+
+class LoginAttemptsTests(TransactionTestCase):
+    """Test counting login attempts."""
+
+    def test_concurrent_attempts_counted(self):
+        """Test attempts made at the same time are all counted."""
+        threads = 8
+        barrier = threading.Barrier(threads)
+        counts = []
+
+        def attempt():
+            try:
+                barrier.wait()
+                counts.append(LoginAttempts.objects.hit("key", 60)[0])
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=attempt) for _i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(counts), list(range(1, threads + 1)))
+
+    def test_expired_count_restarts(self):
+        """Test counting starts again once the count expires."""
+        LoginAttempts.objects.hit("key", 60)
+        LoginAttempts.objects.update(expires_at="2000-01-01T00:00Z")
+
+        count, _expires_at = LoginAttempts.objects.hit("key", 60)
+
+        self.assertEqual(count, 1)
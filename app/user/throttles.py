@@ -0,0 +1,92 @@
+"""
+Throttles for the user API.
+
+Every token request is counted before its password is checked, so
+guesses still being hashed count as well, and requests that log in are
+then taken back. Once an email address or a client address has too
+many attempts, its token requests are refused, even with the right
+password, until the count expires. Counts are kept in the database,
+where the attempts of all processes are added up atomically.
+"""
+
+from core.models import LoginAttempts
+from django.utils import timezone
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class FailedLoginThrottle(SimpleRateThrottle):
+    """Refuse token requests after too many that did not log in.
+
+    The view calls record_success() for the requests that log in, and
+    take_back() for the requests it refuses, as neither guessed.
+    """
+
+    def allow_request(self, request, view):
+        """Count the attempt, and refuse it if there were too many."""
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        count, self.expires_at = LoginAttempts.objects.hit(
+            key,
+            self.duration,
+        )
+        return count <= self.num_requests
+
+    def wait(self):
+        """Return the seconds until the count expires."""
+        return max((self.expires_at - timezone.now()).total_seconds(), 0)
+
+    def take_back(self, request, view):
+        """Remove the attempt of a request from the count."""
+        key = self.get_cache_key(request, view)
+        if key is not None:
+            LoginAttempts.objects.take_back(key)
+
+    def record_success(self, request, view):
+        """Take back the attempt of a request that logged in."""
+        self.take_back(request, view)
+
+
+class LoginRateThrottle(FailedLoginThrottle):
+    """Limit failed token requests per email address, whoever sends them."""
+
+    scope = "login"
+
+    def get_cache_key(self, request, view):
+        """Return the cache key of the email address in the request."""
+        email = request.data.get("email")
+        if not isinstance(email, str) or not email:
+            return None
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": email.strip().lower(),
+        }
+
+    def record_success(self, request, view):
+        """Forget the attempts of an email address that logged in."""
+        key = self.get_cache_key(request, view)
+        if key is not None:
+            LoginAttempts.objects.forget(key)
+
+
+class LoginIPRateThrottle(FailedLoginThrottle):
+    """Limit failed token requests per client address, for any email."""
+
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        """Return the cache key of the client address."""
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
+
+
+def prune_login_attempts():
+    """Delete the expired attempt counts and return their number."""
+    deleted, _rows = LoginAttempts.objects.filter(
+        expires_at__lte=timezone.now(),
+    ).delete()
+    return deleted
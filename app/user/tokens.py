@@ -0,0 +1,71 @@
+"""
+Issuing, rotating and pruning API tokens.
+"""
+
+from core.models import AuthToken
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+
+def _lock_user(user):
+    """Lock the row of a user until the end of the transaction.
+
+    Logins and rotations of a user replace the token of a device one at
+    a time, so they never both insert a token for it. FOR NO KEY UPDATE
+    leaves inserts referencing the user unblocked.
+    """
+    list(
+        get_user_model()
+        .objects.select_for_update(no_key=True)
+        .filter(pk=user.pk)
+        .values_list("pk", flat=True)
+    )
+
+
+def issue_token(user, device=""):
+    """Return a new token and its key for one of the user's devices.
+
+    A named device holds a single token, so logging in again replaces it.
+    """
+    with transaction.atomic():
+        if device:
+            _lock_user(user)
+            AuthToken.objects.filter(user=user, device=device).delete()
+        return AuthToken.objects.issue(user, device)
+
+
+def rotate_token(token):
+    """Replace a token with a new one for the same device.
+
+    Return None if the token was already replaced or deleted.
+    """
+    with transaction.atomic():
+        _lock_user(token.user)
+        deleted, _rows = AuthToken.objects.filter(pk=token.pk).delete()
+        if not deleted:
+            return None
+        return AuthToken.objects.issue(token.user, token.device)
+
+
+def prune_tokens(batch_size=None):
+    """Delete expired tokens, a batch per transaction.
+
+    Small batches keep the row locks of each delete short, so pruning a
+    large backlog does not block logins.
+    """
+    batch_size = batch_size or settings.TOKEN_PRUNE_BATCH_SIZE
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            AuthToken.objects.filter(expires_at__lt=now).values_list(
+                "id",
+                flat=True,
+            )[:batch_size]
+        )
+        if not ids:
+            return deleted
+        count, _rows = AuthToken.objects.filter(id__in=ids).delete()
+        deleted += count
@@ -11,4 +11,9 @@ urlpatterns = [
     path("create/", views.CreateUserView.as_view(), name="create"),
     path("me/", views.ManageUserView.as_view(), name="me"),
     path("token/", views.CreateTokenView.as_view(), name="token"),
+    path(
+        "token/rotate/",
+        views.RotateTokenView.as_view(),
+        name="token-rotate",
+    ),
 ]
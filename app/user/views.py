@@ -2,33 +2,93 @@
 Views for the user API.
 """
 
-from rest_framework import authentication
+from core.middleware import TimedSerializationMixin
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.utils import extend_schema
+from rest_framework import exceptions
 from rest_framework import generics
 from rest_framework import permissions
-from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from user.authentication import CachedTokenAuthentication
 from user.serializers import AuthTokenSerializer
+from user.serializers import TokenSerializer
 from user.serializers import UserSerializer
+from user.throttles import LoginIPRateThrottle
+from user.throttles import LoginRateThrottle
+from user.tokens import issue_token
+from user.tokens import rotate_token
 
 
-class CreateUserView(generics.CreateAPIView):
+def token_response(token, key):
+    """Return the response carrying a newly issued token."""
+    serializer = TokenSerializer(
+        {"token": key, "device": token.device, "expires_at": token.expires_at}
+    )
+    return Response(serializer.data)
+
+
+class CreateUserView(TimedSerializationMixin, generics.CreateAPIView):
     """Create a new user in the system."""
 
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(generics.GenericAPIView):
     """Create a new auth token for user."""
 
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = [LoginRateThrottle, LoginIPRateThrottle]
+
+    def check_throttles(self, request):
+        """Count the attempt, taking it back if the request is refused."""
+        try:
+            super().check_throttles(request)
+        except exceptions.Throttled:
+            for throttle in self.get_throttles():
+                throttle.take_back(request, self)
+            raise
+
+    @extend_schema(responses=TokenSerializer)
+    def post(self, request, *args, **kwargs):
+        """Issue a token for the credentials and device."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        for throttle in self.get_throttles():
+            throttle.record_success(request, self)
+        return token_response(
+            *issue_token(
+                serializer.validated_data["user"],
+                serializer.validated_data["device"],
+            )
+        )
+
+
+class RotateTokenView(generics.GenericAPIView):
+    """Replace the auth token of the request with a new one."""
+
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = TokenSerializer
+
+    @extend_schema(request=None, responses=TokenSerializer)
+    def post(self, request, *args, **kwargs):
+        """Issue a new token for the device and revoke the current one."""
+        issued = rotate_token(request.auth)
+        if issued is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        return token_response(*issued)
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(
+    TimedSerializationMixin,
+    generics.RetrieveUpdateAPIView,
+):
     """Manage the authenticated user."""
 
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
@@ -2,8 +2,55 @@
 
 set -e
 
+# With DB_POOL=local, connections go through a PgBouncer in this
+# container, so the server sees at most DB_POOL_SIZE connections however
+# many workers run.
+if [ "$DB_POOL" = "local" ]; then
+    mkdir -p /vol/pgbouncer
+    # PgBouncer escapes double quotes in the auth file by doubling them.
+    printf '"%s" "%s"\n' \
+        "$(echo "$DB_USER" | sed 's/"/""/g')" \
+        "$(echo "$DB_PASS" | sed 's/"/""/g')" \
+        >/vol/pgbouncer/userlist.txt
+    chmod 600 /vol/pgbouncer/userlist.txt
+    cat >/vol/pgbouncer/pgbouncer.ini <<EOT
+[databases]
+* = host=$DB_HOST
+
+[pgbouncer]
+listen_addr = 127.0.0.1
+listen_port = ${DB_POOL_PORT:-6432}
+unix_socket_dir =
+auth_type = scram-sha-256
+auth_file = /vol/pgbouncer/userlist.txt
+pool_mode = transaction
+default_pool_size = ${DB_POOL_SIZE:-10}
+max_client_conn = ${DB_POOL_MAX_CLIENTS:-1000}
+server_check_query = SELECT 1
+pidfile = /vol/pgbouncer/pgbouncer.pid
+logfile = /vol/pgbouncer/pgbouncer.log
+EOT
+    pgbouncer -d /vol/pgbouncer/pgbouncer.ini
+fi
+
+# Each worker writes its request metrics to a file in METRICS_DIR, and
+# the metrics endpoint adds them up. Files of the previous run are
+# removed, as its workers are gone.
+export METRICS_DIR="${METRICS_DIR:-/vol/web/metrics}"
+rm -rf "$METRICS_DIR"
+mkdir -p "$METRICS_DIR"
+
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
 
+# APP_SERVER=asgi serves the app with Uvicorn, where uploads, exports and
+# the health check run as async views. Lifespan events let the handler
+# close the connections of its database threads when Uvicorn stops.
+# Otherwise uWSGI serves it, with the same views all sync.
+if [ "$APP_SERVER" = "asgi" ]; then
+    exec uvicorn app.asgi:application --host 0.0.0.0 --port 9000 \
+        --workers "${ASGI_WORKERS:-4}" --lifespan on --no-access-log
+fi
+
 uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi